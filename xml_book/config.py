@@ -3,19 +3,37 @@ Set Up Execution Environment
 ============================
 
 This module configures the book execution environment.
-These options are loaded and initialised in the module init.
+
+Plotting is configured by the modules that import ``matplotlib.pyplot`` (see
+:func:`setup_plotting`), hence importing the package does not import
+matplotlib.
 """
 
 # Author: Kacper Sokol <kacper@xmlx.dev>
 # License: MIT
 
-import matplotlib.pyplot as plt
+__all__ = ['PLOTTING_STYLE', 'setup_plotting']
 
-from IPython.display import set_matplotlib_formats
+# The matplotlib style of the book figures
+PLOTTING_STYLE = 'seaborn'
 
-__all__ = ['setup_plotting']
+# Whether the plotting settings have been configured in this process
+_PLOTTING_SET_UP = False
 
 def setup_plotting():
-    """Configures default plotting settings."""
-    plt.style.use('seaborn')
+    """
+    Configures default plotting settings.
+
+    The settings are configured once per process; subsequent calls do
+    nothing.
+    """
+    global _PLOTTING_SET_UP
+    if _PLOTTING_SET_UP:
+        return
+
+    import matplotlib.pyplot as plt
+    from IPython.display import set_matplotlib_formats
+
+    plt.style.use(PLOTTING_STYLE)
     set_matplotlib_formats('svg')
+    _PLOTTING_SET_UP = True
@@ -19,10 +19,13 @@ import sklearn.preprocessing
 
 import numpy as np
 
+from xml_book.tools.instrumentation import instrument
+
 __all__ = ['generate_2d_moons', 'generate_bikes', 'get_boston']
 
 
-def generate_2d_moons(random_seed=None):
+@instrument()
+def generate_2d_moons(random_seed=None, dtype=np.float64):
     """
     Generates a two-dimensional *Two Moons* data set.
 
@@ -38,6 +41,9 @@ def generate_2d_moons(random_seed=None):
     random_seed : integer, optional (default=None)
         A random seed used to initialise Python's and numpy's ``random``
         modules. If ``None``, the random seeds are not fixed.
+    dtype : numpy dtype, optional (default=numpy.float64)
+        The (floating point) dtype of the data, e.g., ``numpy.float32`` to
+        halve the memory of the data and of the samples derived from them.
 
     Returns
     -------
@@ -51,6 +57,7 @@ def generate_2d_moons(random_seed=None):
         A numpy array holding labels of the test data.
     """
     assert random_seed is None or isinstance(random_seed, int), 'Incorrect seed.'
+    assert np.issubdtype(dtype, np.floating), 'Floating point dtype.'
     if random_seed is not None:
         import fatf
         fatf.setup_random_seed(random_seed)
@@ -61,7 +68,7 @@ def generate_2d_moons(random_seed=None):
 
     # Scale it between 0 and 1
     scaler = sklearn.preprocessing.MinMaxScaler(feature_range=(0, 1))
-    moons_data = scaler.fit_transform(moons_data)
+    moons_data = scaler.fit_transform(moons_data).astype(dtype, copy=False)
 
     # Split into test and train data
     train_X, test_X, train_y, test_y = sklearn.model_selection.train_test_split(
@@ -166,7 +173,8 @@ def _preprocess_bikes_target(bikes_target):
     return bikes_binned_target
 
 
-def generate_bikes(random_seed=None):
+@instrument()
+def generate_bikes(random_seed=None, dtype=np.float32):
     """
     Generates the UCI Bike Sharing data set.
 
@@ -184,6 +192,8 @@ def generate_bikes(random_seed=None):
     random_seed : integer, optional (default=None)
         A random seed used to initialise Python's and numpy's ``random``
         modules. If ``None``, the random seeds are not fixed.
+    dtype : numpy dtype, optional (default=numpy.float32)
+        The (floating point) dtype of the data.
 
     Returns
     -------
@@ -201,6 +211,7 @@ def generate_bikes(random_seed=None):
         A string with the name of the target variable.
     """
     assert random_seed is None or isinstance(random_seed, int), 'Incorrect seed.'
+    assert np.issubdtype(dtype, np.floating), 'Floating point dtype.'
     if random_seed is not None:
         import fatf
         fatf.setup_random_seed(random_seed)
@@ -209,6 +220,7 @@ def generate_bikes(random_seed=None):
     bikes_data, bikes_target, bikes_feature_names, bikes_target_name = (
         _download_bikes()
     )
+    bikes_data = bikes_data.astype(dtype, copy=False)
 
     # Convert the regression target into classification
     bikes_classification_target = _preprocess_bikes_target(bikes_target)
@@ -223,7 +235,8 @@ def generate_bikes(random_seed=None):
             bikes_feature_names, bikes_target_name)
 
 
-def get_boston():
+@instrument()
+def get_boston(dtype=np.float64):
     """
     Generates the Boston Housing data set.
 
@@ -231,6 +244,11 @@ def get_boston():
     *high* (1).
     The discretisation threshold is fixed at 20.
 
+    Parameters
+    ----------
+    dtype : numpy dtype, optional (default=numpy.float64)
+        The (floating point) dtype of the data.
+
     Returns
     -------
     X : 2-dimensional numpy array
@@ -238,7 +256,9 @@ def get_boston():
     y_class : 1-dimensional numpy array
         A numpy array holding discretised labels of the data.
     """
+    assert np.issubdtype(dtype, np.floating), 'Floating point dtype.'
     X, y = sklearn.datasets.load_boston(return_X_y=True)
+    X = X.astype(dtype, copy=False)
     y_class = np.zeros_like(y, dtype=np.int8)
     y_class[y >= 20] = 1
 
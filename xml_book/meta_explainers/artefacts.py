@@ -0,0 +1,288 @@
+"""
+XML Book Explanation Artefacts Module
+=====================================
+
+This module implements an on-disk format of surrogate explanations.
+
+An explanation artefact is a directory holding a ``manifest.json`` file and
+a (uniquely named) subdirectory with one ``.npy`` file per array, e.g., bin
+sampling values (see
+:func:`xml_book.meta_explainers.surrogates.get_bin_sampling_values`),
+discretised and undiscretised samples, their predictions and purity scores::
+
+    explanation/
+        manifest.json
+        arrays-3x7k2q9b/
+            bin_sampling_values.npy
+            discretised_data.npy
+            ...
+
+The manifest points to the arrays of the current version of the artefact.
+Overwriting an artefact writes a new arrays subdirectory and then atomically
+replaces the manifest, hence readers see either the old or the new
+explanation, and a failed write leaves the old one intact.
+
+Loading an artefact only reads its manifest and memory-maps the arrays
+(read-only), which reads their headers, hence opening an explanation takes
+constant time regardless of its size and no data are deserialised or copied.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from xml_book.meta_explainers.surrogates import (array_to_bin_sampling_values,
+                                                 bin_sampling_values_to_array)
+
+__all__ = ['FORMAT_VERSION', 'Explanation', 'save_explanation',
+           'load_explanation']
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+BIN_SAMPLING_VALUES = 'bin_sampling_values'
+
+
+class Explanation(object):
+    """
+    Holds a loaded explanation artefact.
+
+    The arrays are available by name (``explanation['discretised_data']``).
+    Memory-mapped arrays are opened when the explanation is loaded, hence
+    they remain valid (on POSIX systems) if the artefact is later
+    overwritten; otherwise, the arrays are read into memory on first access.
+
+    Parameters
+    ----------
+    path : string
+        The directory of the artefact.
+    manifest : dictionary
+        The content of the artefact's manifest.
+    mmap : boolean, optional (default=True)
+        Whether to memory-map the arrays (read-only) or load them into
+        memory.
+
+    Attributes
+    ----------
+    path : string
+        The directory of the artefact.
+    metadata : dictionary
+        The (JSON) metadata of the explanation.
+    """
+
+    def __init__(self, path, manifest, mmap=True):
+        """Initialises Explanation class."""
+        self.path = path
+        self.metadata = manifest.get('metadata', {})
+        self.mmap = mmap
+        self._arrays_spec = manifest['arrays']
+        self._arrays = {}
+        if mmap:
+            for name in self._arrays_spec:
+                self._load_array(name)
+
+    def keys(self):
+        """Lists the names of the stored arrays."""
+        return list(self._arrays_spec.keys())
+
+    def __contains__(self, name):
+        return name in self._arrays_spec
+
+    def __getitem__(self, name):
+        if name not in self._arrays_spec:
+            raise KeyError(name)
+        array = self._arrays.get(name)
+        if array is None:
+            array = self._load_array(name)
+        return array
+
+    def _load_array(self, name):
+        """Loads (or memory-maps) an array."""
+        file_path = os.path.join(
+            self.path, *self._arrays_spec[name]['file'].split('/'))
+        array = np.load(file_path, mmap_mode='r' if self.mmap else None,
+                        allow_pickle=False)
+        self._arrays[name] = array
+        return array
+
+    def get_bin_sampling_values(self):
+        """
+        Retrieves the stored bin sampling values.
+
+        Returns
+        -------
+        bin_sampling_values : dictionary of dictionaries holding 4-tuples
+            Bin sampling values in the format of
+            :func:`xml_book.meta_explainers.surrogates.get_bin_sampling_values`.
+        """
+        assert BIN_SAMPLING_VALUES in self, (
+            'The explanation does not hold bin sampling values.')
+        return array_to_bin_sampling_values(self[BIN_SAMPLING_VALUES])
+
+
+def save_explanation(path, arrays=None, bin_sampling_values=None,
+                     metadata=None, overwrite=False):
+    """
+    Saves an explanation artefact.
+
+    A new artefact is written into a temporary directory that is then
+    renamed. When an existing artefact is overwritten, its new arrays are
+    written into a new subdirectory and the manifest is atomically replaced
+    before the old arrays are removed. In both cases, readers never see
+    partially written explanations.
+    The floating point dtype of the ``bin_sampling_values`` is preserved.
+
+    Parameters
+    ----------
+    path : string
+        The directory of the artefact.
+    arrays : dictionary of numpy arrays, optional (default=None)
+        The arrays of the explanation (keyed by their names, which have to be
+        valid file names), e.g., discretised samples, their predictions and
+        surrogate results. Arrays of objects cannot be stored.
+    bin_sampling_values : dictionary of dictionaries, optional (default=None)
+        The output of
+        :func:`xml_book.meta_explainers.surrogates.get_bin_sampling_values`,
+        which is stored (as an array) under the ``'bin_sampling_values'``
+        name.
+    metadata : dictionary, optional (default=None)
+        JSON-serialisable metadata of the explanation, e.g., the explained
+        instance identifier or the surrogate parameters.
+    overwrite : boolean, optional (default=False)
+        Whether to replace an existing artefact. Directories that are not
+        explanation artefacts (i.e., do not hold a manifest) are never
+        replaced.
+
+    Returns
+    -------
+    path : string
+        The directory of the artefact.
+    """
+    arrays = {} if arrays is None else dict(arrays)
+    metadata = {} if metadata is None else metadata
+    assert isinstance(metadata, dict), 'The metadata must be a dictionary.'
+    if bin_sampling_values is not None:
+        assert BIN_SAMPLING_VALUES not in arrays, (
+            'The bin sampling values are given twice.')
+        arrays[BIN_SAMPLING_VALUES] = bin_sampling_values_to_array(
+            bin_sampling_values)
+
+    path = os.path.abspath(path)
+    old_manifest = None
+    if os.path.exists(path):
+        assert overwrite, 'The artefact already exists.'
+        old_manifest = _read_manifest(path)
+        artefact_path = path
+    else:
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        artefact_path = tempfile.mkdtemp(
+            prefix='.{}-'.format(os.path.basename(path)), dir=parent)
+    arrays_path = tempfile.mkdtemp(prefix='arrays-', dir=artefact_path)
+    manifest_path = None
+    try:
+        arrays_spec = {}
+        for name, array in arrays.items():
+            assert isinstance(name, str) and name and os.sep not in name, (
+                'Array names must be valid file names.')
+            array = np.asarray(array)
+            assert not array.dtype.hasobject, (
+                'Arrays of objects cannot be stored.')
+            file_name = '{}.npy'.format(name)
+            np.save(os.path.join(arrays_path, file_name), array,
+                    allow_pickle=False)
+            arrays_spec[name] = dict(
+                file='{}/{}'.format(os.path.basename(arrays_path), file_name),
+                shape=list(array.shape),
+                dtype=array.dtype.str)
+
+        if not arrays_spec:
+            os.rmdir(arrays_path)
+
+        manifest = dict(format_version=FORMAT_VERSION,
+                        arrays=arrays_spec,
+                        metadata=metadata)
+        manifest_file, manifest_path = tempfile.mkstemp(
+            prefix='.manifest-', dir=artefact_path)
+        with os.fdopen(manifest_file, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(manifest_path, os.path.join(artefact_path, MANIFEST_FILE))
+        manifest_path = None
+
+        if old_manifest is None:
+            os.replace(artefact_path, path)
+    except BaseException:
+        if manifest_path is not None and os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        if old_manifest is None:
+            shutil.rmtree(artefact_path, ignore_errors=True)
+        else:
+            shutil.rmtree(arrays_path, ignore_errors=True)
+        raise
+
+    if old_manifest is not None:
+        _remove_arrays(path, old_manifest)
+
+    return path
+
+
+def _read_manifest(path):
+    """Reads the manifest of an explanation artefact."""
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    assert os.path.isfile(manifest_path), (
+        'The directory is not an explanation artefact.')
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    assert manifest.get('format_version') == FORMAT_VERSION, (
+        'Unsupported explanation artefact version.')
+    return manifest
+
+
+def _remove_arrays(path, manifest):
+    """
+    Removes the array files listed in a (replaced) ``manifest`` together with
+    their subdirectories, once empty.
+    """
+    directories = set()
+    for array_spec in manifest['arrays'].values():
+        file_path = os.path.join(path, *array_spec['file'].split('/'))
+        directories.add(os.path.dirname(file_path))
+        try:
+            os.remove(file_path)
+        except OSError:  # pragma: nocover
+            pass
+    directories.discard(path)
+    for directory in directories:
+        try:
+            os.rmdir(directory)
+        except OSError:  # pragma: nocover
+            pass
+
+
+def load_explanation(path, mmap=True):
+    """
+    Loads an explanation artefact saved with :func:`save_explanation`.
+
+    Only the manifest and the headers of the (memory-mapped) arrays are
+    read.
+
+    Parameters
+    ----------
+    path : string
+        The directory of the artefact.
+    mmap : boolean, optional (default=True)
+        Whether to memory-map the arrays (read-only) or load them into
+        memory.
+
+    Returns
+    -------
+    explanation : Explanation
+        The loaded explanation.
+    """
+    manifest = _read_manifest(path)
+    return Explanation(path, manifest, mmap=mmap)
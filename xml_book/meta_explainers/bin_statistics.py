@@ -0,0 +1,395 @@
+"""
+XML Book Bin Statistics Module
+==============================
+
+This module implements incremental computation of bin sampling values.
+
+The :class:`BinStatistics` accumulator holds the count, minimum, maximum,
+mean and sum of squared deviations from the mean of every (numerical)
+feature within every bin of a discretiser. It can be updated with new chunks
+of reference data and merged with accumulators built from other chunks
+(e.g., on other machines), and it outputs the same bin sampling values as
+:func:`xml_book.meta_explainers.surrogates.get_bin_sampling_values` computed
+over all the data at once (up to floating point rounding of the means and
+standard deviations). The statistics are accumulated in double precision and
+output in the floating point dtype of the data, as with
+:func:`~xml_book.meta_explainers.surrogates.get_bin_sampling_values`.
+
+The :class:`NeighbourhoodBinStatistics` class computes bin sampling values
+over the neighbourhood of an explained instance -- its nearest neighbours in
+the reference data (found with a k-d or ball tree) -- for instance-local
+explanations.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import collections
+
+import numpy as np
+
+from xml_book.meta_explainers.surrogates import (_cast_inwards,
+                                                 _get_float_dtype,
+                                                 get_bin_sampling_values)
+from xml_book.tools.instrumentation import instrument, span
+
+__all__ = ['BinStatistics', 'NeighbourhoodBinStatistics']
+
+
+def _merge_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    """
+    Merges the counts, means and sums of squared deviations of two sets of
+    data (Chan et al.'s parallel variance algorithm).
+    """
+    count = count_a + count_b
+    safe_count = np.maximum(count, 1)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * (count_b / safe_count)
+    m2 = m2_a + m2_b + np.square(delta) * (count_a * count_b / safe_count)
+    return count, mean, m2
+
+
+class BinStatistics(object):
+    """
+    Accumulates per-bin statistics of reference data.
+
+    Parameters
+    ----------
+    discretiser : fat-forensics discretiser object
+        A (fitted) discretiser, e.g., a quartile discretiser, whose bins do
+        not change as new data arrive.
+
+    Attributes
+    ----------
+    count : 2-dimensional numpy array
+        The number of data points in each bin (features x bins).
+    minimum : 2-dimensional numpy array
+        The minimum of each bin (``+inf`` for empty bins).
+    maximum : 2-dimensional numpy array
+        The maximum of each bin (``-inf`` for empty bins).
+    mean : 2-dimensional numpy array
+        The mean of each bin (0 for empty bins).
+    m2 : 2-dimensional numpy array
+        The sum of squared deviations from the mean of each bin.
+    dtype : numpy dtype
+        The floating point dtype of the bin sampling values -- the (promoted)
+        dtype of the accumulated data (``None`` before any data are added).
+    """
+
+    def __init__(self, discretiser):
+        """Initialises BinStatistics class."""
+        self.discretiser = discretiser
+        self.features_number = discretiser.features_number
+
+        self.bin_ids = []
+        bins_number = 0
+        for index in range(self.features_number):
+            bin_ids = sorted(
+                list(discretiser.feature_value_names[index].keys()))
+            assert bin_ids == list(range(len(bin_ids))), (
+                'The bin IDs must be consecutive integers starting at 0.')
+            self.bin_ids.append(bin_ids)
+            bins_number = max(bins_number, len(bin_ids))
+
+        shape = (self.features_number, bins_number)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.minimum = np.full(shape, np.inf, dtype=np.float64)
+        self.maximum = np.full(shape, -np.inf, dtype=np.float64)
+        self.mean = np.zeros(shape, dtype=np.float64)
+        self.m2 = np.zeros(shape, dtype=np.float64)
+        self.dtype = None
+
+    def _update_dtype(self, dtype):
+        """Promotes the dtype of the statistics to accommodate new data."""
+        if dtype is not None:
+            dtype = _get_float_dtype(dtype)
+            self.dtype = (dtype if self.dtype is None
+                          else np.promote_types(self.dtype, dtype))
+
+    @instrument()
+    def update(self, dataset):
+        """
+        Adds a chunk of reference data to the statistics.
+
+        Parameters
+        ----------
+        dataset : 2-dimensional numpy array
+            A chunk of data compatible with the discretiser.
+
+        Returns
+        -------
+        self : BinStatistics
+            The updated statistics.
+        """
+        assert len(dataset.shape) == 2, 'The data must be a 2-D array.'
+        if not dataset.shape[0]:
+            return self
+        with span('discretise') as span_:
+            span_.add('rows', dataset.shape[0])
+            dataset_discretised = self.discretiser.discretise(dataset)
+        return self._update(dataset, dataset_discretised)
+
+    def _update(self, dataset, dataset_discretised):
+        """Adds a chunk of (already discretised) data to the statistics."""
+        self._update_dtype(dataset.dtype)
+        bins_number = self.count.shape[1]
+        for index in range(self.features_number):
+            bins = dataset_discretised[:, index].astype(np.intp)
+            feature = dataset[:, index].astype(np.float64)
+
+            count = np.bincount(bins, minlength=bins_number)
+            mean = (np.bincount(bins, weights=feature, minlength=bins_number)
+                    / np.maximum(count, 1))
+            m2 = np.bincount(bins, weights=np.square(feature - mean[bins]),
+                             minlength=bins_number)
+
+            (self.count[index], self.mean[index],
+             self.m2[index]) = _merge_moments(
+                 self.count[index], self.mean[index], self.m2[index],
+                 count, mean, m2)
+            np.minimum.at(self.minimum[index], bins, feature)
+            np.maximum.at(self.maximum[index], bins, feature)
+
+        return self
+
+    def merge(self, other):
+        """
+        Merges statistics accumulated from other data.
+
+        Parameters
+        ----------
+        other : BinStatistics
+            Statistics computed with the same discretiser.
+
+        Returns
+        -------
+        self : BinStatistics
+            The merged statistics.
+        """
+        assert isinstance(other, BinStatistics), 'BinStatistics expected.'
+        assert (self.bin_ids == other.bin_ids
+                and _same_boundaries(self.discretiser, other.discretiser)), (
+                    'The statistics use different discretisers.')
+        self.count, self.mean, self.m2 = _merge_moments(
+            self.count, self.mean, self.m2,
+            other.count, other.mean, other.m2)
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self._update_dtype(other.dtype)
+        return self
+
+    def to_bin_sampling_values(self, fallback=None):
+        """
+        Computes the bin sampling values of the accumulated data.
+
+        Parameters
+        ----------
+        fallback : dictionary of dictionaries, optional (default=None)
+            Bin sampling values used for the bins without data, e.g.,
+            computed over a larger data set. By default (``None``), the
+            statistics of empty bins are numpy nan.
+
+        Returns
+        -------
+        bin_sampling_values : dictionary of dictionaries holding 4-tuples
+            The minimum, maximum, mean and standard deviation of each bin in
+            the format of
+            :func:`xml_book.meta_explainers.surrogates.get_bin_sampling_values`
+            -- scalars of the ``dtype`` (``numpy.float64`` if no data were
+            added) whose minimum and maximum are rounded inwards.
+        """
+        float_dtype = (np.dtype(np.float64) if self.dtype is None
+                       else self.dtype)
+        bin_sampling_values = {}
+        for index in range(self.features_number):
+            bin_sampling_values[index] = {}
+            bin_ids = self.bin_ids[index]
+            bin_boundaries = self.discretiser.feature_bin_boundaries[index]
+            for bin_i, bin_id in enumerate(bin_ids):
+                count = self.count[index, bin_id]
+                if not count and fallback is not None:
+                    bin_sampling_values[index][bin_id] = (
+                        fallback[index][bin_id])
+                    continue
+                if count:
+                    mean_val = self.mean[index, bin_id]
+                    std_val = np.sqrt(self.m2[index, bin_id] / count)
+                else:
+                    mean_val = np.nan
+                    std_val = np.nan
+
+                # The edges of the first and last bins are empirical (see
+                # the get_bin_sampling_values function)
+                if bin_i == 0:
+                    assert count, 'The first bin cannot be empty.'
+                    min_val = self.minimum[index, bin_id]
+                    max_val = bin_boundaries[bin_i]
+                elif bin_i == bin_boundaries.shape[0]:
+                    min_val = bin_boundaries[bin_i - 1]
+                    max_val = (self.maximum[index, bin_id] if count
+                               else np.inf)
+                else:
+                    min_val = bin_boundaries[bin_i - 1]
+                    max_val = bin_boundaries[bin_i]
+
+                bin_sampling_values[index][bin_id] = (
+                    _cast_inwards(min_val, float_dtype, False),
+                    _cast_inwards(max_val, float_dtype, True),
+                    float_dtype.type(mean_val), float_dtype.type(std_val))
+
+        return bin_sampling_values
+
+
+def _same_boundaries(discretiser_a, discretiser_b):
+    """Checks whether two discretisers have the same bin boundaries."""
+    if discretiser_a is discretiser_b:
+        return True
+    boundaries_a = discretiser_a.feature_bin_boundaries
+    boundaries_b = discretiser_b.feature_bin_boundaries
+    return (boundaries_a.keys() == boundaries_b.keys()
+            and all(np.array_equal(boundaries_a[key], boundaries_b[key])
+                    for key in boundaries_a))
+
+
+class NeighbourhoodBinStatistics(object):
+    """
+    Computes bin sampling values over neighbourhoods of explained instances.
+
+    A k-d tree (or a ball tree for metrics that k-d trees do not support) is
+    built over the reference data once, together with their discretisation.
+    For each explained instance, the bin statistics are then computed only
+    over its ``k`` nearest neighbours -- or the neighbours within the
+    ``radius`` -- hence the cost of a query grows with the size of the
+    neighbourhood rather than the reference data. The bins without any
+    neighbours fall back to the statistics of the whole reference data.
+
+    The results of recent queries are kept in a least-recently-used cache.
+
+    Parameters
+    ----------
+    dataset : 2-dimensional numpy array
+        The reference data set.
+    discretiser : fat-forensics discretiser object
+        A (fitted) discretiser that is compatible with the ``dataset``.
+    k : integer, optional (default=None)
+        The number of nearest neighbours of an instance.
+    radius : number, optional (default=None)
+        The radius of the neighbourhood of an instance (exclusive with
+        ``k``). If neither is given, ``k`` is set to 100.
+    metric : string, optional (default='euclidean')
+        The distance metric (see ``sklearn.neighbors.BallTree``).
+    leaf_size : integer, optional (default=40)
+        The leaf size of the tree.
+    cache_size : integer, optional (default=128)
+        The number of cached query results.
+
+    Attributes
+    ----------
+    tree : sklearn.neighbors.KDTree or sklearn.neighbors.BallTree
+        The neighbour index of the ``dataset``.
+    global_bin_sampling_values : dictionary of dictionaries
+        The bin sampling values of the whole ``dataset``.
+    hits : integer
+        The number of queries answered from the cache.
+    misses : integer
+        The number of computed queries.
+    """
+
+    def __init__(self, dataset, discretiser, k=None, radius=None,
+                 metric='euclidean', leaf_size=40, cache_size=128):
+        """Initialises NeighbourhoodBinStatistics class."""
+        import sklearn.neighbors
+
+        assert len(dataset.shape) == 2, 'The data must be a 2-D array.'
+        assert k is None or radius is None, 'Either k or radius.'
+        if k is None and radius is None:
+            k = 100
+        assert k is None or (isinstance(k, int) and k > 0), (
+            'Positive integer.')
+        assert radius is None or radius > 0, 'Positive radius.'
+        assert isinstance(cache_size, int) and cache_size >= 0, (
+            'Non-negative integer.')
+
+        self.dataset = dataset
+        self.discretiser = discretiser
+        self.k = None if k is None else min(k, dataset.shape[0])
+        self.radius = radius
+        self.cache_size = cache_size
+
+        if metric in sklearn.neighbors.KDTree.valid_metrics:
+            tree_class = sklearn.neighbors.KDTree
+        else:
+            tree_class = sklearn.neighbors.BallTree
+        self.tree = tree_class(dataset, leaf_size=leaf_size, metric=metric)
+
+        with span('discretise') as span_:
+            span_.add('rows', dataset.shape[0])
+            self.dataset_discretised = discretiser.discretise(dataset)
+        self.global_bin_sampling_values = get_bin_sampling_values(
+            dataset, discretiser)
+
+        self._cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_neighbours(self, instance):
+        """
+        Finds the neighbours of an instance in the reference data.
+
+        Parameters
+        ----------
+        instance : 1-dimensional numpy array
+            An explained instance.
+
+        Returns
+        -------
+        indices : 1-dimensional numpy array
+            The (sorted) row indices of the neighbours.
+        """
+        instance = np.asarray(instance).reshape(1, -1)
+        if self.k is not None:
+            indices = self.tree.query(
+                instance, k=self.k, return_distance=False)[0]
+        else:
+            indices = self.tree.query_radius(instance, r=self.radius)[0]
+        return np.sort(indices)
+
+    @instrument()
+    def get_bin_sampling_values(self, instance):
+        """
+        Computes the bin sampling values over the neighbourhood of an
+        instance.
+
+        Parameters
+        ----------
+        instance : 1-dimensional numpy array
+            An explained instance.
+
+        Returns
+        -------
+        bin_sampling_values : dictionary of dictionaries holding 4-tuples
+            Bin sampling values in the format of
+            :func:`xml_book.meta_explainers.surrogates.get_bin_sampling_values`.
+        """
+        instance = np.ascontiguousarray(instance)
+        key = instance.dtype.str.encode() + instance.tobytes()
+        bin_sampling_values = self._cache.get(key)
+        if bin_sampling_values is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return bin_sampling_values
+        self.misses += 1
+
+        indices = self.get_neighbours(instance)
+        statistics = BinStatistics(self.discretiser)
+        if indices.shape[0]:
+            statistics._update(self.dataset[indices],
+                               self.dataset_discretised[indices])
+        bin_sampling_values = statistics.to_bin_sampling_values(
+            fallback=self.global_bin_sampling_values)
+
+        if self.cache_size:
+            self._cache[key] = bin_sampling_values
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return bin_sampling_values
@@ -0,0 +1,339 @@
+"""
+XML Book Distributed Purity Module
+==================================
+
+This module implements a map-reduce form of the
+:func:`xml_book.meta_explainers.surrogates.weighted_purity` function for
+data partitioned into shards (e.g., spread across worker nodes).
+
+Each shard is summarised with the sufficient statistics of every
+hyper-rectangle (cell) it holds -- the class histograms for the Gini Index,
+or the counts, means and sums of squared deviations for the Mean Squared
+Error. The summaries are small (proportional to the number of cells rather
+than rows), serialise into compact bytes, and merge into the exact global
+weighted purity::
+
+    summaries = executor.map(summarise_shard_bytes, shards)
+    summary = merge_summaries(PuritySummary.from_bytes(s) for s in summaries)
+    summary.weighted_purity()
+
+or simply ``distributed_weighted_purity(shards, 'gini', executor=executor)``.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import functools
+import io
+
+import numpy as np
+
+from xml_book.meta_explainers.bin_statistics import _merge_moments
+from xml_book.meta_explainers.surrogates import (_group_hyperrectangles,
+                                                 get_group_class_counts,
+                                                 gini_index_counts)
+from xml_book.tools.instrumentation import instrument
+
+__all__ = ['PuritySummary', 'summarise_shard', 'summarise_shard_bytes',
+           'merge_summaries', 'distributed_weighted_purity']
+
+
+class PuritySummary(object):
+    """
+    Holds the sufficient statistics of weighted purity of a data shard.
+
+    Parameters
+    ----------
+    metric : string
+        Either ``'mse'`` for Mean Squared Error or ``'gini'`` for Gini Index.
+    cells : 2-dimensional numpy array
+        The unique hyper-rectangles (rows of discretised data) of the shard.
+    counts : 1-dimensional numpy array
+        The number of rows in each cell.
+    statistics : dictionary of numpy arrays
+        For the ``'gini'`` metric, the ``classes`` (1-dimensional) and the
+        ``class_counts`` of each cell (cells x classes); for the ``'mse'``
+        metric, the ``means`` and the sums of squared deviations from the
+        mean (``m2``) of each cell.
+    """
+
+    def __init__(self, metric, cells, counts, statistics):
+        """Initialises PuritySummary class."""
+        assert metric in ('mse', 'gini'), (
+            'Incorrect metric specifier. Should either be *mse* or *gini*.')
+        assert len(cells.shape) == 2, 'The cells have to be a 2-D array.'
+        assert counts.shape == (cells.shape[0], ), 'Size mismatch.'
+        self.metric = metric
+        self.cells = cells
+        self.counts = counts
+        self.statistics = statistics
+
+    @classmethod
+    def from_shard(cls, discretised_data, labels, metric):
+        """
+        Summarises a shard of discretised data and their labels.
+
+        Parameters
+        ----------
+        discretised_data : 2-dimensional numpy array
+            A 2-dimensional array with *discretised* data.
+        labels : 1-dimensional numpy array
+            The labels of the data (see
+            :func:`xml_book.meta_explainers.surrogates.weighted_purity`).
+        metric : string
+            Either ``'mse'`` for Mean Squared Error or ``'gini'`` for Gini
+            Index.
+
+        Returns
+        -------
+        summary : PuritySummary
+            The summary of the shard.
+        """
+        discretised_data = np.asarray(discretised_data)
+        labels = np.asarray(labels)
+        if len(discretised_data.shape) == 1:
+            discretised_data = discretised_data.reshape(-1, 1)
+        assert discretised_data.shape[0] == labels.shape[0], 'Size mismatch.'
+        metric = metric.lower()
+
+        groups, groups_number = _group_hyperrectangles(discretised_data)
+        # The first row of each group represents its cell
+        first_rows = np.empty(groups_number, dtype=np.intp)
+        first_rows[groups[::-1]] = np.arange(groups.shape[0])[::-1]
+        cells = discretised_data[first_rows]
+        counts = np.bincount(groups, minlength=groups_number)
+
+        if metric == 'gini':
+            classes, class_ids = np.unique(labels, return_inverse=True)
+            statistics = dict(
+                classes=classes,
+                class_counts=get_group_class_counts(
+                    groups, class_ids.reshape(-1), groups_number,
+                    classes.shape[0]))
+        else:
+            labels = labels.astype(np.float64)
+            means = (np.bincount(groups, weights=labels,
+                                 minlength=groups_number)
+                     / np.maximum(counts, 1))
+            m2 = np.bincount(groups, weights=np.square(labels - means[groups]),
+                             minlength=groups_number)
+            statistics = dict(means=means, m2=m2)
+
+        return cls(metric, cells, counts, statistics)
+
+    def merge(self, other):
+        """
+        Merges the summary of another shard.
+
+        Parameters
+        ----------
+        other : PuritySummary
+            A summary computed with the same metric.
+
+        Returns
+        -------
+        summary : PuritySummary
+            The merged summary.
+        """
+        assert isinstance(other, PuritySummary), 'PuritySummary expected.'
+        assert self.metric == other.metric, 'Different metrics.'
+        assert self.cells.shape[1] == other.cells.shape[1], (
+            'Different number of features.')
+
+        cells, inverse = np.unique(
+            np.concatenate([self.cells, other.cells]), axis=0,
+            return_inverse=True)
+        inverse = inverse.reshape(-1)
+        self_cells = inverse[:self.cells.shape[0]]
+        other_cells = inverse[self.cells.shape[0]:]
+        cells_number = cells.shape[0]
+
+        counts = np.zeros(cells_number, dtype=np.int64)
+        np.add.at(counts, self_cells, self.counts)
+        np.add.at(counts, other_cells, other.counts)
+
+        if self.metric == 'gini':
+            classes, class_ids = np.unique(
+                np.concatenate([self.statistics['classes'],
+                                other.statistics['classes']]),
+                return_inverse=True)
+            class_ids = class_ids.reshape(-1)
+            self_classes = class_ids[:self.statistics['classes'].shape[0]]
+            other_classes = class_ids[self.statistics['classes'].shape[0]:]
+
+            class_counts = np.zeros((cells_number, classes.shape[0]),
+                                    dtype=np.int64)
+            np.add.at(class_counts, np.ix_(self_cells, self_classes),
+                      self.statistics['class_counts'])
+            np.add.at(class_counts, np.ix_(other_cells, other_classes),
+                      other.statistics['class_counts'])
+            statistics = dict(classes=classes, class_counts=class_counts)
+        else:
+            # Each cell appears at most once in each summary
+            self_stats = _scatter_moments(cells_number, self_cells,
+                                          self.counts, self.statistics)
+            other_stats = _scatter_moments(cells_number, other_cells,
+                                           other.counts, other.statistics)
+            _, means, m2 = _merge_moments(*(self_stats + other_stats))
+            statistics = dict(means=means, m2=m2)
+
+        return PuritySummary(self.metric, cells, counts, statistics)
+
+    def weighted_purity(self):
+        """
+        Computes the weighted purity of the summarised data.
+
+        Returns
+        -------
+        weighted_purity_ : float
+            The weighted purity (see
+            :func:`xml_book.meta_explainers.surrogates.weighted_purity`).
+        """
+        items_count = self.counts.sum()
+        assert items_count, 'The summary is empty.'
+        if self.metric == 'gini':
+            gini = gini_index_counts(self.statistics['class_counts'])
+            weighted_purity_ = np.sum(self.counts * gini) / items_count
+        else:
+            weighted_purity_ = np.sum(self.statistics['m2']) / items_count
+        return weighted_purity_
+
+    def to_bytes(self):
+        """
+        Serialises the summary (as a compressed numpy ``.npz`` archive).
+
+        Returns
+        -------
+        summary_bytes : bytes
+            The serialised summary.
+        """
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer, metric=np.array(self.metric), cells=self.cells,
+            counts=self.counts, **self.statistics)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, summary_bytes):
+        """
+        Deserialises a summary serialised with :meth:`to_bytes`.
+
+        Parameters
+        ----------
+        summary_bytes : bytes
+            The serialised summary.
+
+        Returns
+        -------
+        summary : PuritySummary
+            The summary.
+        """
+        with np.load(io.BytesIO(summary_bytes), allow_pickle=False) as arrays:
+            arrays = dict(arrays)
+        metric = str(arrays.pop('metric'))
+        cells = arrays.pop('cells')
+        counts = arrays.pop('counts')
+        return cls(metric, cells, counts, arrays)
+
+
+def _scatter_moments(cells_number, cell_indices, counts, statistics):
+    """Places the moments of a summary's cells into the merged cells."""
+    count = np.zeros(cells_number, dtype=np.int64)
+    means = np.zeros(cells_number, dtype=np.float64)
+    m2 = np.zeros(cells_number, dtype=np.float64)
+    count[cell_indices] = counts
+    means[cell_indices] = statistics['means']
+    m2[cell_indices] = statistics['m2']
+    return count, means, m2
+
+
+def summarise_shard(shard, metric):
+    """
+    Summarises a shard of data.
+
+    Parameters
+    ----------
+    shard : tuple or callable
+        Either a tuple of *discretised* data and their labels, or a function
+        (taking no arguments) that loads such a tuple, e.g., from the local
+        storage of a worker node.
+    metric : string
+        Either ``'mse'`` for Mean Squared Error or ``'gini'`` for Gini Index.
+
+    Returns
+    -------
+    summary : PuritySummary
+        The summary of the shard.
+    """
+    if callable(shard):
+        shard = shard()
+    discretised_data, labels = shard
+    return PuritySummary.from_shard(discretised_data, labels, metric)
+
+
+def summarise_shard_bytes(shard, metric):
+    """
+    Summarises a shard of data into bytes (see :func:`summarise_shard` and
+    :meth:`PuritySummary.to_bytes`), e.g., to be sent back from a worker.
+    """
+    return summarise_shard(shard, metric).to_bytes()
+
+
+def merge_summaries(summaries):
+    """
+    Merges summaries of shards.
+
+    Parameters
+    ----------
+    summaries : iterable of PuritySummary objects
+        The summaries (computed with the same metric).
+
+    Returns
+    -------
+    summary : PuritySummary
+        The merged summary.
+    """
+    summaries = list(summaries)
+    assert summaries, 'At least one summary is required.'
+    return functools.reduce(lambda a, b: a.merge(b), summaries)
+
+
+@instrument()
+def distributed_weighted_purity(shards, metric, executor=None):
+    """
+    Computes weighted purity of data partitioned into shards.
+
+    The shards are summarised with ``executor.map`` -- e.g., a
+    ``concurrent.futures`` executor, a ``multiprocessing`` pool or a
+    distributed computing client with a compatible ``map`` method -- and
+    their (serialised) summaries are merged. The result is equal (up to
+    floating point rounding) to
+    :func:`xml_book.meta_explainers.surrogates.weighted_purity` computed
+    over all the data.
+
+    Parameters
+    ----------
+    shards : iterable of tuples or callables
+        The shards (see :func:`summarise_shard`), which have to be picklable
+        for process-based executors.
+    metric : string
+        Either ``'mse'`` for Mean Squared Error or ``'gini'`` for Gini Index.
+    executor : object, optional (default=None)
+        An object with a ``map`` method. By default (``None``), the shards are
+        summarised sequentially.
+
+    Returns
+    -------
+    weighted_purity_ : float
+        The weighted purity of all the data.
+    """
+    metric = metric.lower()
+    assert metric in ('mse', 'gini'), (
+        'Incorrect metric specifier. Should either be *mse* or *gini*.')
+    map_ = map if executor is None else executor.map
+    summaries_bytes = map_(
+        functools.partial(summarise_shard_bytes, metric=metric), shards)
+    summary = merge_summaries(
+        PuritySummary.from_bytes(summary_bytes)
+        for summary_bytes in summaries_bytes)
+    return summary.weighted_purity()
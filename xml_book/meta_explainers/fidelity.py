@@ -0,0 +1,378 @@
+"""
+XML Book Fidelity Module
+========================
+
+This module implements fidelity evaluation of surrogate explainers used by
+the book.
+
+The fidelity of a surrogate with respect to a black box can be measured in
+four regions (illustrated by the ``local_surrogate`` function of the
+:mod:`xml_book.meta_explainers.plot_examples` module):
+
+* ``'inst-glob'`` -- the whole data space;
+* ``'inst-loc'`` -- the neighbourhood of the explained instance;
+* ``'mod-glob'`` -- the vicinity of the black-box decision boundary; and
+* ``'mod-loc'`` -- the vicinity of the surrogate decision boundary (within
+  the neighbourhood of the explained instance).
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import concurrent.futures
+
+import scipy.stats
+
+import numpy as np
+
+from xml_book.meta_explainers.surrogates import (get_group_class_counts,
+                                                 gini_index_counts)
+from xml_book.tools.instrumentation import instrument
+
+__all__ = ['REGIONS', 'NormalSampler', 'UniformSampler', 'evaluate_fidelity']
+
+REGIONS = ('mod-loc', 'mod-glob', 'inst-loc', 'inst-glob')
+
+# The black box and the surrogate installed in a worker process of the
+# default executor (see _initialise_worker)
+_WORKER_MODELS = {}
+
+
+class NormalSampler(object):
+    """
+    Samples data from a normal distribution (e.g., around an instance).
+
+    Parameters
+    ----------
+    mean : 1-dimensional numpy array
+        The mean of the distribution.
+    scale : number or 1-dimensional numpy array
+        The standard deviation of the distribution (for each feature).
+    """
+
+    def __init__(self, mean, scale):
+        """Initialises NormalSampler class."""
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.broadcast_to(
+            np.asarray(scale, dtype=np.float64), self.mean.shape)
+        assert len(self.mean.shape) == 1, 'The mean has to be 1-D.'
+
+    def __call__(self, samples_number, random_generator):
+        return random_generator.normal(
+            loc=self.mean, scale=self.scale,
+            size=(samples_number, self.mean.shape[0]))
+
+
+class UniformSampler(object):
+    """
+    Samples data uniformly from a hyper-rectangle (e.g., the data domain).
+
+    Parameters
+    ----------
+    low : 1-dimensional numpy array
+        The lower bound of each feature.
+    high : 1-dimensional numpy array
+        The upper bound of each feature.
+    """
+
+    def __init__(self, low, high):
+        """Initialises UniformSampler class."""
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        assert len(self.low.shape) == 1, 'The bounds have to be 1-D.'
+        assert self.low.shape == self.high.shape, 'Size mismatch.'
+        assert np.all(self.low <= self.high), 'Incorrect bounds.'
+
+    def __call__(self, samples_number, random_generator):
+        return random_generator.uniform(
+            low=self.low, high=self.high,
+            size=(samples_number, self.low.shape[0]))
+
+
+def _get_margin(probabilities):
+    """
+    Computes the difference between the two largest probabilities of each
+    instance -- the smaller it is, the closer the instance is to a decision
+    boundary.
+    """
+    if probabilities.shape[1] < 2:
+        return np.ones(probabilities.shape[0])
+    top_two = np.partition(probabilities, -2, axis=1)[:, -2:]
+    return top_two[:, 1] - top_two[:, 0]
+
+
+def _initialise_worker(black_box, surrogate):
+    """Installs the black box and the surrogate in a worker process (once)."""
+    _WORKER_MODELS.update(black_box=black_box, surrogate=surrogate)
+
+
+def _predict_proba(model, data, classes):
+    """
+    Predicts probabilities with the model's ``predict_proba`` or -- for
+    models without it -- one-hot encodes its ``predict`` output (with
+    columns following the ``classes`` order).
+    """
+    if hasattr(model, 'predict_proba'):
+        probabilities = model.predict_proba(data)
+    else:
+        probabilities = (model.predict(data)[:, np.newaxis]
+                         == classes).astype(np.float64)
+    return probabilities
+
+
+def _get_wilson_interval(successes, n, z):
+    """
+    Computes the Wilson score interval of a proportion, which -- unlike the
+    Wald interval -- does not collapse when the proportion is 0 or 1.
+    """
+    proportion = successes / n
+    denominator = 1 + z**2 / n
+    centre = (proportion + z**2 / (2 * n)) / denominator
+    half_width = z * np.sqrt(
+        proportion * (1 - proportion) / n + z**2 / (4 * n**2)) / denominator
+    return centre - half_width, centre + half_width
+
+
+def _evaluate_chunk(task):
+    """
+    Samples a chunk of data and computes the sufficient statistics of the
+    fidelity metrics over the points that fall into the region.
+
+    If the models are ``None``, the ones installed in the worker process are
+    used.
+    """
+    (black_box, surrogate, region, sampler, chunk_size, instance,
+     locality_radius, boundary_margin, classes, seed) = task
+    if black_box is None:
+        black_box = _WORKER_MODELS['black_box']
+        surrogate = _WORKER_MODELS['surrogate']
+    random_generator = np.random.default_rng(seed)
+    data = sampler(chunk_size, random_generator)
+
+    in_region = np.ones(data.shape[0], dtype=bool)
+    if region in ('inst-loc', 'mod-loc') and locality_radius is not None:
+        distances = np.linalg.norm(data - instance, axis=1)
+        in_region &= distances <= locality_radius
+
+    bb_proba = _predict_proba(black_box, data, classes)
+    sur_proba = _predict_proba(surrogate, data, classes)
+    if region == 'mod-glob':
+        in_region &= _get_margin(bb_proba) <= boundary_margin
+    elif region == 'mod-loc':
+        in_region &= _get_margin(sur_proba) <= boundary_margin
+
+    bb_proba, sur_proba = bb_proba[in_region], sur_proba[in_region]
+    assert bb_proba.shape == sur_proba.shape, (
+        'The black box and the surrogate must predict the same classes.')
+    bb_labels = np.argmax(bb_proba, axis=1)
+    sur_labels = np.argmax(sur_proba, axis=1)
+
+    agreement = (bb_labels == sur_labels)
+    squared_error = np.mean(np.square(bb_proba - sur_proba), axis=1)
+    classes_number = classes.shape[0]
+    counts = get_group_class_counts(
+        sur_labels, bb_labels, classes_number, classes_number)
+
+    return dict(samples=data.shape[0],
+                region_samples=int(in_region.sum()),
+                agreement=float(agreement.sum()),
+                squared_error=float(squared_error.sum()),
+                squared_error_sq=float(np.square(squared_error).sum()),
+                counts=counts)
+
+
+@instrument()
+def evaluate_fidelity(black_box, surrogate, region, sampler, instance=None,
+                      locality_radius=None, boundary_margin=0.2,
+                      chunk_size=10000, max_samples=10**6,
+                      min_region_samples=100, tolerance=0.01,
+                      confidence=0.95, executor=None, workers=1,
+                      random_seed=None):
+    """
+    Measures fidelity of a surrogate with respect to a black box in a region.
+
+    Data are drawn from the ``sampler`` in chunks and the points that fall
+    into the ``region`` are scored by both models (with their
+    ``predict_proba`` methods or -- for crisp models, e.g., the output of
+    :func:`xml_book.models.tabular.get_svc` -- the one-hot encoding of their
+    ``predict`` output). The following metrics are computed:
+
+    * ``agreement`` -- the proportion of points for which the crisp
+      predictions (the most probable classes) of both models agree;
+    * ``mse`` -- the Mean Squared Error between the probabilities of both
+      models (averaged over the classes); and
+    * ``weighted_purity`` -- the weighted Gini Index of the black-box
+      predictions within the partition of the region induced by the
+      surrogate predictions (see
+      :func:`xml_book.meta_explainers.surrogates.weighted_purity`).
+
+    The vicinity of a decision boundary (the ``'mod-glob'`` and
+    ``'mod-loc'`` regions) is found with the probabilities of the black box
+    and the surrogate respectively, hence this model has to have a
+    ``predict_proba`` method.
+
+    Sampling stops early once the confidence intervals of the agreement
+    (Wilson score interval) and the Mean Squared Error (normal
+    approximation) are narrower than ``tolerance`` (on each side), or once
+    ``max_samples`` points have been drawn.
+
+    Chunks are evaluated ``workers`` at a time. By default, they are
+    evaluated sequentially (``workers=1``) or with a process pool of
+    ``workers`` processes, which receive the black box and the surrogate
+    once, when they start. Alternatively, chunks are evaluated with the
+    ``executor`` -- any object with a ``map`` method, e.g., a
+    ``concurrent.futures.ThreadPoolExecutor`` -- in which case both models
+    are passed with every chunk (hence pickled for each chunk by a
+    process-based executor). Every chunk has its own random seed (spawned
+    from the ``random_seed``), therefore the results do not depend on the
+    executor.
+
+    Parameters
+    ----------
+    black_box : object
+        A fitted black box with a ``predict_proba`` or ``predict`` method.
+    surrogate : object
+        A fitted surrogate with a ``predict_proba`` or ``predict`` method.
+    region : string
+        One of ``REGIONS``.
+    sampler : callable
+        A function taking the number of samples and a numpy random generator
+        that returns a 2-dimensional array of data, e.g.,
+        :class:`UniformSampler` (for global regions) or
+        :class:`NormalSampler` (for local regions). It has to be picklable
+        for process-based executors.
+    instance : 1-dimensional numpy array, optional (default=None)
+        The explained instance (required for local regions when the
+        ``locality_radius`` is given).
+    locality_radius : number, optional (default=None)
+        The (Euclidean) radius of the neighbourhood of the ``instance`` for
+        the local regions. If ``None``, the locality is solely defined by
+        the ``sampler``.
+    boundary_margin : number, optional (default=0.2)
+        The maximum difference between the two most probable classes of a
+        point in the ``'mod-glob'`` (black box) and ``'mod-loc'``
+        (surrogate) regions.
+    chunk_size : integer, optional (default=10000)
+        The number of points drawn in each chunk.
+    max_samples : integer, optional (default=10**6)
+        The maximum number of drawn points.
+    min_region_samples : integer, optional (default=100)
+        The minimum number of points in the region before stopping early.
+    tolerance : number, optional (default=0.01)
+        The confidence interval half-width required to stop early.
+    confidence : number, optional (default=0.95)
+        The confidence level of the intervals.
+    executor : object, optional (default=None)
+        An object with a ``map`` method used to evaluate chunks. By default
+        (``None``), chunks are evaluated sequentially or -- for more than one
+        worker -- with a process pool created for the evaluation, in which
+        case the models and the ``sampler`` must be picklable.
+    workers : integer, optional (default=1)
+        The number of chunks evaluated at a time (and the number of
+        processes of the default executor).
+    random_seed : integer, optional (default=None)
+        The random seed of sampling.
+
+    Returns
+    -------
+    fidelity : dictionary
+        The ``agreement``, ``mse`` and ``weighted_purity`` metrics, the
+        half-widths of the confidence intervals (``agreement_ci`` and
+        ``mse_ci``), the bounds of the agreement confidence interval
+        (``agreement_interval``), the number of drawn points (``samples``)
+        and points in the region (``region_samples``), and whether the
+        estimates ``converged`` (stopped early).
+    """
+    assert region in REGIONS, 'Unknown evaluation region.'
+    assert callable(sampler), 'The sampler must be callable.'
+    for model in (black_box, surrogate):
+        assert (hasattr(model, 'predict_proba')
+                or hasattr(model, 'predict')), (
+            'The models must have a predict_proba or predict method.')
+    if region == 'mod-glob':
+        assert hasattr(black_box, 'predict_proba'), (
+            'The mod-glob region requires a probabilistic black box.')
+    elif region == 'mod-loc':
+        assert hasattr(surrogate, 'predict_proba'), (
+            'The mod-loc region requires a probabilistic surrogate.')
+    if region in ('inst-loc', 'mod-loc') and locality_radius is not None:
+        assert instance is not None, 'The instance is required.'
+        instance = np.asarray(instance, dtype=np.float64)
+    assert isinstance(chunk_size, int) and chunk_size > 0, 'Positive integer.'
+    assert isinstance(workers, int) and workers > 0, 'Positive integer.'
+    assert 0 < confidence < 1, 'Confidence between 0 and 1.'
+    assert tolerance > 0, 'Positive tolerance.'
+
+    classes = getattr(black_box, 'classes_', None)
+    if classes is None:
+        assert hasattr(black_box, 'predict_proba'), (
+            'A crisp black box must have the classes_ attribute.')
+        classes = np.arange(
+            black_box.predict_proba(sampler(1, np.random.default_rng(0)))
+            .shape[1])
+    classes = np.asarray(classes)
+    z = scipy.stats.norm.ppf((1 + confidence) / 2)
+
+    totals = dict(samples=0, region_samples=0, agreement=0.0,
+                  squared_error=0.0, squared_error_sq=0.0,
+                  counts=np.zeros((classes.shape[0], classes.shape[0])))
+    seeds = np.random.SeedSequence(random_seed)
+
+    owns_executor = executor is None and workers > 1
+    if owns_executor:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_initialise_worker,
+            initargs=(black_box, surrogate))
+        # The workers hold the models
+        task_models = (None, None)
+    else:
+        task_models = (black_box, surrogate)
+    map_ = map if executor is None else executor.map
+
+    converged = False
+    agreement = mse = agreement_ci = mse_ci = np.nan
+    agreement_interval = (np.nan, np.nan)
+    try:
+        while totals['samples'] < max_samples and not converged:
+            rounds = min(workers,
+                         -(-(max_samples - totals['samples']) // chunk_size))
+            tasks = [task_models + (region, sampler, chunk_size, instance,
+                                    locality_radius, boundary_margin,
+                                    classes, seed)
+                     for seed in seeds.spawn(rounds)]
+            for chunk in map_(_evaluate_chunk, tasks):
+                for key, value in chunk.items():
+                    totals[key] = totals[key] + value
+
+            n = totals['region_samples']
+            if n:
+                agreement = totals['agreement'] / n
+                mse = totals['squared_error'] / n
+                mse_var = max(totals['squared_error_sq'] / n - mse**2, 0)
+                agreement_interval = _get_wilson_interval(
+                    totals['agreement'], n, z)
+                agreement_ci = (agreement_interval[1]
+                                - agreement_interval[0]) / 2
+                mse_ci = z * np.sqrt(mse_var / n)
+                converged = (n >= min_region_samples
+                             and agreement_ci <= tolerance
+                             and mse_ci <= tolerance)
+    finally:
+        if owns_executor:
+            executor.shutdown(wait=True)
+
+    counts = totals['counts']
+    n = counts.sum()
+    weighted_purity_ = (np.sum(counts.sum(axis=1) * gini_index_counts(counts))
+                        / n if n else np.nan)
+
+    return dict(agreement=float(agreement),
+                mse=float(mse),
+                weighted_purity=float(weighted_purity_),
+                agreement_ci=float(agreement_ci),
+                mse_ci=float(mse_ci),
+                agreement_interval=tuple(
+                    float(bound) for bound in agreement_interval),
+                samples=totals['samples'],
+                region_samples=totals['region_samples'],
+                converged=bool(converged))
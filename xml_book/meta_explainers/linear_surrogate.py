@@ -0,0 +1,146 @@
+"""
+XML Book Linear Surrogate Module
+================================
+
+This module implements batched local linear surrogate explainers used by the
+book.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import numpy as np
+
+from xml_book.tools.instrumentation import instrument, span
+
+__all__ = ['explain_instances']
+
+
+def _get_predictions(predictive_function, data, class_index):
+    """Queries a black box and extracts (probabilistic) predictions."""
+    predictions = np.asarray(predictive_function(data))
+    if len(predictions.shape) == 2:
+        predictions = predictions[:, class_index]
+    assert predictions.shape == (data.shape[0], ), (
+        'The predictive function must return one number (or one row of '
+        'probabilities) per instance.')
+    return predictions
+
+
+@instrument()
+def explain_instances(instances, predictive_function, samples_number=1000,
+                      scale=1.0, kernel_width=None, class_index=1,
+                      batch_size=100, ridge=1e-6, random_generator=None):
+    """
+    Explains a collection of instances with local linear surrogates.
+
+    For each instance, ``samples_number`` points are drawn from a normal
+    distribution centred at this instance (with the ``scale`` standard
+    deviation) -- see
+    :func:`xml_book.meta_explainers.plot_examples.sample_linear_surrogate`
+    for a two-dimensional illustration.
+    The samples are weighted with an exponential kernel of their
+    (``scale``-standardised) distance to the instance, and a weighted linear
+    regression is fitted to the black-box predictions of the samples.
+
+    The instances are processed in batches: the samples of a whole batch are
+    predicted with a single call of the ``predictive_function``, and all the
+    weighted least-squares problems of the batch are solved together as
+    stacked normal equations with one call of ``np.linalg.solve``.
+
+    Parameters
+    ----------
+    instances : 2-dimensional numpy array
+        The instances to be explained (one per row).
+    predictive_function : callable
+        A black box returning either numbers (1-dimensional array) or
+        probabilities (2-dimensional array) for a 2-dimensional data array,
+        e.g., the ``predict_proba`` method of a fitted model.
+    samples_number : integer, optional (default=1000)
+        The number of samples drawn around each instance.
+    scale : number or 1-dimensional numpy array, optional (default=1.0)
+        The standard deviation of sampling (for each feature).
+    kernel_width : number, optional (default=None)
+        The width of the exponential kernel. By default (``None``), it is
+        set to ``0.75 * sqrt(features_number)``.
+    class_index : integer, optional (default=1)
+        The column of the probabilities to be explained (ignored when the
+        ``predictive_function`` outputs numbers).
+    batch_size : integer, optional (default=100)
+        The number of instances explained together.
+    ridge : number, optional (default=1e-6)
+        The L2 regularisation of the coefficients, which keeps the normal
+        equations well-conditioned.
+    random_generator : numpy random generator, optional (default=None)
+        A ``numpy.random.Generator`` used for sampling. By default
+        (``None``), a fresh, unseeded generator is used.
+
+    Returns
+    -------
+    coefficients : 2-dimensional numpy array
+        The coefficients of the surrogate of each instance (one per row).
+    intercepts : 1-dimensional numpy array
+        The intercept of the surrogate of each instance.
+    """
+    instances = np.asarray(instances, dtype=np.float64)
+    assert len(instances.shape) == 2, 'The instances have to be a 2-D array.'
+    assert callable(predictive_function), 'The predictive function.'
+    assert isinstance(samples_number, int) and samples_number > 0, (
+        'Positive integer.')
+    assert isinstance(batch_size, int) and batch_size > 0, 'Positive integer.'
+    assert ridge >= 0, 'Non-negative regularisation.'
+
+    instances_number, features_number = instances.shape
+    scale = np.broadcast_to(
+        np.asarray(scale, dtype=np.float64), (features_number, ))
+    assert np.all(scale > 0), 'Positive scale.'
+    if kernel_width is None:
+        kernel_width = 0.75 * np.sqrt(features_number)
+    assert kernel_width > 0, 'Positive kernel width.'
+    if random_generator is None:
+        random_generator = np.random.default_rng()
+
+    coefficients = np.empty((instances_number, features_number),
+                            dtype=np.float64)
+    intercepts = np.empty(instances_number, dtype=np.float64)
+    regularisation = ridge * np.eye(features_number + 1)
+    # Do not penalise the intercept
+    regularisation[-1, -1] = 0
+
+    for start in range(0, instances_number, batch_size):
+        batch = instances[start:start + batch_size]
+        batch_number = batch.shape[0]
+
+        # Sample around each instance of the batch
+        standardised = random_generator.standard_normal(
+            (batch_number, samples_number, features_number))
+        offsets = standardised * scale
+        samples = batch[:, np.newaxis, :] + offsets
+
+        with span('predict') as span_:
+            span_.add('rows', batch_number * samples_number)
+            predictions = _get_predictions(
+                predictive_function,
+                samples.reshape(-1, features_number), class_index)
+        predictions = predictions.reshape(batch_number, samples_number)
+
+        # Exponential kernel of the standardised distance
+        distances_sq = np.einsum('bsf,bsf->bs', standardised, standardised)
+        weights = np.exp(-distances_sq / kernel_width**2)
+
+        # Design matrix centred at the instances with an intercept column
+        design = np.concatenate(
+            [offsets, np.ones((batch_number, samples_number, 1))], axis=2)
+        weighted_design = design * weights[..., np.newaxis]
+        gram = np.matmul(weighted_design.transpose(0, 2, 1), design)
+        gram += regularisation
+        moment = np.einsum('bsf,bs->bf', weighted_design, predictions)
+        solution = np.linalg.solve(gram, moment[..., np.newaxis])[..., 0]
+
+        # Move the intercept from the instance to the origin
+        batch_coefficients = solution[:, :-1]
+        coefficients[start:start + batch_number] = batch_coefficients
+        intercepts[start:start + batch_number] = (
+            solution[:, -1] - np.einsum('bf,bf->b', batch_coefficients, batch))
+
+    return coefficients, intercepts
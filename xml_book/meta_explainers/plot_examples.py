@@ -8,6 +8,9 @@ This module implements functions for plotting examples.
 # Author: Kacper Sokol <kacper@xmlx.dev>
 # License: MIT
 
+import functools
+import itertools
+
 import matplotlib.colors as plt_colors
 import numpy as np
 import scipy.interpolate as interpolate
@@ -17,26 +20,75 @@ from matplotlib.collections import PatchCollection
 from matplotlib.patches import Rectangle
 
 from xml_book import RANDOM_SEED
+from xml_book.config import setup_plotting
 
 
-__all__ = ['local_linear_surrogate']
+__all__ = ['local_linear_surrogate', 'local_surrogate_variants']
 
 LINEAR_MODEL = np.array([[3.8, -1], [5.15, 9]])
 X_CIRC = (4.3, 5)
 
+# Control points of the black-box decision boundary
+BOUNDARY_X = np.array(
+    [0.0, 1.5, 3.0, 1.5, 3.0, 5.0, 8.5, 10.0, 8.0, 9.5, 12.5, 15.0, 14.0, 11.0])
+BOUNDARY_Y = np.array(
+    [8.0, 7.5, 7.0, 2.5, 1.0, 7.5, 1.0,  3.5, 5.0, 7.0,  0.0,  6.0,  8.0,  9.0])
+EVAL_REGIONS = ('mod-loc', 'mod-glob', 'inst-loc', 'inst-glob')
+SURROGATE_TYPES = ('linear', 'tree')
+# Samples larger than this number are plotted as a density (hexbin)
+DENSITY_THRESHOLD = 10000
+
+setup_plotting()
+
+
+@functools.lru_cache(maxsize=None)
+def get_decision_boundary(points_number=500):
+    """
+    Computes (and memoises) the smoothed black-box decision boundary.
+
+    The ``BOUNDARY_X`` and ``BOUNDARY_Y`` control points are interpolated
+    with a spline parameterised by the distance along the boundary.
+    The returned arrays are read-only since they are shared between calls.
+
+    Parameters
+    ----------
+    points_number : integer, optional (default=500)
+        The number of points sampled along the spline.
+
+    Returns
+    -------
+    interp_x : 1-dimensional numpy array
+        The x coordinates of the boundary.
+    interp_y : 1-dimensional numpy array
+        The y coordinates of the boundary.
+    """
+    x, y = BOUNDARY_X, BOUNDARY_Y
+
+    # Smooth
+    dist = np.sqrt((x[:-1] - x[1:])**2 + (y[:-1] - y[1:])**2)
+    dist_along = np.concatenate(([0], dist.cumsum()))
+    spline, u = interpolate.splprep([x, y], u=dist_along, s=0)
+    interp_d = np.linspace(dist_along[0], dist_along[-1], points_number)
+    interp_x, interp_y = interpolate.splev(interp_d, spline)
+
+    interp_x.setflags(write=False)
+    interp_y.setflags(write=False)
+    return interp_x, interp_y
+
 
 def draw_local_surrogate_line(ax):
-    ax.plot(LINEAR_MODEL[:, 0], LINEAR_MODEL[:, 1],
+    lines = ax.plot(LINEAR_MODEL[:, 0], LINEAR_MODEL[:, 1],
              '--', c='black', alpha=.7, linewidth=3)
+    return lines
 
 
 def draw_local_surrogate_tree(ax):
     # y: 0--9
     # , 11.5, 15 # , 0, 0 # , 9, 9
-    ax.vlines([2, 4.5, 6, 9], [0, 0, 0, 0], [7, 7, 7, 7],
+    vl = ax.vlines([2, 4.5, 6, 9], [0, 0, 0, 0], [7, 7, 7, 7],
             linestyles='--', colors='black', alpha=.7, linewidth=3)
     # x: 0--15
-    ax.hlines([7], [0], [15],  # 11.5
+    hl = ax.hlines([7], [0], [15],  # 11.5
             linestyles='--', colors='black', alpha=.7, linewidth=3)
 
     surrogate = []
@@ -47,89 +99,161 @@ def draw_local_surrogate_tree(ax):
     pc = PatchCollection(  # facecolor=None
         surrogate, match_original=True, hatch='//', linewidth=0, edgecolor=None)
     ax.add_collection(pc)
+    return [vl, hl, pc]
 
 
-def local_surrogate(
-        plot_axis=None, figsize=(10, 8), surrogate_type=None, eval=None):
+def draw_local_surrogate_base(ax):
     """
-    Visualises an example of a local surrogate in 2 dimensions.
+    Draws the background and the black-box decision boundary.
     """
-    # Evaluation parameters
-    assert eval is None or eval in ('mod-loc', 'mod-glob', 'inst-loc', 'inst-glob'), (
-        'Unknown evaluation area.')
-    assert surrogate_type is None or surrogate_type in ('linear', 'tree'), (
-        'Unknown surrogate type.')
-    eval_par = dict(color='gray', alpha=.5)
-    eval_error = .5
-    eval_edge = 3
-    eval_track = 20
+    interp_x, interp_y = get_decision_boundary()
 
-    if plot_axis is None:
-        fig = plt.figure(figsize=figsize)  # dpi=600
-        fig, ax = plt.subplots(1, 1, figsize=figsize)
-        # plt.set_size_inches(10, 8)
-    else:
-        fig = None
-        ax = plot_axis
-
-    # Define points
-    x = np.array([0.0, 1.5, 3.0, 1.5, 3.0, 5.0, 8.5, 10.0, 8.0, 9.5, 12.5, 15.0, 14.0, 11.0])
-    y = np.array([8.0, 7.5, 7.0, 2.5, 1.0, 7.5, 1.0,  3.5, 5.0, 7.0,  0.0,  6.0,  8.0,  9.0])
-
-    # Smooth
-    dist = np.sqrt((x[:-1] - x[1:])**2 + (y[:-1] - y[1:])**2)
-    dist_along = np.concatenate(([0], dist.cumsum()))
-    spline, u = interpolate.splprep([x, y], u=dist_along, s=0)
-    interp_d = np.linspace(dist_along[0], dist_along[-1], 500)
-    interp_x, interp_y = interpolate.splev(interp_d, spline)
-
-    # Plot
     r = Rectangle((-0.5,-0.5), 16.5, 10.0,
                   color='blue', alpha=0.1, fill=True, linewidth=0)
     ax.add_patch(r)
 
     ax.fill(interp_x, interp_y, '--', c='red', alpha=0.2)
 
-    # Plot evaluation region
+    ax.set_xlim((-0.1, 15.15))
+    ax.set_ylim((-0.1, 9.05))
+
+    ax.set_xticks([])
+    ax.set_yticks([])
+
+    ax.tick_params(axis='both',
+                    which='both', bottom='off', top='off', labelbottom='off',
+                    right='off', left='off', labelleft='off')
+
+
+def draw_local_surrogate_eval(ax, eval):
+    """
+    Draws an evaluation region and returns the list of its artists.
+    """
+    eval_par = dict(color='gray', alpha=.5)
+    eval_error = .5
+    eval_edge = 3
+    eval_track = 20
+
     if eval == 'mod-glob':
-        xx, yy = np.append(interp_x, x[0]), np.append(interp_y, y[0])
-        ax.plot(xx, yy, '-', linewidth=eval_track, **eval_par)
+        interp_x, interp_y = get_decision_boundary()
+        xx = np.append(interp_x, BOUNDARY_X[0])
+        yy = np.append(interp_y, BOUNDARY_Y[0])
+        artists = ax.plot(xx, yy, '-', linewidth=eval_track, **eval_par)
     elif eval == 'mod-loc':
-        ax.fill_betweenx(
+        artists = [ax.fill_betweenx(
             LINEAR_MODEL[:, 1],
             LINEAR_MODEL[:, 0] + eval_error,
             LINEAR_MODEL[:, 0] - eval_error,
-            **eval_par)  # hatch='///'
+            **eval_par)]  # hatch='///'
     elif eval == 'inst-glob':
         r = Rectangle((-0.5, -0.5), 16.5, 10.0,  # fill=False, hatch='///'
                       fill=True, linewidth=0, **eval_par)
-        ax.add_patch(r)
+        artists = [ax.add_patch(r)]
     elif eval == 'inst-loc':
         r = Rectangle([i - eval_edge / 2 for i in X_CIRC],
                       eval_edge, eval_edge,  # fill=False, hatch='///'
                       fill=True, linewidth=0, **eval_par)
-        ax.add_patch(r)
+        artists = [ax.add_patch(r)]
     else:
         assert eval is None
+        artists = []
+
+    return artists
+
+
+def draw_local_surrogate_overlay(ax, surrogate_type=None, eval=None):
+    """
+    Draws an evaluation region and a surrogate, and returns their artists.
+    """
+    artists = draw_local_surrogate_eval(ax, eval)
 
     if surrogate_type == 'linear':
-        draw_local_surrogate_line(ax)
+        artists += draw_local_surrogate_line(ax)
     elif surrogate_type == 'tree':
-        draw_local_surrogate_tree(ax)
+        artists += draw_local_surrogate_tree(ax)
 
-    ax.set_xlim((-0.1, 15.15))
-    ax.set_ylim((-0.1, 9.05))
+    return artists
 
-    ax.set_xticks([])
-    ax.set_yticks([])
 
-    ax.tick_params(axis='both',
-                    which='both', bottom='off', top='off', labelbottom='off',
-                    right='off', left='off', labelleft='off')
+def local_surrogate(
+        plot_axis=None, figsize=(10, 8), surrogate_type=None, eval=None):
+    """
+    Visualises an example of a local surrogate in 2 dimensions.
+    """
+    # Evaluation parameters
+    assert eval is None or eval in EVAL_REGIONS, 'Unknown evaluation area.'
+    assert surrogate_type is None or surrogate_type in SURROGATE_TYPES, (
+        'Unknown surrogate type.')
+
+    if plot_axis is None:
+        fig, ax = plt.subplots(1, 1, figsize=figsize)  # dpi=600
+        # plt.set_size_inches(10, 8)
+    else:
+        fig = None
+        ax = plot_axis
+
+    draw_local_surrogate_base(ax)
+    draw_local_surrogate_overlay(ax, surrogate_type=surrogate_type, eval=eval)
+
     plt.tight_layout()
     return fig, ax
 
 
+def local_surrogate_variants(variants=None, figsize=(10, 8)):
+    """
+    Iterates over variants of the local surrogate example drawn on one figure.
+
+    The background and the decision boundary are drawn only once; for each
+    variant the evaluation region and the surrogate are overlaid on the base
+    figure and removed before the next variant is drawn.
+    The figure is therefore only valid (e.g., for displaying or saving it)
+    within the iteration step that yielded it, and it is closed once the
+    iteration is finished.
+
+    Parameters
+    ----------
+    variants : list of 2-tuples, optional (default=None)
+        A list of ``(surrogate_type, eval)`` pairs accepted by
+        :func:`local_surrogate`. By default (``None``), all combinations of
+        the surrogate types and evaluation regions are used.
+    figsize : 2-tuple, optional (default=(10, 8))
+        The size of the figure.
+
+    Yields
+    ------
+    variant : 2-tuple
+        The ``(surrogate_type, eval)`` pair.
+    fig : matplotlib.figure.Figure
+        The figure.
+    ax : matplotlib.axes.Axes
+        The axis of the figure.
+    """
+    if variants is None:
+        variants = itertools.product(SURROGATE_TYPES, EVAL_REGIONS)
+    variants = list(variants)
+    for surrogate_type, eval in variants:
+        assert eval is None or eval in EVAL_REGIONS, (
+            'Unknown evaluation area.')
+        assert surrogate_type is None or surrogate_type in SURROGATE_TYPES, (
+            'Unknown surrogate type.')
+
+    fig, ax = plt.subplots(1, 1, figsize=figsize)
+    draw_local_surrogate_base(ax)
+    plt.tight_layout()
+
+    try:
+        for surrogate_type, eval in variants:
+            artists = draw_local_surrogate_overlay(
+                ax, surrogate_type=surrogate_type, eval=eval)
+            try:
+                yield (surrogate_type, eval), fig, ax
+            finally:
+                for artist in artists:
+                    artist.remove()
+    finally:
+        plt.close(fig)
+
+
 def local_linear_surrogate(
         plot_axis=None, figsize=(10, 8), plot_line=True, eval=None):
     """
@@ -144,12 +268,160 @@ def local_linear_surrogate(
     return fig, ax
 
 
+@functools.lru_cache(maxsize=None)
+def get_linear_surrogate_coefficients():
+    """
+    Fits (and memoises) the slope and intercept of the ``LINEAR_MODEL`` line.
+
+    Returns
+    -------
+    m : float
+        The slope of the line.
+    c : float
+        The intercept of the line.
+    """
+    x, y = LINEAR_MODEL[:, 0], LINEAR_MODEL[:, 1]
+    A = np.vstack([x, np.ones(len(x))]).T
+    m, c = np.linalg.lstsq(A, y, rcond=None)[0]
+    return m, c
+
+
+def classify_linear_surrogate(points):
+    """
+    Classifies points with the linear surrogate.
+
+    Points lying on the left of (above) the ``LINEAR_MODEL`` line are assigned
+    class ``1``; the remaining points are assigned class ``0``.
+
+    Parameters
+    ----------
+    points : 2-dimensional numpy array
+        An array of 2-dimensional points (one per row).
+
+    Returns
+    -------
+    labels : 1-dimensional numpy array
+        An integer array with class labels of the ``points``.
+    """
+    points = np.asarray(points)
+    assert len(points.shape) == 2, 'Expect 2D numpy array'
+    m, c = get_linear_surrogate_coefficients()
+    y_ = m * points[:, 0] + c - points[:, 1]
+    labels = (y_ <= 0).astype(np.int8)
+    return labels
+
+
+def sample_linear_surrogate(
+        samples_number=20, scale=(.75, 1.5), random_generator=None):
+    """
+    Samples points around ``X_CIRC`` and classifies them with the linear
+    surrogate.
+
+    Parameters
+    ----------
+    samples_number : integer, optional (default=20)
+        The number of points to sample.
+    scale : 2-tuple of floats, optional (default=(.75, 1.5))
+        The standard deviation of the normal distribution along each axis.
+    random_generator : numpy random generator, optional (default=None)
+        A ``numpy.random.Generator`` (or a legacy
+        ``numpy.random.RandomState``) used for sampling. By default
+        (``None``), a fresh, unseeded generator is used.
+
+    Returns
+    -------
+    sample : 2-dimensional numpy array
+        The sampled points.
+    labels : 1-dimensional numpy array
+        Class labels of the ``sample`` (see
+        :func:`classify_linear_surrogate`).
+    """
+    assert isinstance(samples_number, int) and samples_number >= 0, (
+        'Non-negative integer.')
+    if random_generator is None:
+        random_generator = np.random.default_rng()
+    sample = random_generator.normal(
+        loc=X_CIRC, scale=scale, size=(samples_number, 2))
+    labels = classify_linear_surrogate(sample)
+    return sample, labels
+
+
+def plot_linear_surrogate_sample(
+        ax, sample, labels, scale_points=True,
+        density_threshold=DENSITY_THRESHOLD, gridsize=50):
+    """
+    Plots a sample classified by the linear surrogate.
+
+    Samples larger than ``density_threshold`` are aggregated into a hexagonal
+    grid (coloured by the proportion of class ``1``) instead of being drawn
+    point by point, which keeps plotting fast and the figure small.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        The axis to plot on.
+    sample : 2-dimensional numpy array
+        The sampled points.
+    labels : 1-dimensional numpy array
+        Class labels of the ``sample``.
+    scale_points : boolean, optional (default=True)
+        Whether to scale the scatter points by their distance to ``X_CIRC``.
+    density_threshold : integer, optional (default=DENSITY_THRESHOLD)
+        The sample size above which the points are aggregated. If ``None``,
+        the points are always scattered.
+    gridsize : integer, optional (default=50)
+        The number of hexagons along the x axis.
+
+    Returns
+    -------
+    artists : list of matplotlib artists
+        The artists plotting the sample.
+    """
+    cc = plt.get_cmap('tab10')  # Set3
+    colours = [plt_colors.rgb2hex(cc(i)) for i in range(cc.N)]
+
+    sample_colour = labels.astype(bool)
+
+    if density_threshold is not None and sample.shape[0] > density_threshold:
+        cmap = plt_colors.LinearSegmentedColormap.from_list(
+            'surrogate', [colours[0], colours[3]])
+        artists = [ax.hexbin(
+            sample[:, 0], sample[:, 1], C=sample_colour,
+            reduce_C_function=np.mean, gridsize=gridsize, cmap=cmap,
+            vmin=0, vmax=1, extent=(-0.1, 15.15, -0.1, 9.05), mincnt=1,
+            linewidths=0, zorder=9, alpha=.8)]
+    else:
+        scale = 250 if scale_points else 100
+        if scale_points:
+            sample_size = 50 / np.linalg.norm(sample - X_CIRC, axis=1)
+            scale_0 = sample_size[sample_colour]
+            scale_1 = sample_size[~sample_colour]
+        else:
+            scale_0, scale_1 = scale, scale
+
+        artists = [
+            ax.scatter(sample[sample_colour, 0], sample[sample_colour, 1],
+                c=colours[3], marker='P', s=scale_0, zorder=9, alpha=.8),
+            ax.scatter(sample[~sample_colour, 0], sample[~sample_colour, 1],
+                c=colours[0], marker='$\u25AC$', s=scale_1, zorder=9, alpha=.8)
+        ]
+
+    return artists
+
+
 def local_linear_surrogate_advanced(
         plot_axis=None, figsize=(10, 8), plot_line=True, eval=None,
-        scale_points=True, plot_sample=True):
+        scale_points=True, plot_sample=True, samples_number=20,
+        sample_scale=(.75, 1.5), random_generator=None,
+        density_threshold=DENSITY_THRESHOLD):
     """
     Visualises an example of a local linear surrogate in 2 dimensions
     with sampling and scaling.
+
+    By default the sample is drawn from a ``numpy.random.RandomState`` seeded
+    with ``RANDOM_SEED`` (without reseeding the global numpy generator); see
+    :func:`sample_linear_surrogate` and :func:`plot_linear_surrogate_sample`
+    for the description of the sampling and plotting parameters.
     """
     cc = plt.get_cmap('tab10')  # Set3
     colours = [plt_colors.rgb2hex(cc(i)) for i in range(cc.N)]
@@ -157,33 +429,19 @@ def local_linear_surrogate_advanced(
     fig, ax = local_linear_surrogate(
         plot_axis=plot_axis, figsize=figsize, plot_line=plot_line, eval=eval)
 
-    np.random.seed(RANDOM_SEED)
-    sample = np.random.normal(loc=X_CIRC, scale=(.75, 1.5), size=(20, 2))
-
-    x, y = LINEAR_MODEL[:, 0], LINEAR_MODEL[:, 1]
-    A = np.vstack([x, np.ones(len(x))]).T
-    m, c = np.linalg.lstsq(A, y, rcond=None)[0]
-    def surrogate(points):
-        assert len(points.shape) == 2, 'Expect 2D numpy array'
-        y_ = m * points[:, 0] + c - points[:, 1]
-        y = np.vectorize(lambda i: 0 if i > 0 else 1)(y_)
-        return y
-
-    sample_y = surrogate(sample)
-    sample_colour = np.vectorize(lambda i: True if i else False)(sample_y)
-    sample_size = 50 / np.linalg.norm(sample - X_CIRC, axis=1)
+    if random_generator is None:
+        random_generator = np.random.RandomState(RANDOM_SEED)
+    sample, sample_y = sample_linear_surrogate(
+        samples_number=samples_number, scale=sample_scale,
+        random_generator=random_generator)
 
     scale = 250 if scale_points else 100
-    scale_0 = sample_size[sample_colour] if scale_points else scale
-    scale_1 = sample_size[~sample_colour] if scale_points else scale
-
     ax.scatter(*X_CIRC, marker='P', s=scale, linewidths=2,
                c=colours[3], edgecolors=colours[2], zorder=10, alpha=.9)
     if plot_sample:
-        ax.scatter(sample[sample_colour, 0], sample[sample_colour, 1],
-                c=colours[3], marker='P', s=scale_0, zorder=9, alpha=.8)
-        ax.scatter(sample[~sample_colour, 0], sample[~sample_colour, 1],
-                c=colours[0], marker='$\u25AC$', s=scale_1, zorder=9, alpha=.8)
+        plot_linear_surrogate_sample(
+            ax, sample, sample_y, scale_points=scale_points,
+            density_threshold=density_threshold)
 
     plt.tight_layout()
     return fig, ax
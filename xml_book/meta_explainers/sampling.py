@@ -0,0 +1,229 @@
+"""
+XML Book Sampling Module
+========================
+
+This module implements frequency-weighted sampling of discretised data.
+
+Discretised data (e.g., quartile bin IDs) are sampled in proportion to the
+frequency of the bins -- or the hyper-rectangles (joint cells) -- in the
+reference data with Walker's alias method (Vose's construction). After the
+tables are built, drawing a sample costs a constant number of operations
+regardless of the number of bins, and the sampled codes can be undiscretised
+with :func:`xml_book.meta_explainers.surrogates.undiscretise_data`::
+
+    sampler = AliasSampler(dataset, discretiser)
+    discretised_data = sampler.sample(10**6)
+    data = undiscretise_data(discretised_data, discretiser, dataset)
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import numpy as np
+
+from xml_book.tools.instrumentation import instrument, span
+
+__all__ = ['build_alias_table', 'sample_alias_table', 'AliasSampler']
+
+
+def build_alias_table(weights):
+    """
+    Builds an alias table of a discrete distribution (Vose's algorithm).
+
+    Parameters
+    ----------
+    weights : 1-dimensional numpy array
+        Non-negative (unnormalised) weights of the outcomes.
+
+    Returns
+    -------
+    probabilities : 1-dimensional numpy array
+        The probability of keeping each drawn outcome.
+    aliases : 1-dimensional numpy array
+        The outcome used instead of each drawn outcome when it is not kept.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    assert len(weights.shape) == 1 and weights.shape[0], (
+        'The weights must be a non-empty 1-D array.')
+    assert np.all(weights >= 0) and weights.sum() > 0, (
+        'The weights must be non-negative and not all zero.')
+    outcomes_number = weights.shape[0]
+
+    scaled = weights * (outcomes_number / weights.sum())
+    probabilities = np.ones(outcomes_number, dtype=np.float64)
+    aliases = np.arange(outcomes_number, dtype=np.intp)
+
+    is_small = scaled < 1
+    small = np.flatnonzero(is_small).tolist()
+    large = np.flatnonzero(~is_small).tolist()
+    # The pairing loop works on Python floats, which are faster to index
+    # than numpy scalars, and the table is filled in afterwards
+    scaled_ = scaled.tolist()
+    small_paired, large_paired = [], []
+    while small and large:
+        small_i, large_i = small.pop(), large.pop()
+        small_paired.append(small_i)
+        large_paired.append(large_i)
+        scaled_[large_i] -= 1 - scaled_[small_i]
+        if scaled_[large_i] < 1:
+            small.append(large_i)
+        else:
+            large.append(large_i)
+    # The remaining outcomes (up to rounding errors) are always kept; the
+    # scaled weight of a small outcome does not change once it is paired
+    probabilities[small_paired] = np.asarray(scaled_)[small_paired]
+    aliases[small_paired] = large_paired
+
+    return probabilities, aliases
+
+
+def sample_alias_table(probabilities, aliases, samples_number,
+                       random_generator, out=None):
+    """
+    Samples outcomes from an alias table.
+
+    Parameters
+    ----------
+    probabilities : 1-dimensional numpy array
+        The first output of :func:`build_alias_table`.
+    aliases : 1-dimensional numpy array
+        The second output of :func:`build_alias_table`.
+    samples_number : integer
+        The number of samples.
+    random_generator : numpy random generator
+        A ``numpy.random.Generator`` used for sampling.
+    out : 1-dimensional numpy array, optional (default=None)
+        An (integer) array of ``samples_number`` elements where the sampled
+        outcomes are placed.
+
+    Returns
+    -------
+    samples : 1-dimensional numpy array
+        The indices of the sampled outcomes.
+    """
+    drawn = random_generator.integers(probabilities.shape[0],
+                                      size=samples_number)
+    kept = random_generator.random(samples_number) < probabilities[drawn]
+    samples = np.where(kept, drawn, aliases[drawn])
+    if out is None:
+        return samples
+    out[...] = samples
+    return out
+
+
+class AliasSampler(object):
+    """
+    Samples discretised data in proportion to the reference data frequencies.
+
+    With ``joint=False`` the features are sampled independently, each from
+    the frequencies of its bins; with ``joint=True`` whole hyper-rectangles
+    (the unique rows of the discretised reference data) are sampled from
+    their frequencies, therefore preserving the dependencies between the
+    features.
+
+    Parameters
+    ----------
+    dataset : 2-dimensional numpy array
+        The reference data set.
+    discretiser : fat-forensics discretiser object
+        A (fitted) discretiser that is compatible with the ``dataset``.
+    joint : boolean, optional (default=False)
+        Whether to sample hyper-rectangles rather than individual features.
+    dtype : numpy dtype, optional (default=None)
+        The (integer) dtype of the samples. By default (``None``), the
+        smallest integer type holding all the bin IDs is used, e.g.,
+        ``numpy.int8`` for quartiles (same as the discretiser output). The
+        samples are not bit-packed, hence they can be undiscretised directly.
+
+    Attributes
+    ----------
+    features_number : integer
+        The number of features.
+    tables : list of tuples
+        The alias tables -- one per feature, or a single one of the
+        hyper-rectangles if ``joint`` is ``True``.
+    cells : 2-dimensional numpy array
+        The sampled hyper-rectangles (only if ``joint`` is ``True``).
+    """
+
+    def __init__(self, dataset, discretiser, joint=False, dtype=None):
+        """Initialises AliasSampler class."""
+        assert len(dataset.shape) == 2, 'The data must be a 2-D array.'
+        assert dataset.shape[0], 'The data must not be empty.'
+        with span('discretise') as span_:
+            span_.add('rows', dataset.shape[0])
+            dataset_discretised = discretiser.discretise(dataset)
+
+        self.features_number = dataset_discretised.shape[1]
+        self.joint = joint
+        max_code = max(int(dataset_discretised.max()), 0)
+        if dtype is None:
+            dtype = np.promote_types(np.min_scalar_type(-max_code - 1),
+                                     np.int8)
+        self.dtype = np.dtype(dtype)
+        assert np.issubdtype(self.dtype, np.integer), 'An integer dtype.'
+        assert np.iinfo(self.dtype).max >= max_code, (
+            'The dtype cannot hold all the bin IDs.')
+
+        if joint:
+            self.cells, counts = np.unique(
+                dataset_discretised, axis=0, return_counts=True)
+            self.cells = self.cells.astype(self.dtype)
+            self.tables = [build_alias_table(counts)]
+        else:
+            self.cells = None
+            self.tables = []
+            for index in range(self.features_number):
+                column = dataset_discretised[:, index].astype(np.intp)
+                assert column.min() >= 0, 'Bin IDs must be non-negative.'
+                self.tables.append(build_alias_table(np.bincount(column)))
+
+    @instrument()
+    def sample(self, samples_number, random_generator=None, out=None,
+               batch_size=2**20):
+        """
+        Samples discretised data.
+
+        Parameters
+        ----------
+        samples_number : integer
+            The number of samples.
+        random_generator : numpy random generator, optional (default=None)
+            A ``numpy.random.Generator`` used for sampling. By default
+            (``None``), a fresh, unseeded generator is used.
+        out : 2-dimensional numpy array, optional (default=None)
+            A preallocated (integer) array of shape ``(samples_number,
+            features_number)`` where the samples are placed.
+        batch_size : integer, optional (default=2**20)
+            The number of samples drawn at a time, which bounds the memory
+            of the intermediate (index) arrays.
+
+        Returns
+        -------
+        discretised_data : 2-dimensional numpy array
+            The sampled discretised data.
+        """
+        assert isinstance(samples_number, int) and samples_number >= 0, (
+            'Non-negative integer.')
+        assert isinstance(batch_size, int) and batch_size > 0, (
+            'Positive integer.')
+        if random_generator is None:
+            random_generator = np.random.default_rng()
+        if out is None:
+            out = np.empty((samples_number, self.features_number),
+                           dtype=self.dtype)
+        assert out.shape == (samples_number, self.features_number), (
+            'The output array has an incorrect shape.')
+
+        for start in range(0, samples_number, batch_size):
+            stop = min(start + batch_size, samples_number)
+            if self.joint:
+                cells = sample_alias_table(*self.tables[0], stop - start,
+                                           random_generator)
+                out[start:stop] = self.cells[cells]
+            else:
+                for index, table in enumerate(self.tables):
+                    sample_alias_table(*table, stop - start, random_generator,
+                                       out=out[start:stop, index])
+
+        return out
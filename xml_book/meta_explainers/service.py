@@ -0,0 +1,340 @@
+"""
+XML Book Explanation Service Module
+===================================
+
+This module implements an asynchronous runner of surrogate explanation jobs.
+
+The runner is meant to be used as the front-end of a web service: concurrent
+requests targeting the same model and discretiser are micro-batched into
+a single :func:`xml_book.meta_explainers.surrogates.undiscretise_data` and
+prediction call, which is executed in a pool of worker processes (or any
+other ``concurrent.futures`` executor) without blocking the event loop::
+
+    runner = ExplanationRunner()
+    runner.register('bikes', model, discretiser, dataset)
+    async with runner:
+        undiscretised, predictions = await runner.explain(
+            'bikes', discretised_sample)
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import asyncio
+import concurrent.futures
+
+import numpy as np
+
+from xml_book.meta_explainers.surrogates import (get_bin_sampling_values,
+                                                 undiscretise_data)
+
+__all__ = ['ExplanationRunner']
+
+
+# The contexts of the registered models installed in the worker processes of
+# the default executor (see _initialise_worker)
+_WORKER_CONTEXTS = {}
+
+
+def _initialise_worker(contexts):
+    """Installs the model contexts in a worker process (once)."""
+    _WORKER_CONTEXTS.update(contexts)
+
+
+def _explain_batch(key, context, seed, discretised_data):
+    """
+    Undiscretises and predicts a batch of data (in a worker).
+
+    The context of the model is either given or -- if ``None`` -- retrieved
+    from the contexts installed in the worker process.
+    """
+    if context is None:
+        context = _WORKER_CONTEXTS[key]
+    model, method, discretiser, dataset, bin_sampling_values = context
+    undiscretised_data = undiscretise_data(
+        discretised_data, discretiser, dataset,
+        bin_sampling_values=bin_sampling_values,
+        random_generator=np.random.default_rng(seed))
+    predictions = getattr(model, method)(undiscretised_data)
+    return undiscretised_data, predictions
+
+
+class ExplanationRunner(object):
+    """
+    Runs explanation jobs asynchronously with micro-batching.
+
+    Each registered model/discretiser pair has its own queue of jobs.
+    The jobs waiting in a queue are combined into a batch of at most
+    ``max_batch_rows`` rows -- waiting up to ``max_delay`` seconds for more
+    jobs to arrive -- which is undiscretised and predicted with a single call
+    in the ``executor``.
+
+    Backpressure is applied with the queue depth limit: once
+    ``max_queue_depth`` jobs wait for a model, :meth:`explain` waits for
+    space in the queue (or fails immediately if ``wait`` is ``False``).
+    At most ``max_pending_batches`` batches are processed at a time.
+
+    Every batch is undiscretised with its own random generator seeded with
+    a child of the ``random_seed`` sequence, hence the batches (and the
+    processes executing them) never share random samples.
+    The default process pool receives the registered models, discretisers
+    and bin sampling values once, when its workers start; only the data are
+    sent with each batch.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor, optional (default=None)
+        The executor of the CPU-bound work. By default (``None``), a process
+        pool with ``max_workers`` processes is created when the runner starts
+        (and shut down when it stops), in which case the registered models
+        and discretisers must be picklable. A
+        ``concurrent.futures.ThreadPoolExecutor`` can be used to run
+        in-process (e.g., with stand-in models for local testing).
+    max_workers : integer, optional (default=None)
+        The number of processes of the default executor.
+    max_batch_rows : integer, optional (default=10000)
+        The maximum number of rows of a batch (a single job larger than this
+        is processed on its own).
+    max_delay : number, optional (default=0.005)
+        The maximum time (in seconds) a batch waits for more jobs.
+    max_queue_depth : integer, optional (default=1000)
+        The maximum number of jobs waiting for a single model.
+    max_pending_batches : integer, optional (default=None)
+        The maximum number of batches processed at a time. By default
+        (``None``), it is equal to ``max_workers`` (or 4).
+    random_seed : integer, optional (default=None)
+        The seed of the sequence of batch random generators. By default
+        (``None``), fresh entropy is used.
+
+    Attributes
+    ----------
+    statistics : dictionary
+        The number of processed ``jobs``, ``batches`` and ``rows``, and the
+        number of ``rejected`` jobs.
+    """
+
+    def __init__(self, executor=None, max_workers=None, max_batch_rows=10000,
+                 max_delay=0.005, max_queue_depth=1000,
+                 max_pending_batches=None, random_seed=None):
+        """Initialises ExplanationRunner class."""
+        assert executor is None or isinstance(
+            executor, concurrent.futures.Executor), 'An executor or None.'
+        assert max_workers is None or (isinstance(max_workers, int)
+                                       and max_workers > 0), (
+            'Positive integer or None.')
+        assert isinstance(max_batch_rows, int) and max_batch_rows > 0, (
+            'Positive integer.')
+        assert max_delay >= 0, 'Non-negative delay.'
+        assert isinstance(max_queue_depth, int) and max_queue_depth > 0, (
+            'Positive integer.')
+        if max_pending_batches is None:
+            max_pending_batches = max_workers or 4
+        assert (isinstance(max_pending_batches, int)
+                and max_pending_batches > 0), 'Positive integer.'
+
+        self.executor = executor
+        self.max_workers = max_workers
+        self.max_batch_rows = max_batch_rows
+        self.max_delay = max_delay
+        self.max_queue_depth = max_queue_depth
+        self.max_pending_batches = max_pending_batches
+
+        self._seed_sequence = np.random.SeedSequence(random_seed)
+        self._owns_executor = False
+        self._contexts = {}
+        self._worker_keys = set()
+        self._queues = {}
+        self._batchers = {}
+        self._tasks = set()
+        self._semaphore = None
+        self._running = False
+        self.statistics = dict(jobs=0, batches=0, rows=0, rejected=0)
+
+    def register(self, key, model, discretiser, dataset,
+                 method='predict_proba', bin_sampling_values=None):
+        """
+        Registers a model with its discretiser and reference data set.
+
+        The bin sampling values (see
+        :func:`xml_book.meta_explainers.surrogates.get_bin_sampling_values`)
+        are computed once at registration, after which only the dtype of the
+        ``dataset`` is kept.
+
+        Parameters
+        ----------
+        key : hashable
+            The identifier of the model used by :meth:`explain`.
+        model : object
+            A fitted model.
+        discretiser : fat-forensics discretiser object
+            A (fitted) discretiser that is compatible with the ``dataset``.
+        dataset : 2-dimensional numpy array
+            The reference data set.
+        method : string, optional (default='predict_proba')
+            The prediction method of the ``model``.
+        bin_sampling_values : dictionary, optional (default=None)
+            Precomputed bin sampling values of the ``dataset``.
+        """
+        assert callable(getattr(model, method, None)), (
+            'The model does not have the prediction method.')
+        if bin_sampling_values is None:
+            bin_sampling_values = get_bin_sampling_values(dataset, discretiser)
+        # An empty stand-in of the data set carries its dtype (the only
+        # property needed by undiscretise_data given bin sampling values)
+        self._contexts[key] = (model, method, discretiser, dataset[:0].copy(),
+                               bin_sampling_values)
+        # The contexts installed in the workers may be outdated
+        self._worker_keys.discard(key)
+        if self._running and key not in self._queues:
+            self._start_batcher(key)
+
+    async def start(self):
+        """Starts the runner (within a running event loop)."""
+        assert not self._running, 'The runner is already running.'
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_initialise_worker,
+                initargs=(dict(self._contexts), ))
+            self._owns_executor = True
+            self._worker_keys = set(self._contexts)
+        self._semaphore = asyncio.Semaphore(self.max_pending_batches)
+        self._running = True
+        for key in self._contexts:
+            self._start_batcher(key)
+
+    async def stop(self):
+        """Processes the queued jobs and stops the runner."""
+        self._running = False
+        for queue in self._queues.values():
+            await queue.join()
+        for batcher in self._batchers.values():
+            batcher.cancel()
+        await asyncio.gather(*self._batchers.values(), return_exceptions=True)
+        self._queues, self._batchers = {}, {}
+        if self._owns_executor:
+            self.executor.shutdown(wait=True)
+            self.executor, self._owns_executor = None, False
+            self._worker_keys = set()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+        return False
+
+    def _start_batcher(self, key):
+        """Creates the queue and the batching task of a model."""
+        self._queues[key] = asyncio.Queue(maxsize=self.max_queue_depth)
+        self._batchers[key] = asyncio.ensure_future(self._batch_jobs(key))
+
+    async def explain(self, key, discretised_data, wait=True):
+        """
+        Undiscretises data and predicts them with a registered model.
+
+        Parameters
+        ----------
+        key : hashable
+            The identifier of a registered model.
+        discretised_data : 2-dimensional numpy array
+            Discretised data to be undiscretised and predicted.
+        wait : boolean, optional (default=True)
+            Whether to wait for space in a full queue. If ``False``,
+            ``asyncio.QueueFull`` is raised when the queue is full.
+
+        Returns
+        -------
+        undiscretised_data : 2-dimensional numpy array
+            Undiscretised ``discretised_data``.
+        predictions : numpy array
+            Predictions of the ``undiscretised_data``.
+        """
+        assert self._running, 'The runner has not been started.'
+        assert key in self._contexts, 'Unknown model.'
+        discretised_data = np.asarray(discretised_data)
+        assert len(discretised_data.shape) == 2, 'Data has to be 2-D.'
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues[key]
+        if wait:
+            await queue.put((discretised_data, future))
+        else:
+            try:
+                queue.put_nowait((discretised_data, future))
+            except asyncio.QueueFull:
+                self.statistics['rejected'] += 1
+                raise
+        return await future
+
+    async def _batch_jobs(self, key):
+        """Collects jobs of a model into batches and dispatches them."""
+        loop = asyncio.get_running_loop()
+        queue = self._queues[key]
+        while True:
+            jobs = [await queue.get()]
+            rows = jobs[0][0].shape[0]
+            deadline = loop.time() + self.max_delay
+            while rows < self.max_batch_rows:
+                if queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        job = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    job = queue.get_nowait()
+                if rows + job[0].shape[0] > self.max_batch_rows:
+                    # Dispatch the full batch and start the next one with
+                    # this job
+                    await self._dispatch(key, jobs, queue)
+                    jobs, rows = [job], job[0].shape[0]
+                    deadline = loop.time() + self.max_delay
+                    continue
+                jobs.append(job)
+                rows += job[0].shape[0]
+
+            await self._dispatch(key, jobs, queue)
+
+    async def _dispatch(self, key, jobs, queue):
+        """
+        Schedules processing of a batch once fewer than
+        ``max_pending_batches`` batches are processed.
+        """
+        await self._semaphore.acquire()
+        task = asyncio.ensure_future(self._process(key, jobs, queue))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, key, jobs, queue):
+        """Runs a batch in the executor and distributes its results."""
+        loop = asyncio.get_running_loop()
+        try:
+            batch = np.concatenate([data for data, _ in jobs], axis=0)
+            context = (None if key in self._worker_keys
+                       else self._contexts[key])
+            seed = self._seed_sequence.spawn(1)[0]
+            undiscretised_data, predictions = await loop.run_in_executor(
+                self.executor, _explain_batch, key, context, seed, batch)
+
+            self.statistics['jobs'] += len(jobs)
+            self.statistics['batches'] += 1
+            self.statistics['rows'] += batch.shape[0]
+
+            start = 0
+            for data, future in jobs:
+                end = start + data.shape[0]
+                if not future.cancelled():
+                    future.set_result((undiscretised_data[start:end],
+                                       predictions[start:end]))
+                start = end
+        except Exception as exception:
+            for _, future in jobs:
+                if not future.done():
+                    future.set_exception(exception)
+        finally:
+            self._semaphore.release()
+            for _ in jobs:
+                queue.task_done()
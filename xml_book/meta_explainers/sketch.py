@@ -0,0 +1,339 @@
+"""
+XML Book Quantile Sketch Module
+===============================
+
+This module implements approximate quartile discretisation of data sets that
+are too large to be sorted.
+
+:class:`QuantileSketch` is a KLL-style streaming quantile sketch (Karnin,
+Lang and Liberty, 2016): data are pushed into a hierarchy of compactors,
+where the items of level ``h`` stand for ``2**h`` data points each and a full
+compactor promotes every other (sorted) item to the next level. The memory
+used by a sketch is bounded by roughly ``3 * k`` items, its rank error is
+of the order of ``1 / k``, and sketches built over separate chunks of data
+can be merged.
+
+:class:`QuantileSketchDiscretiser` fits the quartile boundaries of every
+feature in one pass over a stream of data chunks, and exposes the same
+attributes as the fat-forensics ``QuartileDiscretiser``, hence it can be used
+with :func:`xml_book.meta_explainers.surrogates.get_bin_sampling_values` and
+:func:`xml_book.meta_explainers.surrogates.undiscretise_data`.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import numpy as np
+
+__all__ = ['QuantileSketch', 'QuantileSketchDiscretiser']
+
+# The capacity decay of consecutive compactors (from the top one down)
+_CAPACITY_DECAY = 2 / 3
+
+
+class QuantileSketch(object):
+    """
+    Approximates quantiles of a stream of numbers.
+
+    Parameters
+    ----------
+    k : integer, optional (default=200)
+        The capacity of the top compactor, which controls the accuracy and
+        the memory of the sketch.
+    random_generator : numpy random generator, optional (default=None)
+        A ``numpy.random.Generator`` used to choose the items promoted by
+        compactions. By default (``None``), a fresh, unseeded generator is
+        used.
+
+    Attributes
+    ----------
+    n : integer
+        The number of data points summarised by the sketch.
+    levels : list of 1-dimensional numpy arrays
+        The items held by the compactors.
+    """
+
+    def __init__(self, k=200, random_generator=None):
+        """Initialises QuantileSketch class."""
+        assert isinstance(k, int) and k >= 8, 'Integer of at least 8.'
+        self.k = k
+        self.random_generator = (np.random.default_rng()
+                                 if random_generator is None
+                                 else random_generator)
+        self.n = 0
+        self.levels = [np.empty(0, dtype=np.float64)]
+
+    def _get_capacity(self, level):
+        """Computes the capacity of a compactor."""
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * _CAPACITY_DECAY**depth)))
+
+    def _compress(self):
+        """Compacts full compactors until the sketch fits its capacity."""
+        while True:
+            sizes = [level.shape[0] for level in self.levels]
+            capacities = [self._get_capacity(h) for h in range(len(sizes))]
+            if sum(sizes) <= sum(capacities):
+                break
+            level = next(h for h in range(len(sizes))
+                         if sizes[h] >= capacities[h])
+            if level == len(self.levels) - 1:
+                self.levels.append(np.empty(0, dtype=np.float64))
+
+            items = np.sort(self.levels[level])
+            # An odd item out stays at its level
+            kept = items[:items.shape[0] % 2]
+            items = items[kept.shape[0]:]
+            offset = self.random_generator.integers(2)
+            self.levels[level + 1] = np.concatenate(
+                [self.levels[level + 1], items[offset::2]])
+            self.levels[level] = kept
+
+    def update(self, values):
+        """
+        Adds numbers to the sketch.
+
+        Parameters
+        ----------
+        values : 1-dimensional numpy array
+            The numbers to be summarised.
+
+        Returns
+        -------
+        self : QuantileSketch
+            The updated sketch.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        assert not np.isnan(values).any(), 'The values cannot be nan.'
+        self.n += values.shape[0]
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """
+        Merges a sketch summarising other data.
+
+        Parameters
+        ----------
+        other : QuantileSketch
+            Another sketch.
+
+        Returns
+        -------
+        self : QuantileSketch
+            The merged sketch.
+        """
+        assert isinstance(other, QuantileSketch), 'QuantileSketch expected.'
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def get_quantiles(self, percentiles):
+        """
+        Approximates quantiles of the summarised numbers.
+
+        Parameters
+        ----------
+        percentiles : list of numbers
+            The percentiles (between 0 and 100) to be computed.
+
+        Returns
+        -------
+        quantiles : 1-dimensional numpy array
+            The (approximate) quantiles.
+        """
+        assert self.n, 'The sketch is empty.'
+        percentiles = np.asarray(percentiles, dtype=np.float64)
+        assert np.all((percentiles >= 0) & (percentiles <= 100)), (
+            'Percentiles between 0 and 100.')
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(level.shape[0], 2**h, dtype=np.int64)
+            for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, ranks = items[order], np.cumsum(weights[order])
+        indices = np.searchsorted(ranks, percentiles / 100 * ranks[-1])
+        return items[np.minimum(indices, items.shape[0] - 1)]
+
+
+class QuantileSketchDiscretiser(object):
+    """
+    Discretises numerical features into approximate quartiles.
+
+    The discretiser is fitted by streaming chunks of data with
+    :meth:`update` (or :meth:`fit`); partial discretisers fitted on separate
+    chunks can be combined with :meth:`merge`. The bin boundaries are
+    computed when they are first used after an update.
+
+    Parameters
+    ----------
+    features_number : integer
+        The number of (numerical) features.
+    feature_names : list of strings, optional (default=None)
+        The names of the features used to name the bins. By default
+        (``None``), the feature indices are used.
+    k : integer, optional (default=200)
+        The accuracy parameter of the quantile sketches (see
+        :class:`QuantileSketch`).
+    random_seed : integer, optional (default=None)
+        The random seed of the sketches.
+
+    Attributes
+    ----------
+    rows_number : integer
+        The number of data points used to fit the discretiser.
+    feature_bin_boundaries : dictionary of 1-dimensional numpy arrays
+        The (inclusive) upper boundaries of the first three bins of each
+        feature.
+    feature_value_names : dictionary of dictionaries
+        The names of the bins of each feature.
+    """
+
+    def __init__(self, features_number, feature_names=None, k=200,
+                 random_seed=None):
+        """Initialises QuantileSketchDiscretiser class."""
+        assert isinstance(features_number, int) and features_number > 0, (
+            'Positive integer.')
+        if feature_names is None:
+            feature_names = [str(i) for i in range(features_number)]
+        assert len(feature_names) == features_number, (
+            'One name per feature.')
+
+        self.features_number = features_number
+        self.feature_names_map = dict(enumerate(feature_names))
+        self.numerical_indices = list(range(features_number))
+        self.categorical_indices = []
+        self.discretised_dtype = np.int8
+        self.percentiles = [25, 50, 75]
+
+        seeds = np.random.SeedSequence(random_seed).spawn(features_number)
+        self.sketches = [
+            QuantileSketch(k=k, random_generator=np.random.default_rng(seed))
+            for seed in seeds]
+        self._feature_bin_boundaries = None
+        self._feature_value_names = None
+
+    @property
+    def rows_number(self):
+        return self.sketches[0].n
+
+    def update(self, dataset):
+        """
+        Adds a chunk of data to the quantile sketches.
+
+        Parameters
+        ----------
+        dataset : 2-dimensional numpy array
+            A chunk of data.
+
+        Returns
+        -------
+        self : QuantileSketchDiscretiser
+            The updated discretiser.
+        """
+        assert (len(dataset.shape) == 2
+                and dataset.shape[1] == self.features_number), (
+                    'The data must be a 2-D array with a column per feature.')
+        for index, sketch in enumerate(self.sketches):
+            sketch.update(dataset[:, index])
+        self._feature_bin_boundaries = None
+        self._feature_value_names = None
+        return self
+
+    def fit(self, chunks):
+        """
+        Fits the discretiser in one pass over chunks of data.
+
+        Parameters
+        ----------
+        chunks : iterable of 2-dimensional numpy arrays
+            Chunks of data, e.g., read from disk one at a time.
+
+        Returns
+        -------
+        self : QuantileSketchDiscretiser
+            The fitted discretiser.
+        """
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    def merge(self, other):
+        """
+        Merges a discretiser fitted on other data.
+
+        Parameters
+        ----------
+        other : QuantileSketchDiscretiser
+            A discretiser with the same number of features.
+
+        Returns
+        -------
+        self : QuantileSketchDiscretiser
+            The merged discretiser.
+        """
+        assert isinstance(other, QuantileSketchDiscretiser), (
+            'QuantileSketchDiscretiser expected.')
+        assert other.features_number == self.features_number, (
+            'Different number of features.')
+        for sketch, other_sketch in zip(self.sketches, other.sketches):
+            sketch.merge(other_sketch)
+        self._feature_bin_boundaries = None
+        self._feature_value_names = None
+        return self
+
+    @property
+    def feature_bin_boundaries(self):
+        if self._feature_bin_boundaries is None:
+            assert self.rows_number, 'The discretiser has not been fitted.'
+            self._feature_bin_boundaries = {
+                index: sketch.get_quantiles(self.percentiles)
+                for index, sketch in enumerate(self.sketches)}
+        return self._feature_bin_boundaries
+
+    @property
+    def feature_value_names(self):
+        if self._feature_value_names is None:
+            # Same bin names as the fat-forensics quartile discretiser
+            feature_value_names = {}
+            for index, qts in self.feature_bin_boundaries.items():
+                feature_name = self.feature_names_map[index]
+                feature_value_names[index] = {
+                    0: '*{}* <= {:.2f}'.format(feature_name, qts[0]),
+                    qts.shape[0]: '{:.2f} < *{}*'.format(
+                        qts[-1], feature_name)
+                }
+                for i in range(1, qts.shape[0]):
+                    feature_value_names[index][i] = (
+                        '{:.2f} < *{}* <= {:.2f}'.format(
+                            qts[i - 1], feature_name, qts[i]))
+            self._feature_value_names = feature_value_names
+        return self._feature_value_names
+
+    def discretise(self, dataset):
+        """
+        Discretises data into (approximate) quartiles.
+
+        Parameters
+        ----------
+        dataset : numpy array
+            A data point (1-D) or an array (2-D) of data points.
+
+        Returns
+        -------
+        discretised_data : numpy array
+            The discretised data.
+        """
+        assert len(dataset.shape) in (1, 2), 'The data must be 1-D or 2-D.'
+        assert dataset.shape[-1] == self.features_number, (
+            'Incorrect number of features.')
+        discretised_data = np.zeros_like(dataset, dtype=self.discretised_dtype)
+        for index, boundaries in self.feature_bin_boundaries.items():
+            discretised_data[..., index] = np.searchsorted(
+                boundaries, dataset[..., index])
+        return discretised_data
@@ -0,0 +1,476 @@
+"""
+XML Book Surrogate Tree Module
+==============================
+
+This module implements a histogram-based surrogate tree learner used by the
+book.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import itertools
+
+import numpy as np
+
+from xml_book.meta_explainers.surrogates import (get_group_class_counts,
+                                                 gini_index_counts)
+
+__all__ = ['HistogramSurrogateTree']
+
+# Splits have to improve the impurity of a node by more than this fraction
+IMPROVEMENT_TOLERANCE = 1e-10
+
+
+class HistogramSurrogateTree(object):
+    """
+    Fits a binary decision tree to discretised (e.g., quartile) data.
+
+    Each feature is assumed to hold ordinal bin codes (0, 1, 2, ...), hence
+    every split has the form *code <= threshold*.
+    Splits are found with per-bin label statistics -- weighted class counts
+    for the ``'gini'`` metric or weighted sums of labels and squared labels
+    (centred on the mean label of the node, which keeps the impurity
+    accurate for labels with a large mean) for the ``'mse'`` metric --
+    accumulated with ``np.bincount`` and
+    evaluated for all the thresholds at once with cumulative sums, therefore
+    the rows never need to be sorted.
+
+    Each leaf of the tree is a hyper-rectangle in the discretised space, see
+    :meth:`get_hyperrectangles` and :meth:`get_leaf_hyperrectangles`.
+
+    Parameters
+    ----------
+    max_depth : integer, optional (default=3)
+        The maximum depth of the tree.
+    min_weight_leaf : number, optional (default=0)
+        The minimum total sample weight of a leaf (on the scale of the
+        ``sample_weight``, e.g., kernel weights smaller than one). Leaves
+        always have a positive weight.
+    metric : string, optional (default='gini')
+        Either ``'gini'`` (Gini Index) for *crisp* labels (classification) or
+        ``'mse'`` (Mean Squared Error) for *numerical* labels (regression or
+        probabilities of a single class).
+    bins_number : integer or list of integers, optional (default=None)
+        The number of bins of each feature. By default (``None``), it is
+        inferred from the data as the largest code plus one.
+
+    Attributes
+    ----------
+    classes_ : 1-dimensional numpy array
+        Unique labels (for the ``'gini'`` metric).
+    bins_number_ : 1-dimensional numpy array
+        The number of bins of each feature.
+    feature_ : 1-dimensional numpy array
+        The split feature of each node (-1 for leaves).
+    threshold_ : 1-dimensional numpy array
+        The split threshold of each node (-1 for leaves).
+    children_left_ : 1-dimensional numpy array
+        The left (*code <= threshold*) child of each node (-1 for leaves).
+    children_right_ : 1-dimensional numpy array
+        The right child of each node (-1 for leaves).
+    value_ : numpy array
+        The weighted class frequencies (``'gini'``) or the weighted mean of
+        the labels (``'mse'``) of each node.
+    weight_ : 1-dimensional numpy array
+        The total sample weight of each node.
+    lower_bound_ : 2-dimensional numpy array
+        The lowest code (inclusive) of each feature for each node.
+    upper_bound_ : 2-dimensional numpy array
+        The highest code (inclusive) of each feature for each node.
+    """
+
+    def __init__(self, max_depth=3, min_weight_leaf=0, metric='gini',
+                 bins_number=None):
+        """Initialises HistogramSurrogateTree class."""
+        assert isinstance(max_depth, int) and max_depth >= 0, (
+            'Non-negative integer.')
+        assert min_weight_leaf >= 0, 'Non-negative number.'
+        assert metric.lower() in ('mse', 'gini'), (
+            'Incorrect metric specifier. Should either be *mse* or *gini*.')
+        self.max_depth = max_depth
+        self.min_weight_leaf = min_weight_leaf
+        self.metric = metric.lower()
+        self.bins_number = bins_number
+
+    def _get_statistics(self, codes, labels, weights, bins_number):
+        """
+        Computes per-bin label statistics of a single feature.
+
+        The statistics are stored in a (bins x statistics) array -- weighted
+        class counts for Gini Index and weighted count, sum and sum of
+        squares for Mean Squared Error.
+        """
+        if self.metric == 'gini':
+            statistics = get_group_class_counts(
+                codes, labels, bins_number, self.classes_.shape[0],
+                weights=weights)
+        else:
+            statistics = np.stack([
+                np.bincount(codes, weights=w, minlength=bins_number)
+                for w in (weights, weights * labels, weights * labels**2)
+            ], axis=1)
+        return statistics
+
+    def _get_impurity(self, statistics):
+        """
+        Computes the weighted impurity -- total weight times impurity -- of
+        statistics (along the last axis).
+        """
+        if self.metric == 'gini':
+            impurity = statistics.sum(axis=-1) * gini_index_counts(statistics)
+        else:
+            weight = statistics[..., 0]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                impurity = statistics[..., 2] - statistics[..., 1]**2 / weight
+            impurity = np.maximum(np.where(weight == 0, 0, impurity), 0)
+        return impurity
+
+    def _get_value(self, statistics):
+        """Computes the prediction of a node from its statistics."""
+        if self.metric == 'gini':
+            total = statistics.sum()
+            value = statistics / total if total else statistics
+        else:
+            value = statistics[1] / statistics[0] if statistics[0] else 0.0
+        return value
+
+    def _find_split(self, data, labels, weights, node_statistics):
+        """Finds the best split of a node (or returns ``None``)."""
+        # The children of a node without any weight cannot have a positive
+        # weight
+        if not (node_statistics.sum() if self.metric == 'gini'
+                else node_statistics[0]):
+            return None
+        if self.metric == 'mse':
+            # Centring the labels avoids the cancellation of large sums of
+            # squares in the impurity
+            labels = labels - node_statistics[1] / node_statistics[0]
+            node_statistics = np.array([
+                node_statistics[0], (weights * labels).sum(),
+                (weights * labels**2).sum()])
+        node_impurity = self._get_impurity(node_statistics)
+        tolerance = IMPROVEMENT_TOLERANCE * node_impurity
+
+        best = None
+        best_impurity = node_impurity
+        for feature in range(data.shape[1]):
+            bins_number = self.bins_number_[feature]
+            if bins_number < 2:
+                continue
+            statistics = self._get_statistics(
+                data[:, feature], labels, weights, bins_number)
+
+            # Statistics of the left child for all thresholds but the last
+            left = np.cumsum(statistics, axis=0)[:-1]
+            right = statistics.sum(axis=0) - left
+            if self.metric == 'gini':
+                left_weight, right_weight = left.sum(axis=1), right.sum(axis=1)
+            else:
+                left_weight, right_weight = left[:, 0], right[:, 0]
+            valid = ((left_weight >= self.min_weight_leaf)
+                     & (right_weight >= self.min_weight_leaf)
+                     & (left_weight > 0) & (right_weight > 0))
+            if not valid.any():
+                continue
+
+            impurity = self._get_impurity(left) + self._get_impurity(right)
+            impurity[~valid] = np.inf
+            threshold = int(np.argmin(impurity))
+            # Ignore splits that do not (numerically) improve the impurity
+            if impurity[threshold] < best_impurity - tolerance:
+                best_impurity = impurity[threshold]
+                best = (feature, threshold)
+        return best
+
+    def fit(self, discretised_data, labels, sample_weight=None):
+        """
+        Fits the tree.
+
+        Parameters
+        ----------
+        discretised_data : 2-dimensional numpy array
+            A 2-dimensional array with *discretised* data (non-negative
+            integer codes).
+        labels : 1-dimensional numpy array
+            A 1-dimensional array with *crisp* labels (``'gini'``) or
+            *numbers* (``'mse'``).
+        sample_weight : 1-dimensional numpy array, optional (default=None)
+            Non-negative weights of the instances, e.g., computed with a
+            locality kernel. By default (``None``), all the instances have
+            the weight of 1.
+
+        Returns
+        -------
+        self : HistogramSurrogateTree
+            The fitted tree.
+        """
+        discretised_data = np.asarray(discretised_data)
+        labels = np.asarray(labels)
+        assert len(discretised_data.shape) == 2, 'Data has to be 2-D.'
+        assert np.all(0 <= discretised_data), 'Data probably not discretised.'
+        assert (discretised_data.shape[0] == labels.shape[0]), 'Size mismatch.'
+        data = discretised_data.astype(np.intp, copy=False)
+
+        if sample_weight is None:
+            weights = np.ones(data.shape[0], dtype=np.float64)
+        else:
+            weights = np.asarray(sample_weight, dtype=np.float64)
+            assert weights.shape == (data.shape[0], ), 'Size mismatch.'
+            assert np.all(weights >= 0), 'Non-negative weights.'
+
+        if self.metric == 'gini':
+            self.classes_, labels = np.unique(labels, return_inverse=True)
+            labels = labels.reshape(-1)
+        else:
+            labels = labels.astype(np.float64, copy=False)
+
+        if self.bins_number is None:
+            bins_number = (data.max(axis=0) + 1 if data.shape[0]
+                           else np.zeros(data.shape[1], dtype=np.intp))
+        else:
+            bins_number = np.broadcast_to(
+                np.asarray(self.bins_number, dtype=np.intp), data.shape[1:])
+            assert np.all(data < bins_number), 'Codes exceed bins number.'
+        self.bins_number_ = np.asarray(bins_number, dtype=np.intp)
+
+        feature, threshold, children_left, children_right = [], [], [], []
+        value, weight, lower_bound, upper_bound = [], [], [], []
+
+        def add_node(statistics, lower, upper):
+            feature.append(-1)
+            threshold.append(-1)
+            children_left.append(-1)
+            children_right.append(-1)
+            value.append(self._get_value(statistics))
+            weight.append(statistics.sum() if self.metric == 'gini'
+                          else statistics[0])
+            lower_bound.append(lower)
+            upper_bound.append(upper)
+            return len(feature) - 1
+
+        def node_statistics(node_labels, node_weights):
+            if self.metric == 'gini':
+                return np.bincount(node_labels, weights=node_weights,
+                                   minlength=self.classes_.shape[0])
+            return np.array([node_weights.sum(),
+                             (node_weights * node_labels).sum(),
+                             (node_weights * node_labels**2).sum()])
+
+        root_statistics = node_statistics(labels, weights)
+        root = add_node(root_statistics,
+                        np.zeros(data.shape[1], dtype=np.intp),
+                        self.bins_number_ - 1)
+        stack = [(root, np.arange(data.shape[0]), root_statistics, 0)]
+        while stack:
+            node, indices, statistics, depth = stack.pop()
+            if depth >= self.max_depth or indices.shape[0] < 2:
+                continue
+
+            node_data, node_labels = data[indices], labels[indices]
+            node_weights = weights[indices]
+            split = self._find_split(node_data, node_labels, node_weights,
+                                     statistics)
+            if split is None:
+                continue
+            split_feature, split_threshold = split
+
+            goes_left = node_data[:, split_feature] <= split_threshold
+            children = []
+            for mask, is_left in ((goes_left, True), (~goes_left, False)):
+                lower = lower_bound[node].copy()
+                upper = upper_bound[node].copy()
+                if is_left:
+                    upper[split_feature] = split_threshold
+                else:
+                    lower[split_feature] = split_threshold + 1
+                child_statistics = node_statistics(
+                    node_labels[mask], node_weights[mask])
+                child = add_node(child_statistics, lower, upper)
+                children.append(child)
+                stack.append(
+                    (child, indices[mask], child_statistics, depth + 1))
+
+            feature[node] = split_feature
+            threshold[node] = split_threshold
+            children_left[node], children_right[node] = children
+
+        self.feature_ = np.array(feature, dtype=np.intp)
+        self.threshold_ = np.array(threshold, dtype=np.intp)
+        self.children_left_ = np.array(children_left, dtype=np.intp)
+        self.children_right_ = np.array(children_right, dtype=np.intp)
+        self.value_ = np.array(value)
+        self.weight_ = np.array(weight)
+        self.lower_bound_ = np.array(lower_bound)
+        self.upper_bound_ = np.array(upper_bound)
+
+        return self
+
+    def _check_fitted(self):
+        """Checks whether the tree is fitted."""
+        assert hasattr(self, 'feature_'), 'The tree has not been fitted.'
+
+    @property
+    def leaves_(self):
+        """Indices of the leaf nodes."""
+        self._check_fitted()
+        return np.where(self.feature_ == -1)[0]
+
+    def apply(self, discretised_data):
+        """
+        Finds the leaf of each instance.
+
+        All instances are routed through the tree at once, one level at
+        a time.
+
+        Parameters
+        ----------
+        discretised_data : 2-dimensional numpy array
+            A 2-dimensional array with *discretised* data.
+
+        Returns
+        -------
+        leaves : 1-dimensional numpy array
+            The leaf node index of each instance.
+        """
+        self._check_fitted()
+        data = np.asarray(discretised_data)
+        assert len(data.shape) == 2, 'Data has to be 2-D.'
+        assert data.shape[1] == self.bins_number_.shape[0], 'Size mismatch.'
+
+        nodes = np.zeros(data.shape[0], dtype=np.intp)
+        rows = np.arange(data.shape[0])
+        while True:
+            is_internal = self.feature_[nodes] != -1
+            if not is_internal.any():
+                break
+            active, active_nodes = rows[is_internal], nodes[is_internal]
+            goes_left = (data[active, self.feature_[active_nodes]]
+                         <= self.threshold_[active_nodes])
+            nodes[active] = np.where(goes_left,
+                                     self.children_left_[active_nodes],
+                                     self.children_right_[active_nodes])
+        return nodes
+
+    def predict(self, discretised_data):
+        """
+        Predicts labels (``'gini'``) or numbers (``'mse'``).
+
+        Parameters
+        ----------
+        discretised_data : 2-dimensional numpy array
+            A 2-dimensional array with *discretised* data.
+
+        Returns
+        -------
+        predictions : 1-dimensional numpy array
+            The weighted majority class or the weighted mean of each leaf.
+        """
+        leaves = self.apply(discretised_data)
+        if self.metric == 'gini':
+            predictions = self.classes_[np.argmax(self.value_[leaves], axis=1)]
+        else:
+            predictions = self.value_[leaves]
+        return predictions
+
+    def predict_proba(self, discretised_data):
+        """
+        Predicts weighted class frequencies (``'gini'`` metric only).
+
+        Parameters
+        ----------
+        discretised_data : 2-dimensional numpy array
+            A 2-dimensional array with *discretised* data.
+
+        Returns
+        -------
+        probabilities : 2-dimensional numpy array
+            The class frequencies of the leaf of each instance (columns
+            follow the ``classes_`` order).
+        """
+        assert self.metric == 'gini', 'Only available for the gini metric.'
+        return self.value_[self.apply(discretised_data)]
+
+    def get_hyperrectangles(self):
+        """
+        Gets the hyper-rectangles defined by the leaves of the tree.
+
+        Returns
+        -------
+        hyperrectangles : dictionary of 2-tuples
+            For each leaf index, a tuple of two 1-dimensional arrays holding
+            the lowest and the highest (both inclusive) code of each feature.
+        """
+        return {leaf: (self.lower_bound_[leaf], self.upper_bound_[leaf])
+                for leaf in self.leaves_}
+
+    def get_leaf_hyperrectangles(self, leaf):
+        """
+        Enumerates the discretised encodings covered by a leaf.
+
+        Only the features constrained by the leaf are enumerated, hence the
+        encodings can be matched against these columns of the discretised
+        data with the ``get_hyperrectangle_indices`` function, e.g.::
+
+            features, encodings = tree.get_leaf_hyperrectangles(leaf)
+            indices = [get_hyperrectangle_indices(data[:, features], e)
+                       for e in encodings]
+
+        Parameters
+        ----------
+        leaf : integer
+            The index of a leaf node.
+
+        Returns
+        -------
+        features : 1-dimensional numpy array
+            Indices of the features constrained by the leaf.
+        encodings : 2-dimensional numpy array
+            All the combinations of codes (one per row) of these features
+            that fall into the leaf.
+        """
+        self._check_fitted()
+        assert self.feature_[leaf] == -1, 'Not a leaf.'
+        lower, upper = self.lower_bound_[leaf], self.upper_bound_[leaf]
+        features = np.where(
+            (lower > 0) | (upper < self.bins_number_ - 1))[0]
+        codes = [range(lower[f], upper[f] + 1) for f in features]
+        encodings = np.array(list(itertools.product(*codes)), dtype=np.intp)
+        encodings = encodings.reshape(-1, features.shape[0])
+        return features, encodings
+
+    def get_leaf_indices(self, discretised_data, leaf):
+        """
+        Extracts row indices of the discretised data that fall into a leaf.
+
+        Since a leaf covers a contiguous range of codes of every feature, the
+        rows are matched against the bounds of the leaf (see
+        :meth:`get_hyperrectangles`) rather than against each encoding of
+        :meth:`get_leaf_hyperrectangles`, hence the cost does not depend on
+        the number of bins.
+
+        Parameters
+        ----------
+        discretised_data : 2-dimensional numpy array
+            A 2-dimensional array with *discretised* data.
+        leaf : integer
+            The index of a leaf node.
+
+        Returns
+        -------
+        indices : 1-dimensional numpy array
+            Sorted indices of the matching rows.
+        """
+        self._check_fitted()
+        assert self.feature_[leaf] == -1, 'Not a leaf.'
+        data = np.asarray(discretised_data)
+        lower, upper = self.lower_bound_[leaf], self.upper_bound_[leaf]
+        features = np.where(
+            (lower > 0) | (upper < self.bins_number_ - 1))[0]
+        if not features.shape[0]:
+            return np.arange(data.shape[0])
+        sub_data = data[:, features]
+        matching_rows = np.all(
+            (sub_data >= lower[features]) & (sub_data <= upper[features]),
+            axis=1)
+        return np.where(matching_rows)[0]
@@ -4,6 +4,11 @@ XML Book Surrogate Module
 
 This module implements a collection of surrogate explainer functions used by
 the book.
+
+The floating point outputs of the functions follow the dtype of their inputs,
+e.g., ``numpy.float32`` data are undiscretised into ``numpy.float32`` arrays
+and ``numpy.float32`` labels give ``numpy.float32`` Mean Squared Errors,
+hence large samples can be kept in single precision end to end.
 """
 
 # Author: Kacper Sokol <kacper@xmlx.dev>
@@ -11,46 +16,199 @@ the book.
 # License: MIT
 
 import scipy
+import scipy.special
 import scipy.stats
 
 import numpy as np
 
-__all__ = ['gini_index', 'entropy', 'mse', 'get_hyperrectangle_indices',
-           'weighted_purity', 'one_hot_encode', 'get_bin_sampling_values',
-           'undiscretise_data']
+from xml_book.tools.instrumentation import instrument, span
+
+__all__ = ['gini_index', 'entropy', 'gini_index_counts', 'entropy_counts',
+           'get_group_class_counts', 'mse', 'encode_hyperrectangles',
+           'get_hyperrectangle_indices', 'weighted_purity', 'one_hot_encode',
+           'get_bin_sampling_values', 'bin_sampling_values_to_array',
+           'array_to_bin_sampling_values', 'undiscretise_data']
+
+
+def _get_class_counts(x, classes_number=None, weights=None):
+    """
+    Counts (weighted) occurrences of each class in a 1-dimensional array.
+
+    If ``classes_number`` is given, ``x`` has to hold integer labels between
+    0 and ``classes_number - 1`` and the counts are computed with
+    ``np.bincount``; otherwise, the classes are identified with ``np.unique``.
+    """
+    x_ = np.asarray(x)
+    if weights is not None:
+        weights = np.asarray(weights)
+        assert weights.shape == x_.shape, 'Size mismatch.'
+
+    if classes_number is not None:
+        assert isinstance(classes_number, int) and classes_number > 0, (
+            'Positive integer.')
+        assert x_.dtype.kind in 'iub', 'Integer labels are required.'
+        counts = np.bincount(x_, weights=weights, minlength=classes_number)
+        assert counts.shape[0] == classes_number, (
+            'Labels exceed the number of classes.')
+    elif weights is not None:
+        _, inverse = np.unique(x_, return_inverse=True)
+        counts = np.bincount(inverse.reshape(-1), weights=weights)
+    else:
+        _, counts = np.unique(x_, return_counts=True)
+
+    return counts
+
+
+def gini_index_counts(counts):
+    """
+    Computes Gini Index of groups from their (weighted) class counts.
+
+    Parameters
+    ----------
+    counts : numpy array
+        An array whose last dimension holds (weighted) class counts, e.g., a
+        1-dimensional array for a single group or a 2-dimensional
+        (groups x classes) array.
+
+    Returns
+    -------
+    gini : float or numpy array
+        Gini Index of each group (0 for empty groups).
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    totals = counts.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frequencies = counts / totals[..., np.newaxis]
+    gini = np.sum(frequencies * (1 - frequencies), axis=-1)
+    gini = np.where(totals > 0, gini, 0)
+    return gini[()]
+
+
+def entropy_counts(counts, base=None):
+    """
+    Computes entropy of groups from their (weighted) class counts.
+
+    Parameters
+    ----------
+    counts : numpy array
+        An array whose last dimension holds (weighted) class counts, e.g., a
+        1-dimensional array for a single group or a 2-dimensional
+        (groups x classes) array.
+    base : integer, optional (default=None)
+        Base of the logarithm used for computing entropy. By default
+        (``None``), the natural logarithm is used.
+
+    Returns
+    -------
+    entropy_ : float or numpy array
+        Entropy of each group (0 for empty groups).
+    """
+    assert base is None or isinstance(base, int), 'Wrong type.'
+    counts = np.asarray(counts, dtype=np.float64)
+    totals = counts.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frequencies = counts / totals[..., np.newaxis]
+    # xlogy is 0 for absent classes; subtracting from 0 (instead of negating)
+    # gives 0.0 rather than -0.0 for pure groups
+    entropy_ = 0.0 - np.sum(
+        scipy.special.xlogy(frequencies, frequencies), axis=-1)
+    if base is not None:
+        entropy_ /= np.log(base)
+    entropy_ = np.where(totals > 0, entropy_, 0)
+    return entropy_[()]
+
+
+def get_group_class_counts(groups, labels, groups_number, classes_number,
+                           weights=None):
+    """
+    Computes a (groups x classes) matrix of (weighted) class counts.
 
+    Parameters
+    ----------
+    groups : 1-dimensional numpy array
+        Integer group indices between 0 and ``groups_number - 1``.
+    labels : 1-dimensional numpy array
+        Integer class labels between 0 and ``classes_number - 1``.
+    groups_number : integer
+        The number of groups.
+    classes_number : integer
+        The number of classes.
+    weights : 1-dimensional numpy array, optional (default=None)
+        Weights of the instances. By default (``None``), each instance counts
+        as 1.
 
-def gini_index(x):
+    Returns
+    -------
+    counts : 2-dimensional numpy array
+        The (weighted) class counts of each group (one per row), which can be
+        passed to :func:`gini_index_counts` or :func:`entropy_counts`.
+    """
+    groups = np.asarray(groups)
+    labels = np.asarray(labels)
+    assert groups.shape == labels.shape, 'Size mismatch.'
+    assert groups.dtype.kind in 'iu' and labels.dtype.kind in 'iub', (
+        'Integer groups and labels are required.')
+
+    counts = np.bincount(
+        groups.astype(np.int64) * classes_number + labels,
+        weights=weights, minlength=groups_number * classes_number)
+    assert counts.shape[0] == groups_number * classes_number, (
+        'Groups or labels exceed their declared number.')
+    return counts.reshape(groups_number, classes_number)
+
+
+@instrument()
+def gini_index(x, classes_number=None, weights=None):
     """
     Computes a Gini Index of a numpy array.
 
+    For *integer* labels, providing the ``classes_number`` enables a fast
+    path that counts the classes with ``np.bincount`` instead of sorting the
+    array with ``np.unique``.
+
     Parameters
     ----------
     x : 1-dimensional numpy array
         An array with class predictions or labels.
+    classes_number : integer, optional (default=None)
+        The number of classes, in which case ``x`` has to hold integers
+        between 0 and ``classes_number - 1``.
+    weights : 1-dimensional numpy array, optional (default=None)
+        Weights of the elements of ``x`` (e.g., computed with a locality
+        kernel). By default (``None``), each element counts as 1.
 
     Returns
     -------
     gini : float
         Gini Index of the ``x`` array.
     """
-    x_ = np.asarray(x)
-    _, counts = np.unique(x_, return_counts=True)
-    frequencies = counts / x_.shape[0]
+    if classes_number is None and weights is None:
+        x_ = np.asarray(x)
+        _, counts = np.unique(x_, return_counts=True)
+        frequencies = counts / x_.shape[0]
 
-    gini_itemwise = frequencies * (1 - frequencies)
+        gini_itemwise = frequencies * (1 - frequencies)
 
-    gini = np.sum(gini_itemwise)
+        gini = np.sum(gini_itemwise)
+    else:
+        counts = _get_class_counts(
+            x, classes_number=classes_number, weights=weights)
+        gini = gini_index_counts(counts)
 
     assert 0 <= gini <= 1
 
     return gini
 
 
-def entropy(x, base=None):
+@instrument()
+def entropy(x, base=None, classes_number=None, weights=None):
     """
     Computes entropy of a numpy array.
 
+    For *integer* labels, providing the ``classes_number`` enables a fast
+    path that counts the classes with ``np.bincount`` instead of sorting the
+    array with ``np.unique``.
+
     Parameters
     ----------
     x : 1-dimensional numpy array
@@ -58,6 +216,12 @@ def entropy(x, base=None):
     base : integer, optional (default=None)
         Base of the logarithm used for computing entropy. By default
         (``None``), the natural logarithm is used.
+    classes_number : integer, optional (default=None)
+        The number of classes, in which case ``x`` has to hold integers
+        between 0 and ``classes_number - 1``.
+    weights : 1-dimensional numpy array, optional (default=None)
+        Weights of the elements of ``x`` (e.g., computed with a locality
+        kernel). By default (``None``), each element counts as 1.
 
     Returns
     -------
@@ -66,12 +230,24 @@ def entropy(x, base=None):
     """
     assert base is None or isinstance(base, int), 'Wrong type.'
 
-    _, counts = np.unique(x, return_counts=True)
-    entropy_ = scipy.stats.entropy(counts, base=base)
+    counts = _get_class_counts(
+        x, classes_number=classes_number, weights=weights)
+    entropy_ = entropy_counts(counts, base=base)
 
     return entropy_
 
 
+def _get_float_dtype(dtype):
+    """
+    Gets the floating point dtype used for computations on data of the
+    given dtype -- floating point dtypes are preserved, others are promoted
+    to ``numpy.float64``.
+    """
+    dtype = np.dtype(dtype)
+    return dtype if np.issubdtype(dtype, np.floating) else np.dtype(np.float64)
+
+
+@instrument()
 def mse(x):
     """
     Computes Mean Squared Error of a numpy array.
@@ -86,16 +262,144 @@ def mse(x):
     mse_ : float
         Mean Squared Error of the ``x`` array.
     """
-    # Error
-    err = x - np.mean(x)
-    # Squared error
-    err_sq = np.square(err)
+    x = np.asarray(x)
+    # Error (integer arrays are promoted to floating point)
+    err = np.subtract(x, np.mean(x, dtype=_get_float_dtype(x.dtype)))
+    # Squared error (in place)
+    err_sq = np.square(err, out=err)
     # Mean Squared Error
     mse_ = np.mean(err_sq)
 
     return mse_
 
 
+# Key spaces up to this many times the number of rows are grouped with
+# np.bincount instead of sorting (larger spaces cost more to allocate and
+# scan than sorting the keys)
+_BINCOUNT_DENSITY = 4
+# Parameters of the (64-bit FNV-1a style) hash of rows whose mixed-radix keys
+# overflow 64 bits
+_HASH_OFFSET = np.uint64(14695981039346656037)
+_HASH_PRIME = np.uint64(1099511628211)
+
+
+def _get_bins_number(discretised_data, bins_number=None):
+    """
+    Validates the number of bins of each feature (column) of discretised
+    data, inferring it from the data if ``bins_number`` is ``None``.
+    """
+    features_number = discretised_data.shape[1]
+    assert discretised_data.dtype.kind in 'iub', (
+        'Discretised data must hold integers.')
+    if discretised_data.shape[0]:
+        assert np.all(0 <= discretised_data), 'Data probably not discretised.'
+        max_codes = discretised_data.max(axis=0).astype(np.int64)
+    else:
+        max_codes = np.zeros(features_number, dtype=np.int64)
+
+    if bins_number is None:
+        bins_number = max_codes + 1
+    else:
+        bins_number = np.broadcast_to(
+            np.asarray(bins_number, dtype=np.int64), (features_number, ))
+        assert np.all(max_codes < bins_number), (
+            'The codes exceed the number of bins.')
+    return bins_number
+
+
+def encode_hyperrectangles(discretised_data, bins_number=None):
+    """
+    Encodes each row (hyper-rectangle) of discretised data with one integer.
+
+    The codes of a row are combined into a mixed-radix number -- the
+    radix of each feature is its number of bins -- therefore the keys of
+    identical rows are equal and sorting the keys sorts the rows
+    lexicographically. If the key space does not fit into 64 bits, the rows
+    are hashed instead; the hashes are checked for collisions, in which case
+    the rows are enumerated with ``np.unique``.
+
+    Parameters
+    ----------
+    discretised_data : 2-dimensional numpy array
+        A 2-dimensional array with *discretised* data (non-negative integer
+        codes).
+    bins_number : integer or 1-dimensional numpy array, optional
+        (default=None)
+        The number of bins of all or each feature. By default (``None``), it
+        is inferred from the largest code of each feature.
+
+    Returns
+    -------
+    keys : 1-dimensional numpy array
+        The ``numpy.uint64`` key of each row.
+    key_space : integer or None
+        The number of possible keys (all keys are smaller), or ``None`` if the
+        rows were hashed.
+    """
+    discretised_data = np.asarray(discretised_data)
+    assert len(discretised_data.shape) == 2, 'Data has to be 2-D.'
+    bins_number = _get_bins_number(discretised_data, bins_number)
+
+    key_space = 1
+    for bins in bins_number.tolist():
+        key_space *= bins
+
+    keys = np.zeros(discretised_data.shape[0], dtype=np.uint64)
+    if key_space <= 2**64:
+        # The last feature varies the fastest (lexicographic order)
+        for index, bins in enumerate(bins_number.tolist()):
+            keys *= np.uint64(bins)
+            keys += discretised_data[:, index].astype(np.uint64)
+    else:
+        key_space = None
+        keys += _HASH_OFFSET
+        for index in range(discretised_data.shape[1]):
+            keys ^= discretised_data[:, index].astype(np.uint64)
+            keys *= _HASH_PRIME
+
+        unique_keys, first_indices, inverse = np.unique(
+            keys, return_index=True, return_inverse=True)
+        representatives = discretised_data[first_indices[inverse.reshape(-1)]]
+        if np.any(representatives != discretised_data):  # pragma: nocover
+            _, inverse = np.unique(
+                discretised_data, axis=0, return_inverse=True)
+            keys = inverse.reshape(-1).astype(np.uint64)
+
+    return keys, key_space
+
+
+def _group_hyperrectangles(discretised_data, bins_number=None):
+    """
+    Assigns each row of discretised data to the group of identical rows.
+
+    The groups are numbered in the lexicographic order of their rows (as in
+    ``np.unique(discretised_data, axis=0)``) when the rows are encoded with
+    mixed-radix keys. Key spaces that are small relative to the number of
+    rows are grouped in linear time with ``np.bincount``; otherwise the keys
+    are sorted.
+    """
+    if discretised_data.dtype.kind not in 'iub':
+        # Codes stored as other types are enumerated by sorting the rows
+        unique_rows, groups = np.unique(
+            discretised_data, axis=0, return_inverse=True)
+        return groups.reshape(-1), unique_rows.shape[0]
+
+    keys, key_space = encode_hyperrectangles(discretised_data, bins_number)
+    if (key_space is not None
+            and key_space <= _BINCOUNT_DENSITY * keys.shape[0]):
+        keys = keys.astype(np.intp)
+        occupied = np.bincount(keys, minlength=key_space) > 0
+        group_ids = np.cumsum(occupied) - 1
+        groups = group_ids[keys]
+        groups_number = int(occupied.sum())
+    else:
+        unique_keys, groups = np.unique(keys, return_inverse=True)
+        groups = groups.reshape(-1)
+        groups_number = unique_keys.shape[0]
+    return groups, groups_number
+
+
+@instrument()
 def get_hyperrectangle_indices(discretised_data, hyperrectangle):
     """
     Extracts row indices of a data array that match the specified sample.
@@ -103,7 +407,7 @@ def get_hyperrectangle_indices(discretised_data, hyperrectangle):
     This function returns row indices of the ``discretised_data`` array that
     are identical to the ``hyperrectangle`` array.
     The data set has to be discretised, i.e., all of its values have to be
-    between 0 and 3 inclusive.
+    non-negative bin codes (e.g., between 0 and 3 inclusive for quartiles).
 
     Parameters
     ----------
@@ -134,7 +438,8 @@ def get_hyperrectangle_indices(discretised_data, hyperrectangle):
     return matching_indices
 
 
-def weighted_purity(discretised_data, labels, metric):
+@instrument()
+def weighted_purity(discretised_data, labels, metric, bins_number=None):
     """
     Computes weighted purity metric of ``labels`` based on grouping given by
     unique encodings in the ``discretised_data`` array.
@@ -146,8 +451,13 @@ def weighted_purity(discretised_data, labels, metric):
     metrics, where the weights are proportions of instances used to compute
     each individual metric.
 
+    The rows are grouped by their mixed-radix keys (see
+    :func:`encode_hyperrectangles`), hence the cost of this function grows
+    linearly with the number of rows regardless of the number of bins.
+
     The data set (``discretised_data``) has to be discretised, i.e., all of its
-    values have to be between 0 and 3 inclusive.
+    values have to be non-negative bin codes (e.g., between 0 and 3 inclusive
+    for quartiles).
     The labels (``labels``) are either:
 
     * *crisp* predictions of a classifier or *class* labels; or
@@ -169,6 +479,10 @@ def weighted_purity(discretised_data, labels, metric):
         labels (class predictions or ground truth labels).
     metric : string
         Either ``'mse'`` for Mean Squared Error or ``'gini'`` for Gini Index.
+    bins_number : integer or 1-dimensional numpy array, optional
+        (default=None)
+        The number of bins of all or each feature. By default (``None``), it
+        is inferred from the data.
 
     Returns
     -------
@@ -184,29 +498,37 @@ def weighted_purity(discretised_data, labels, metric):
     assert metric.lower() in ('mse', 'gini'), (
         'Incorrect metric specifier. Should either be *mse* or *gini*.')
 
+    if fatf_v.is_1d_array(discretised_data):
+        discretised_data = discretised_data.reshape(-1, 1)
     items_count = discretised_data.shape[0]
-    unique_hr = np.unique(discretised_data, axis=0)
-
-    metric_fn = mse if metric.lower() == 'mse' else gini_index
-
-    individual_purity = []
-    for encoding in unique_hr:
-        matching_rows = (discretised_data == encoding)
-        if not fatf_v.is_1d_array(discretised_data):
-            matching_rows = matching_rows.all(axis=1)
-        matching_indices = np.where(matching_rows)[0]
-
-        hr_metric = metric_fn(labels[matching_indices])
-        hr_items_count = matching_indices.shape[0]
-
-        individual_purity.append(hr_metric * hr_items_count)
-
-    weighted_purity_ = np.sum(individual_purity) / items_count
+    groups, groups_number = _group_hyperrectangles(discretised_data,
+                                                   bins_number)
+    group_counts = np.bincount(groups, minlength=groups_number)
+
+    if metric.lower() == 'mse':
+        float_dtype = _get_float_dtype(labels.dtype)
+        # Two passes (means first) for numerical stability; the (small)
+        # group means are cast to the dtype of the labels to avoid
+        # promoting the (large) errors
+        group_means = (np.bincount(groups, weights=labels,
+                                   minlength=groups_number) / group_counts)
+        squared_error = np.subtract(
+            labels, group_means.astype(float_dtype)[groups], dtype=float_dtype)
+        np.square(squared_error, out=squared_error)
+        weighted_purity_ = np.sum(squared_error) / float_dtype.type(
+            items_count)
+    else:
+        classes, class_ids = np.unique(labels, return_inverse=True)
+        counts = get_group_class_counts(groups, class_ids.reshape(-1),
+                                        groups_number, classes.shape[0])
+        weighted_purity_ = (np.sum(group_counts * gini_index_counts(counts))
+                            / items_count)
 
     return weighted_purity_
 
 
-def one_hot_encode(vector):
+@instrument()
+def one_hot_encode(vector, bins_number=None):
     """
     One-hot-encode the ``vector``.
 
@@ -217,6 +539,11 @@ def one_hot_encode(vector):
     ----------
     vector : 1-dimensional numpy array
         A 1-dimensional array with *discrete* values.
+    bins_number : integer, optional (default=None)
+        If given, the ``vector`` is assumed to hold bin codes between 0 and
+        ``bins_number - 1``, each of which is encoded with its own column
+        (even if it does not appear in the ``vector``). By default
+        (``None``), only the values present in the ``vector`` are encoded.
 
     Returns
     -------
@@ -228,18 +555,38 @@ def one_hot_encode(vector):
     vector = np.asarray(vector)
     assert fatf_v.is_1d_array(vector), 'vector has to be 1-D.'
 
-    unique = np.sort(np.unique(vector))
-    unique_count = unique.shape[0]
+    if bins_number is None:
+        unique, inverse = np.unique(vector, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        unique_count = unique.shape[0]
+    else:
+        assert isinstance(bins_number, int) and bins_number > 0, (
+            'Positive integer.')
+        assert vector.dtype.kind in 'iub', 'Bin codes must be integers.'
+        assert np.all((0 <= vector) & (vector < bins_number)), (
+            'The codes exceed the number of bins.')
+        inverse = vector.astype(np.intp)
+        unique_count = bins_number
 
     ohe = np.zeros((vector.shape[0], unique_count), dtype=np.int8)
-
-    for i, v in enumerate(unique):
-        indices = get_hyperrectangle_indices(vector, v)
-        ohe[indices, i] = 1
+    ohe[np.arange(vector.shape[0]), inverse] = 1
 
     return ohe
 
 
+def _cast_inwards(value, dtype, upper):
+    """
+    Casts a bin boundary to the ``dtype``, rounding it towards the inside of
+    the bin -- down for an ``upper`` boundary and up otherwise -- so that
+    (rounded) samples of the bin never cross its boundaries.
+    """
+    cast = dtype.type(value)
+    if (cast > value) if upper else (cast < value):
+        cast = np.nextafter(cast, dtype.type(-np.inf if upper else np.inf))
+    return cast
+
+
+@instrument()
 def get_bin_sampling_values(dataset, discretiser):
     """
     Captures the mean and standard deviation of the ``dataset`` for each
@@ -259,10 +606,16 @@ def get_bin_sampling_values(dataset, discretiser):
         representation; the inner dictionary signifies a partition (quartile)
         of this feature. Under these two keys, a four-tuple holds the:
         minimum, maximum, mean and standard deviation (in this order)
-        values of data points within this partition.
+        values of data points within this partition. The values are
+        floating point scalars of the ``dataset`` dtype (``numpy.float64``
+        for non-floating point data); the minimum and maximum are rounded
+        inwards.
     """
-    dataset_discretised = discretiser.discretise(dataset)
+    with span('discretise') as span_:
+        span_.add('rows', dataset.shape[0])
+        dataset_discretised = discretiser.discretise(dataset)
 
+    float_dtype = _get_float_dtype(dataset.dtype)
     bin_sampling_values = {}
     for index in range(discretiser.features_number):
         bin_sampling_values[index] = {}
@@ -316,18 +669,177 @@ def get_bin_sampling_values(dataset, discretiser):
                 min_val = bin_boundaries[bin_i - 1]
                 max_val = bin_boundaries[bin_i]
 
-            bin_sampling_values[index][bin_id] = (min_val, max_val,
-                                                  mean_val, std_val)
+            bin_sampling_values[index][bin_id] = (
+                _cast_inwards(min_val, float_dtype, False),
+                _cast_inwards(max_val, float_dtype, True),
+                float_dtype.type(mean_val), float_dtype.type(std_val))
 
     return bin_sampling_values
 
 
-def undiscretise_data(discretised_data, discretiser, dataset):
+def bin_sampling_values_to_array(bin_sampling_values):
+    """
+    Converts bin sampling values into a single (dense) numpy array.
+
+    The array representation can be placed in shared memory or saved to disk
+    (see :mod:`xml_book.tools.shared`), unlike the nested dictionaries.
+
+    Parameters
+    ----------
+    bin_sampling_values : dictionary of dictionaries holding 4-tuples
+        The output of :func:`get_bin_sampling_values`.
+
+    Returns
+    -------
+    bin_sampling_array : 3-dimensional numpy array
+        An array of shape ``(features_number, max_bin_id + 1, 4)`` holding the
+        minimum, maximum, mean and standard deviation of each bin (indexed
+        by the feature and the bin ID). The entries of bins that do not exist
+        are filled with numpy nan. The array has the floating point dtype of
+        the values, e.g., ``numpy.float32`` for single precision data.
+    """
+    features_number = len(bin_sampling_values)
+    assert (sorted(bin_sampling_values.keys())
+            == list(range(features_number))), (
+                'Features must be indexed with consecutive integers.')
+    bins_number = 1 + max(max(feature_bins.keys())
+                          for feature_bins in bin_sampling_values.values())
+
+    dtype = _get_float_dtype(np.result_type(*[
+        np.asarray(value).dtype
+        for feature_bins in bin_sampling_values.values()
+        for bin_values in feature_bins.values() for value in bin_values]))
+
+    bin_sampling_array = np.full((features_number, bins_number, 4), np.nan,
+                                 dtype=dtype)
+    for index, feature_bins in bin_sampling_values.items():
+        for bin_id, bin_values in feature_bins.items():
+            bin_sampling_array[index, bin_id] = bin_values
+    return bin_sampling_array
+
+
+def array_to_bin_sampling_values(bin_sampling_array):
+    """
+    Converts the output of :func:`bin_sampling_values_to_array` back into
+    bin sampling values.
+
+    Parameters
+    ----------
+    bin_sampling_array : 3-dimensional numpy array
+        An array representation of bin sampling values.
+
+    Returns
+    -------
+    bin_sampling_values : dictionary of dictionaries holding 4-tuples
+        Bin sampling values (see :func:`get_bin_sampling_values`) -- scalars
+        of the array dtype.
+    """
+    assert (len(bin_sampling_array.shape) == 3
+            and bin_sampling_array.shape[2] == 4), 'Incorrect array shape.'
+    bin_sampling_values = {}
+    for index, feature_bins in enumerate(bin_sampling_array):
+        bin_sampling_values[index] = {}
+        for bin_id, bin_values in enumerate(feature_bins):
+            # Padding entries are all nan; the minimum and maximum of an
+            # existing bin are always defined
+            if not np.all(np.isnan(bin_values)):
+                bin_sampling_values[index][bin_id] = tuple(bin_values)
+    return bin_sampling_values
+
+
+def _get_stratified_uniform(discretised_data, random_generator):
+    """
+    Draws stratified uniform numbers for every bin of every feature.
+
+    The ``n`` data points in a bin get one (jittered) number from each of
+    ``n`` equal-width strata of ``[0, 1)``, randomly assigned to the points,
+    i.e., a Latin hypercube within every hyper-rectangle.
+    """
+    uniform = np.empty(discretised_data.shape, dtype=np.float64)
+    for index in range(discretised_data.shape[1]):
+        column = discretised_data[:, index]
+        order = np.argsort(column, kind='stable')
+        _, starts, counts = np.unique(
+            column[order], return_index=True, return_counts=True)
+        for start, count in zip(starts, counts):
+            strata = random_generator.permutation(count)
+            uniform[order[start:start + count], index] = (
+                (strata + random_generator.random(count)) / count)
+    return uniform
+
+
+# The number of binary digits of the points of scipy's Sobol sequences
+_SOBOL_BITS = 30
+
+
+def _get_sobol_uniform(discretised_data, random_generator):
+    """
+    Draws scrambled Sobol points for every hyper-rectangle.
+
+    All the data points in the same hyper-rectangle get consecutive points of
+    a single (scrambled) Sobol sequence spanning all the features, whose
+    binary digits are flipped with a random digital shift drawn for every
+    hyper-rectangle. The shift keeps the balance properties of the sequence,
+    hence the points of each hyper-rectangle are a randomised Sobol sequence
+    of their own, while the sequence is generated only once.
+    """
+    import scipy.stats.qmc
+
+    inverse, groups_number = _group_hyperrectangles(discretised_data)
+    counts = np.bincount(inverse, minlength=groups_number)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    # The position of every (ordered) data point within its hyper-rectangle
+    positions = np.arange(order.shape[0]) - np.repeat(starts, counts)
+
+    # Draw a power of two points (keeping the balance properties of the
+    # sequence) covering the largest hyper-rectangle
+    sobol = scipy.stats.qmc.Sobol(
+        d=discretised_data.shape[1], scramble=True, seed=random_generator)
+    points = sobol.random_base2(int(np.ceil(np.log2(counts.max()))))
+    # The points are multiples of 2**-_SOBOL_BITS, i.e., their digits are
+    # (exactly) represented by unsigned integers
+    digits = (points * 2**_SOBOL_BITS).astype(np.uint32)
+    shifts = random_generator.integers(
+        2**_SOBOL_BITS, size=(counts.shape[0], discretised_data.shape[1]),
+        dtype=np.uint32)
+
+    uniform = np.empty(discretised_data.shape, dtype=np.float64)
+    uniform[order] = np.bitwise_xor(digits[positions], shifts[inverse[order]])
+    uniform /= 2**_SOBOL_BITS
+    return uniform
+
+
+_SAMPLING_METHODS = {
+    'stratified': _get_stratified_uniform,
+    'sobol': _get_sobol_uniform
+}
+
+
+@instrument()
+def undiscretise_data(discretised_data, discretiser, dataset,
+                      bin_sampling_values=None, sampling='random',
+                      random_generator=None):
     """
     Transforms discretised data back into their original representation.
 
     This function uses truncated normal sampling fitted into each
-    hyper-rectangle.
+    hyper-rectangle. The ``sampling`` parameter selects how the samples are
+    drawn:
+
+    * ``'random'`` -- independent samples (the default);
+    * ``'stratified'`` -- the data points falling into the same bin of a
+      feature are spread over equal-probability strata of its truncated
+      normal distribution (a Latin hypercube within each hyper-rectangle);
+      and
+    * ``'sobol'`` -- the data points falling into the same hyper-rectangle
+      are mapped from a scrambled Sobol sequence.
+
+    The last two modes transform (low-discrepancy) uniform numbers with the
+    truncated normal inverse CDF, which reduces the variance of estimates
+    computed over the undiscretised data (e.g., fidelity or purity of
+    surrogates), hence fewer samples -- and black-box queries -- are needed
+    for the same precision.
 
     Parameters
     ----------
@@ -340,21 +852,46 @@ def undiscretise_data(discretised_data, discretiser, dataset):
     dataset : 2-dimensional numpy array
         A data set used to extract mean and standard deviation of each
         hyper-rectangle.
+    bin_sampling_values : dictionary of dictionaries, optional (default=None)
+        Precomputed output of :func:`get_bin_sampling_values` for the
+        ``dataset`` and ``discretiser``, which saves recomputing it when
+        undiscretising many batches of data. By default (``None``), it is
+        computed from the ``dataset``.
+    sampling : string, optional (default='random')
+        Either ``'random'``, ``'stratified'`` or ``'sobol'``.
+    random_generator : numpy random generator, optional (default=None)
+        A ``numpy.random.Generator`` (or ``numpy.random.RandomState``) used
+        for sampling. By default (``None``), numpy's global random state is
+        used.
 
     Returns
     -------
     bin_sampling_values : 2-dimensional numpy array
         Undiscretised ``discretised_data``.
     """
-    bin_sampling_values = get_bin_sampling_values(dataset, discretiser)
+    assert sampling == 'random' or sampling in _SAMPLING_METHODS, (
+        'Unknown sampling method.')
+    if bin_sampling_values is None:
+        bin_sampling_values = get_bin_sampling_values(dataset, discretiser)
     dataset_dtype = dataset.dtype
 
+    if sampling == 'random':
+        uniform = None
+    else:
+        if random_generator is None:
+            # Seed from the global random state for reproducibility with
+            # numpy.random.seed (as in the random sampling mode)
+            random_generator = np.random.default_rng(
+                np.random.randint(np.iinfo(np.int32).max))
+        uniform = _SAMPLING_METHODS[sampling](discretised_data,
+                                             random_generator)
+
     # Create a placeholder for undiscretised data. We copy the discretised
     # array instead of creating an empty one to preserve the values of
     # sampled categorical features, hence we do not need to copy them
     # later on. We also need to change the type of the array to correspond
-    # to the original dataset.
-    undiscretised_data = discretised_data.copy().astype(dataset_dtype)
+    # to the original dataset (casting makes a single copy).
+    undiscretised_data = discretised_data.astype(dataset_dtype, copy=True)
 
     for index in range(discretised_data.shape[1]):
         discretised_column = discretised_data[:, index]
@@ -375,14 +912,26 @@ def undiscretise_data(discretised_data, discretiser, dataset):
                     lower_bound = (min_ - mean_) / std_
                     upper_bound = (max_ - mean_) / std_
 
-                    unsampled = scipy.stats.truncnorm.rvs(
-                        lower_bound,
-                        upper_bound,
-                        loc=mean_,
-                        scale=std_,
-                        size=samples_number)
+                    with span('truncnorm') as span_:
+                        span_.add('rows', samples_number)
+                        if uniform is None:
+                            unsampled = scipy.stats.truncnorm.rvs(
+                                lower_bound,
+                                upper_bound,
+                                loc=mean_,
+                                scale=std_,
+                                size=samples_number,
+                                random_state=random_generator)
+                        else:
+                            unsampled = scipy.stats.truncnorm.ppf(
+                                uniform[bin_indices, index],
+                                lower_bound,
+                                upper_bound,
+                                loc=mean_,
+                                scale=std_)
                 else:
-                    unsampled = np.array(samples_number * [mean_])
+                    unsampled = mean_
 
+                # Samples are cast to the dtype of the dataset in place
                 undiscretised_column[bin_indices] = unsampled
     return undiscretised_data
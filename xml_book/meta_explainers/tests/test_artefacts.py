@@ -0,0 +1,91 @@
+"""
+Tests the explanation artefacts module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import os
+
+import numpy as np
+import pytest
+
+import fatf.utils.data.discretisation as fudd
+
+from xml_book.meta_explainers.artefacts import (load_explanation,
+                                                save_explanation)
+from xml_book.meta_explainers.surrogates import get_bin_sampling_values
+
+
+def _get_bin_sampling_values(dtype):
+    """Computes bin sampling values of random data."""
+    random_generator = np.random.RandomState(42)
+    dataset = random_generator.normal(size=(1000, 3)).astype(dtype)
+    discretiser = fudd.QuartileDiscretiser(dataset)
+    return get_bin_sampling_values(dataset, discretiser)
+
+
+def test_explanation_round_trip(tmp_path):
+    """Tests saving and loading an explanation."""
+    arrays = dict(discretised_data=np.arange(12, dtype=np.int8).reshape(4, 3),
+                  predictions=np.linspace(0, 1, 4, dtype=np.float32))
+    for dtype in (np.float32, np.float64):
+        path = str(tmp_path / np.dtype(dtype).name)
+        bin_sampling_values = _get_bin_sampling_values(dtype)
+        save_explanation(path, arrays=arrays,
+                         bin_sampling_values=bin_sampling_values,
+                         metadata=dict(instance=7))
+
+        for mmap in (True, False):
+            explanation = load_explanation(path, mmap=mmap)
+            assert explanation.metadata == dict(instance=7)
+            assert sorted(explanation.keys()) == [
+                'bin_sampling_values', 'discretised_data', 'predictions']
+            for name, array in arrays.items():
+                assert explanation[name].dtype == array.dtype
+                assert np.array_equal(explanation[name], array)
+
+            loaded_values = explanation.get_bin_sampling_values()
+            assert loaded_values.keys() == bin_sampling_values.keys()
+            for index, feature_bins in bin_sampling_values.items():
+                assert loaded_values[index].keys() == feature_bins.keys()
+                for bin_id, bin_values in feature_bins.items():
+                    loaded_bin_values = loaded_values[index][bin_id]
+                    assert all(isinstance(value, dtype)
+                               for value in loaded_bin_values)
+                    assert loaded_bin_values == bin_values
+
+
+def test_explanation_overwrite(tmp_path):
+    """Tests overwriting an explanation."""
+    path = str(tmp_path / 'explanation')
+    save_explanation(path, arrays=dict(data=np.zeros(3)))
+    explanation = load_explanation(path)
+    old_files = os.listdir(path)
+
+    with pytest.raises(AssertionError, match='already exists'):
+        save_explanation(path, arrays=dict(data=np.ones(3)))
+    save_explanation(path, arrays=dict(data=np.ones(3)), overwrite=True)
+    assert np.array_equal(load_explanation(path)['data'], np.ones(3))
+    # The explanation loaded before remains valid
+    assert np.array_equal(explanation['data'], np.zeros(3))
+    # The old arrays are removed
+    assert len(os.listdir(path)) == len(old_files) == 2
+    assert set(os.listdir(path)) & set(old_files) == {'manifest.json'}
+
+    # Directories without a manifest are never replaced
+    directory = tmp_path / 'directory'
+    directory.mkdir()
+    (directory / 'data.txt').write_text('data')
+    with pytest.raises(AssertionError, match='not an explanation'):
+        save_explanation(str(directory), arrays=dict(data=np.ones(3)),
+                         overwrite=True)
+    assert os.listdir(str(directory)) == ['data.txt']
+
+    # A failed write leaves the explanation intact
+    with pytest.raises(AssertionError, match='objects'):
+        save_explanation(path, arrays=dict(data=np.ones(3),
+                                           objects=np.array([None])),
+                         overwrite=True)
+    assert np.array_equal(load_explanation(path)['data'], np.ones(3))
+    assert len(os.listdir(path)) == 2
@@ -0,0 +1,59 @@
+"""
+Tests the bin statistics module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import numpy as np
+
+import fatf.utils.data.discretisation as fudd
+
+from xml_book.meta_explainers.bin_statistics import BinStatistics
+from xml_book.meta_explainers.surrogates import get_bin_sampling_values
+
+
+def _assert_bin_sampling_values_equal(bin_sampling_values, expected, dtype):
+    """
+    Checks that bin sampling values have the same bins, dtype and boundaries
+    as the expected ones (and approximately the same moments).
+    """
+    assert bin_sampling_values.keys() == expected.keys()
+    for index, feature_bins in expected.items():
+        assert bin_sampling_values[index].keys() == feature_bins.keys()
+        for bin_id, expected_values in feature_bins.items():
+            values = bin_sampling_values[index][bin_id]
+            assert all(isinstance(value, dtype) for value in values)
+            assert values[:2] == expected_values[:2]
+            assert np.allclose(values[2:], expected_values[2:],
+                               rtol=10 * np.finfo(dtype).eps, atol=0)
+
+
+def test_bin_statistics():
+    """Tests streamed and merged statistics against the batch function."""
+    random_generator = np.random.RandomState(42)
+    dataset = random_generator.normal(loc=5, size=(3000, 3))
+
+    for dtype in (np.float32, np.float64):
+        dataset_ = dataset.astype(dtype)
+        discretiser = fudd.QuartileDiscretiser(dataset_)
+        expected = get_bin_sampling_values(dataset_, discretiser)
+
+        streamed = BinStatistics(discretiser)
+        for chunk in np.array_split(dataset_, 7):
+            streamed.update(chunk)
+        assert streamed.dtype == dtype
+        _assert_bin_sampling_values_equal(
+            streamed.to_bin_sampling_values(), expected, dtype)
+
+        merged = BinStatistics(discretiser).update(dataset_[:1000])
+        merged.merge(BinStatistics(discretiser).update(dataset_[1000:2500]))
+        merged.merge(BinStatistics(discretiser).update(dataset_[2500:]))
+        _assert_bin_sampling_values_equal(
+            merged.to_bin_sampling_values(), expected, dtype)
+
+    # Single and double precision statistics are merged in double precision
+    merged = BinStatistics(discretiser).update(dataset[100:])
+    merged.merge(
+        BinStatistics(discretiser).update(dataset[:100].astype(np.float32)))
+    assert merged.dtype == np.float64
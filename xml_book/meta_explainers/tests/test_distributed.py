@@ -0,0 +1,98 @@
+"""
+Tests the distributed purity module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+from xml_book.meta_explainers.distributed import (PuritySummary,
+                                                  distributed_weighted_purity,
+                                                  merge_summaries)
+from xml_book.meta_explainers.surrogates import weighted_purity
+
+
+def _get_grid(seed=42, rows_number=3000):
+    """Generates discretised data with crisp and numerical labels."""
+    random = np.random.RandomState(seed)
+    discretised_data = random.randint(0, 4, size=(rows_number, 3))
+    crisp_labels = random.choice(np.array(['a', 'b', 'c']), rows_number)
+    numerical_labels = 1000 + random.normal(size=rows_number)
+    return discretised_data, crisp_labels, numerical_labels
+
+
+def _get_shards(discretised_data, labels, shards_number):
+    """Splits data into (unequal) shards."""
+    splits = np.sort(np.random.RandomState(0).choice(
+        np.arange(1, discretised_data.shape[0]), shards_number - 1,
+        replace=False))
+    return list(zip(np.split(discretised_data, splits),
+                    np.split(labels, splits)))
+
+
+@pytest.mark.parametrize('metric', ['gini', 'mse'])
+@pytest.mark.parametrize('shards_number', [1, 2, 7])
+def test_distributed_weighted_purity(metric, shards_number):
+    """
+    Tests that the distributed purity equals the purity of all the data.
+    """
+    discretised_data, crisp_labels, numerical_labels = _get_grid()
+    labels = crisp_labels if metric == 'gini' else numerical_labels
+    expected = weighted_purity(discretised_data, labels, metric)
+
+    shards = _get_shards(discretised_data, labels, shards_number)
+    purity = distributed_weighted_purity(shards, metric)
+    assert np.isclose(purity, expected, rtol=1e-12, atol=0)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        purity_ = distributed_weighted_purity(shards, metric,
+                                              executor=executor)
+    assert purity_ == purity
+
+
+def test_distributed_weighted_purity_disjoint_classes():
+    """
+    Tests merging shards whose classes and cells only partially overlap.
+    """
+    discretised_data = np.array([[0, 0], [0, 1], [1, 1], [0, 0], [1, 1]])
+    labels = np.array([0, 1, 1, 2, 2])
+    expected = weighted_purity(discretised_data, labels, 'gini')
+
+    shards = [(discretised_data[:3], labels[:3]),
+              (discretised_data[3:], labels[3:])]
+    assert np.isclose(distributed_weighted_purity(shards, 'gini'), expected)
+
+
+@pytest.mark.parametrize('metric', ['gini', 'mse'])
+def test_summary_bytes(metric):
+    """
+    Tests the serialisation of purity summaries.
+    """
+    discretised_data, crisp_labels, numerical_labels = _get_grid()
+    labels = crisp_labels if metric == 'gini' else numerical_labels
+    summary = PuritySummary.from_shard(discretised_data, labels, metric)
+
+    summary_ = PuritySummary.from_bytes(summary.to_bytes())
+    assert summary_.metric == summary.metric
+    assert np.array_equal(summary_.cells, summary.cells)
+    assert np.array_equal(summary_.counts, summary.counts)
+    assert summary_.statistics.keys() == summary.statistics.keys()
+    for key, value in summary.statistics.items():
+        assert np.array_equal(summary_.statistics[key], value)
+    assert summary_.weighted_purity() == summary.weighted_purity()
+
+
+def test_merge_summaries_empty():
+    """
+    Tests that merging no summaries fails with an informative error.
+    """
+    with pytest.raises(AssertionError,
+                       match='At least one summary is required.'):
+        merge_summaries([])
+    with pytest.raises(AssertionError,
+                       match='At least one summary is required.'):
+        merge_summaries(iter([]))
@@ -0,0 +1,65 @@
+"""
+Tests the fidelity module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import concurrent.futures
+
+import numpy as np
+
+from sklearn.linear_model import LogisticRegression
+
+from xml_book.data.data import generate_2d_moons
+from xml_book.meta_explainers.fidelity import (UniformSampler,
+                                               evaluate_fidelity)
+from xml_book.models.tabular import get_svc
+
+
+def _get_models():
+    """Fits a crisp black box and a probabilistic surrogate."""
+    train_data, _, train_target, _ = generate_2d_moons(42)
+    black_box = get_svc(train_data, train_target, 42)
+    surrogate = LogisticRegression().fit(
+        train_data, black_box.predict(train_data))
+    return black_box, surrogate
+
+
+def test_evaluate_fidelity_crisp():
+    """Tests the fidelity of crisp models."""
+    black_box, surrogate = _get_models()
+    assert not hasattr(black_box, 'predict_proba')
+    sampler = UniformSampler([0, 0], [1, 1])
+
+    fidelity = evaluate_fidelity(black_box, surrogate, 'inst-glob', sampler,
+                                 chunk_size=1000, max_samples=5000,
+                                 random_seed=42)
+    assert 0 < fidelity['agreement'] < 1
+    assert fidelity['samples'] == fidelity['region_samples'] == 5000
+
+    # Perfect agreement still has a confidence interval
+    fidelity = evaluate_fidelity(black_box, black_box, 'inst-glob', sampler,
+                                 chunk_size=1000, max_samples=5000,
+                                 random_seed=42)
+    assert fidelity['agreement'] == 1 and fidelity['mse'] == 0
+    assert fidelity['agreement_ci'] > 0
+    lower, upper = fidelity['agreement_interval']
+    assert lower < 1 and np.isclose(upper, 1)
+
+
+def test_evaluate_fidelity_executors():
+    """Tests that the results do not depend on the executor."""
+    black_box, surrogate = _get_models()
+    sampler = UniformSampler([0, 0], [1, 1])
+    kwargs = dict(chunk_size=1000, max_samples=8000, workers=2,
+                  random_seed=42)
+
+    # The default process pool
+    fidelity = evaluate_fidelity(black_box, surrogate, 'mod-loc', sampler,
+                                 **kwargs)
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        fidelity_ = evaluate_fidelity(black_box, surrogate, 'mod-loc',
+                                      sampler, executor=executor, **kwargs)
+    assert fidelity == fidelity_
+    assert fidelity['region_samples'] < fidelity['samples']
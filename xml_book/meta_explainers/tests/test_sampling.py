@@ -0,0 +1,75 @@
+"""
+Tests the sampling module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import numpy as np
+
+import fatf.utils.data.discretisation as fudd
+
+from xml_book.meta_explainers.sampling import AliasSampler, build_alias_table
+
+SAMPLES_NUMBER = 200000
+
+
+def _get_table_distribution(probabilities, aliases):
+    """Computes the distribution encoded by an alias table."""
+    outcomes_number = probabilities.shape[0]
+    distribution = probabilities + np.bincount(
+        aliases, weights=1 - probabilities, minlength=outcomes_number)
+    return distribution / outcomes_number
+
+
+def _assert_frequencies(samples, expected):
+    """
+    Checks that sample frequencies are within 5 standard deviations of the
+    expected probabilities.
+    """
+    frequencies = np.bincount(samples, minlength=expected.shape[0])
+    frequencies = frequencies / samples.shape[0]
+    std = np.sqrt(expected * (1 - expected) / samples.shape[0])
+    assert np.all(np.abs(frequencies - expected) <= 5 * std + 1e-12)
+
+
+def test_build_alias_table():
+    """Tests that alias tables encode their distributions."""
+    random_generator = np.random.RandomState(42)
+    for weights in (np.array([1.0]), np.array([0, 3, 0, 1.0]),
+                    np.array([1000.0] + [1] * 999),
+                    random_generator.exponential(size=5000)):
+        probabilities, aliases = build_alias_table(weights)
+        assert np.all((0 <= probabilities) & (probabilities <= 1))
+        assert np.allclose(_get_table_distribution(probabilities, aliases),
+                           weights / weights.sum())
+
+
+def test_alias_sampler():
+    """Tests the frequencies of the sampled discretised data."""
+    random_generator = np.random.RandomState(42)
+    dataset = random_generator.normal(size=(2000, 3))
+    # Dependent features
+    dataset[:, 1] += 2 * dataset[:, 0]
+    discretiser = fudd.QuartileDiscretiser(dataset)
+    dataset_discretised = discretiser.discretise(dataset)
+
+    sampler = AliasSampler(dataset, discretiser)
+    samples = sampler.sample(SAMPLES_NUMBER, np.random.default_rng(42))
+    assert samples.dtype == np.int8
+    for index in range(dataset.shape[1]):
+        expected = np.bincount(dataset_discretised[:, index].astype(int))
+        _assert_frequencies(samples[:, index].astype(int),
+                            expected / dataset.shape[0])
+
+    sampler = AliasSampler(dataset, discretiser, joint=True)
+    samples = sampler.sample(SAMPLES_NUMBER, np.random.default_rng(42),
+                             batch_size=30000)
+    cells, expected = np.unique(dataset_discretised, axis=0,
+                                return_counts=True)
+    assert np.array_equal(sampler.cells, cells)
+    # Every sample is one of the reference hyper-rectangles
+    matches = np.all(samples[:, np.newaxis, :] == cells, axis=2)
+    assert np.all(matches.sum(axis=1) == 1)
+    _assert_frequencies(np.argmax(matches, axis=1),
+                        expected / dataset.shape[0])
@@ -0,0 +1,56 @@
+"""
+Tests the explanation service module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import asyncio
+import concurrent.futures
+
+import numpy as np
+
+import fatf.utils.data.discretisation as fudd
+
+from sklearn.linear_model import LogisticRegression
+
+from xml_book.meta_explainers.service import ExplanationRunner
+
+
+def _get_context():
+    """Builds a model, a discretiser and a reference data set."""
+    random_generator = np.random.RandomState(42)
+    dataset = random_generator.normal(size=(200, 2))
+    labels = (dataset[:, 0] > 0).astype(int)
+    model = LogisticRegression().fit(dataset, labels)
+    discretiser = fudd.QuartileDiscretiser(dataset)
+    return model, discretiser, dataset
+
+
+async def _explain_twice(runner, discretised_data):
+    """Explains the same data in two consecutive batches."""
+    model, discretiser, dataset = _get_context()
+    runner.register('model', model, discretiser, dataset)
+    async with runner:
+        first, _ = await runner.explain('model', discretised_data)
+        second, _ = await runner.explain('model', discretised_data)
+    return first, second
+
+
+def test_batches_random_samples():
+    """Tests that each batch is undiscretised with different samples."""
+    discretised_data = np.array([[1, 2], [3, 0], [2, 2]], dtype=np.int8)
+
+    # Process pool inheriting the (global) random state of this process
+    runner = ExplanationRunner(max_workers=1, random_seed=42)
+    first, second = asyncio.run(_explain_twice(runner, discretised_data))
+    assert first.shape == second.shape == (3, 2)
+    assert not np.array_equal(first, second)
+
+    # Reproducibility across runners with the same seed
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        runner = ExplanationRunner(executor=executor, random_seed=42)
+        first_, second_ = asyncio.run(_explain_twice(runner, discretised_data))
+    assert np.array_equal(first, first_)
+    assert np.array_equal(second, second_)
+    assert not np.array_equal(first_, second_)
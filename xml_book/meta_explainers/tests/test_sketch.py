@@ -0,0 +1,56 @@
+"""
+Tests the quantile sketch module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import numpy as np
+
+from xml_book.meta_explainers.sketch import QuantileSketch
+
+PERCENTILES = np.linspace(1, 99, 99)
+
+
+def _get_rank_error(sketch, data):
+    """
+    Computes the largest distance between the requested and the true rank
+    (as a fraction of the data) of the approximate quantiles.
+    """
+    quantiles = sketch.get_quantiles(PERCENTILES)
+    data = np.sort(data)
+    lower_rank = np.searchsorted(data, quantiles, side='left') / data.shape[0]
+    upper_rank = np.searchsorted(data, quantiles, side='right') / data.shape[0]
+    ranks = PERCENTILES / 100
+    return np.max(np.maximum(0, np.maximum(lower_rank - ranks,
+                                           ranks - upper_rank)))
+
+
+def test_quantile_sketch():
+    """Tests the rank error of single and merged sketches."""
+    k = 200
+    for seed in range(5):
+        random_generator = np.random.default_rng(seed)
+        data = random_generator.normal(size=100000)
+
+        sketch = QuantileSketch(k=k, random_generator=random_generator)
+        for chunk in np.array_split(data, 10):
+            sketch.update(chunk)
+        assert sketch.n == data.shape[0]
+        assert sum(level.shape[0] for level in sketch.levels) <= 3 * k
+        assert _get_rank_error(sketch, data) <= 2 / k
+
+        sketches = [
+            QuantileSketch(k=k, random_generator=random_generator).update(
+                chunk) for chunk in np.array_split(data, 8)]
+        merged = sketches[0]
+        for sketch in sketches[1:]:
+            merged.merge(sketch)
+        assert merged.n == data.shape[0]
+        assert sum(level.shape[0] for level in merged.levels) <= 3 * k
+        assert _get_rank_error(merged, data) <= 2 / k
+
+    # Sketches below their capacity are exact
+    data = np.arange(100, dtype=np.float64)
+    sketch = QuantileSketch(k=k).update(data)
+    assert np.array_equal(sketch.get_quantiles([0, 50, 100]), [0, 49, 99])
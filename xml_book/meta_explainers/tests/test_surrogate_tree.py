@@ -0,0 +1,69 @@
+"""
+Tests the histogram-based surrogate tree.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import numpy as np
+
+from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+
+from xml_book.meta_explainers.surrogate_tree import HistogramSurrogateTree
+
+
+def _get_data(samples_number=2000):
+    """Generates discretised data with numerical labels and weights."""
+    random_generator = np.random.RandomState(42)
+    data = random_generator.randint(0, 6, size=(samples_number, 4))
+    labels = (0.3 * data[:, 0] + np.sin(data[:, 1])
+              + random_generator.normal(scale=0.1, size=samples_number))
+    weights = random_generator.uniform(0.01, 1, size=samples_number)
+    return data, labels, weights
+
+
+def _is_same_partition(leaves, sklearn_leaves):
+    """Checks whether two trees partition the data into the same leaves."""
+    pairs = np.unique(np.stack([leaves, sklearn_leaves], axis=1), axis=0)
+    return (pairs.shape[0] == np.unique(leaves).shape[0]
+            == np.unique(sklearn_leaves).shape[0])
+
+
+def test_mse_against_sklearn():
+    """Tests the mse tree against sklearn's regression tree."""
+    data, labels, weights = _get_data()
+    for sample_weight in (None, weights):
+        tree = HistogramSurrogateTree(max_depth=4, metric='mse').fit(
+            data, labels, sample_weight=sample_weight)
+        sklearn_tree = DecisionTreeRegressor(max_depth=4, random_state=42)
+        sklearn_tree.fit(data, labels, sample_weight=sample_weight)
+
+        assert _is_same_partition(tree.apply(data), sklearn_tree.apply(data))
+        assert np.allclose(tree.predict(data), sklearn_tree.predict(data))
+
+
+def test_mse_large_mean():
+    """Tests that the mse splits do not depend on the mean of the labels."""
+    data, labels, weights = _get_data()
+    tree = HistogramSurrogateTree(max_depth=4, metric='mse').fit(
+        data, labels, sample_weight=weights)
+    for offset in (1e4, 1e8, -1e8):
+        tree_ = HistogramSurrogateTree(max_depth=4, metric='mse').fit(
+            data, labels + offset, sample_weight=weights)
+        assert np.array_equal(tree.feature_, tree_.feature_)
+        assert np.array_equal(tree.threshold_, tree_.threshold_)
+
+
+def test_gini_against_sklearn():
+    """Tests the gini tree against sklearn's classification tree."""
+    data, labels, weights = _get_data()
+    labels = np.digitize(labels, np.quantile(labels, [0.3, 0.7]))
+    for sample_weight in (None, weights):
+        tree = HistogramSurrogateTree(max_depth=3, metric='gini').fit(
+            data, labels, sample_weight=sample_weight)
+        sklearn_tree = DecisionTreeClassifier(max_depth=3, random_state=42)
+        sklearn_tree.fit(data, labels, sample_weight=sample_weight)
+
+        assert _is_same_partition(tree.apply(data), sklearn_tree.apply(data))
+        assert np.allclose(tree.predict_proba(data),
+                           sklearn_tree.predict_proba(data))
@@ -0,0 +1,221 @@
+"""
+Tests the surrogate module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import tracemalloc
+
+import numpy as np
+import scipy.stats
+
+import fatf.utils.data.discretisation as fudd
+
+from xml_book.meta_explainers.surrogates import (_get_sobol_uniform,
+                                                 entropy, entropy_counts,
+                                                 get_bin_sampling_values,
+                                                 get_group_class_counts,
+                                                 gini_index, gini_index_counts,
+                                                 mse, undiscretise_data,
+                                                 weighted_purity)
+
+SAMPLES_NUMBER = 100000
+
+
+def _get_peak_memory(function, *args, **kwargs):
+    """Measures the peak memory allocated by a function call."""
+    tracemalloc.start()
+    try:
+        result = function(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def _get_data(dtype, samples_number=10000, features_number=4):
+    """Generates a data set and its quartile discretiser."""
+    random_generator = np.random.RandomState(42)
+    dataset = random_generator.normal(
+        size=(samples_number, features_number)).astype(dtype)
+    discretiser = fudd.QuartileDiscretiser(dataset)
+    return dataset, discretiser
+
+
+def _get_unique_gini(x):
+    """Computes Gini Index by counting the classes with ``np.unique``."""
+    _, counts = np.unique(x, return_counts=True)
+    frequencies = counts / x.shape[0]
+    return np.sum(frequencies * (1 - frequencies))
+
+
+def _get_unique_entropy(x, base=None):
+    """Computes entropy by counting the classes with ``np.unique``."""
+    _, counts = np.unique(x, return_counts=True)
+    return scipy.stats.entropy(counts, base=base)
+
+
+def test_group_impurity_counts():
+    """Tests the Gini Index and entropy of groups of class counts."""
+    random_generator = np.random.RandomState(42)
+    groups_number, classes_number = 6, 3
+    groups = random_generator.randint(0, groups_number, size=500)
+    labels = random_generator.randint(0, classes_number, size=500)
+    # Groups with absent classes: a pure, a two-class and an empty group
+    labels[groups == 0] = 1
+    labels[groups == 1] = labels[groups == 1] % 2
+    groups[groups == 2] = 3
+    # Integer weights are equivalent to repeating the instances
+    weights = random_generator.randint(0, 4, size=500)
+
+    for weights_ in (None, weights):
+        repeats = np.ones(500, dtype=int) if weights_ is None else weights_
+        counts = get_group_class_counts(
+            groups, labels, groups_number, classes_number, weights=weights_)
+        gini = gini_index_counts(counts)
+        entropy_ = entropy_counts(counts)
+        entropy_2 = entropy_counts(counts, base=2)
+        for group in range(groups_number):
+            group_labels = np.repeat(labels[groups == group],
+                                     repeats[groups == group])
+            if not group_labels.shape[0]:
+                assert gini[group] == entropy_[group] == 0
+                continue
+            assert np.isclose(gini[group], _get_unique_gini(group_labels))
+            assert np.isclose(entropy_[group],
+                              _get_unique_entropy(group_labels))
+            assert np.isclose(entropy_2[group],
+                              _get_unique_entropy(group_labels, base=2))
+
+            assert np.isclose(
+                gini_index(group_labels, classes_number=classes_number),
+                _get_unique_gini(group_labels))
+            assert np.isclose(
+                entropy(group_labels, classes_number=classes_number),
+                _get_unique_entropy(group_labels))
+        # Pure groups have zero (not negative zero) impurity
+        assert gini[0] == 0 and not np.signbit(gini[0])
+        assert entropy_[0] == 0 and not np.signbit(entropy_[0])
+
+    pure = entropy_counts(np.array([3, 0]))
+    assert pure == 0 and not np.signbit(pure)
+
+
+def test_mse():
+    """Tests the dtype and allocations of the mse function."""
+    random_generator = np.random.RandomState(42)
+    labels = random_generator.rand(SAMPLES_NUMBER)
+
+    for dtype in (np.float32, np.float64):
+        labels_ = labels.astype(dtype)
+        mse_, peak = _get_peak_memory(mse, labels_)
+        assert np.asarray(mse_).dtype == dtype
+        # A single array of errors (squared in place)
+        assert peak < 1.1 * labels_.nbytes
+
+    assert np.asarray(mse(np.array([1, 2, 3]))).dtype == np.float64
+
+
+def test_weighted_purity_mse():
+    """Tests the dtype and allocations of the mse weighted purity."""
+    random_generator = np.random.RandomState(42)
+    discretised_data = random_generator.randint(
+        0, 4, size=(SAMPLES_NUMBER, 4)).astype(np.int8)
+    labels = random_generator.rand(SAMPLES_NUMBER)
+
+    peaks = {}
+    for dtype in (np.float32, np.float64):
+        purity, peaks[dtype] = _get_peak_memory(
+            weighted_purity, discretised_data, labels.astype(dtype), 'mse')
+        assert np.asarray(purity).dtype == dtype
+    # The errors are kept in single precision
+    assert peaks[np.float32] <= (peaks[np.float64]
+                                 - 4 * SAMPLES_NUMBER * 0.9)
+
+
+def test_get_bin_sampling_values():
+    """Tests the dtype of the bin sampling values."""
+    for dtype in (np.float32, np.float64, np.int64):
+        dataset, discretiser = _get_data(dtype)
+        if dtype is np.int64:
+            dataset = (10 * dataset).astype(np.int64)
+            discretiser = fudd.QuartileDiscretiser(dataset)
+        expected_dtype = np.float64 if dtype is np.int64 else dtype
+
+        dataset_discretised = discretiser.discretise(dataset)
+        bin_sampling_values = get_bin_sampling_values(dataset, discretiser)
+        for index, feature_bins in bin_sampling_values.items():
+            for bin_id, bin_values in feature_bins.items():
+                assert all(isinstance(value, expected_dtype)
+                           for value in bin_values)
+                # The (rounded) boundaries hold the data of the bin
+                min_, max_, _, _ = bin_values
+                feature = dataset[dataset_discretised[:, index] == bin_id,
+                                  index]
+                assert np.all((min_ <= feature) & (feature <= max_))
+
+
+def test_undiscretise_data():
+    """Tests the dtype and allocations of the undiscretise_data function."""
+    # Many features with few rows per bin, so that the (per bin) sampling
+    # temporaries are small in comparison to the output
+    random_generator = np.random.RandomState(42)
+    discretised_data = random_generator.randint(
+        0, 4, size=(SAMPLES_NUMBER // 5, 32)).astype(np.int8)
+
+    for dtype in (np.float32, np.float64):
+        dataset, discretiser = _get_data(dtype, features_number=32)
+        bin_sampling_values = get_bin_sampling_values(dataset, discretiser)
+
+        np.random.seed(42)
+        undiscretised_data, peak = _get_peak_memory(
+            undiscretise_data, discretised_data, discretiser, dataset,
+            bin_sampling_values=bin_sampling_values)
+        assert undiscretised_data.dtype == dtype
+        assert np.array_equal(discretiser.discretise(undiscretised_data),
+                              discretised_data)
+        # No double precision copy of the output is made
+        assert peak < undiscretised_data.nbytes + 8 * discretised_data.size
+
+
+def test_undiscretise_data_sampling():
+    """Tests that all the sampling methods keep samples inside their bins."""
+    random_generator = np.random.RandomState(42)
+    for dtype in (np.float32, np.float64):
+        dataset, discretiser = _get_data(dtype, samples_number=2000,
+                                         features_number=3)
+        dataset_discretised = discretiser.discretise(dataset)
+        discretised_data = dataset_discretised[
+            random_generator.randint(0, 2000, size=5000)]
+        bin_sampling_values = get_bin_sampling_values(dataset, discretiser)
+
+        for sampling in ('random', 'stratified', 'sobol'):
+            undiscretised_data = undiscretise_data(
+                discretised_data, discretiser, dataset,
+                bin_sampling_values=bin_sampling_values, sampling=sampling,
+                random_generator=np.random.default_rng(42))
+            assert undiscretised_data.dtype == dtype
+            assert np.array_equal(discretiser.discretise(undiscretised_data),
+                                  discretised_data)
+
+
+def test_get_sobol_uniform():
+    """Tests that every hyper-rectangle gets balanced Sobol points."""
+    discretised_data = np.repeat(
+        np.array([[0, 1], [2, 0], [3, 3]], dtype=np.int8), 64, axis=0)
+    np.random.RandomState(42).shuffle(discretised_data)
+
+    uniform = _get_sobol_uniform(discretised_data, np.random.default_rng(42))
+    assert np.all((0 <= uniform) & (uniform < 1))
+    cells = np.unique(discretised_data, axis=0)
+    for cell in cells:
+        cell_uniform = uniform[np.all(discretised_data == cell, axis=1)]
+        # Every feature has exactly one point in each of the 64 strata
+        for index in range(discretised_data.shape[1]):
+            strata = np.floor(cell_uniform[:, index] * 64).astype(int)
+            assert np.array_equal(np.sort(strata), np.arange(64))
+    # The hyper-rectangles do not share their points
+    assert not np.array_equal(
+        np.sort(uniform[np.all(discretised_data == cells[0], axis=1)], 0),
+        np.sort(uniform[np.all(discretised_data == cells[1], axis=1)], 0))
@@ -0,0 +1,206 @@
+"""
+XML Book Model Cache Module
+===========================
+
+This module implements a prediction cache for fitted predictive models.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import collections
+import sys
+import threading
+
+import numpy as np
+
+__all__ = ['CachedModel']
+
+# Approximate memory overhead (in bytes) of a single cache entry
+_ENTRY_OVERHEAD = 200
+
+
+class CachedModel(object):
+    """
+    Caches predictions of a fitted model.
+
+    Surrogate sampling -- e.g., with
+    :func:`xml_book.meta_explainers.surrogates.undiscretise_data` -- often
+    produces duplicated data points, all of which would otherwise be
+    predicted by the model. This wrapper:
+
+    * deduplicates the rows of each batch (with ``np.unique``) so that every
+      unique row is predicted only once;
+    * keeps the predictions of recently seen rows (keyed by the bytes of a
+      row) in a least-recently-used cache whose memory is capped; and
+    * queries the model once per batch with all the rows that are not cached.
+
+    All other attributes (e.g., ``classes_``) are taken from the wrapped model.
+    The wrapper can be pickled (e.g., sent to worker processes), in which case
+    its copy starts with an empty cache.
+
+    Parameters
+    ----------
+    model : object
+        A fitted model with ``predict`` and (optionally) ``predict_proba``
+        methods, e.g., the output of
+        :func:`xml_book.models.tabular.get_random_forest` or
+        :func:`xml_book.models.tabular.get_svc`.
+    max_memory : integer, optional (default=2**26)
+        The (approximate) maximum memory (in bytes) used by the cached
+        predictions.
+
+    Attributes
+    ----------
+    hits : integer
+        The number of unique batch rows found in the cache.
+    misses : integer
+        The number of unique batch rows predicted by the model.
+    duplicates : integer
+        The number of rows that repeated within their batch.
+    model_calls : integer
+        The number of calls of the wrapped model.
+    memory : integer
+        The (approximate) memory used by the cached predictions.
+    """
+
+    def __init__(self, model, max_memory=2**26):
+        """Initialises CachedModel class."""
+        assert hasattr(model, 'predict'), 'The model must have predict.'
+        assert isinstance(max_memory, int) and max_memory >= 0, (
+            'Non-negative integer.')
+        self.model = model
+        self.max_memory = max_memory
+
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+        self.model_calls = 0
+
+    def __getstate__(self):
+        """Drops the lock and the cached predictions when pickling."""
+        state = self.__dict__.copy()
+        del state['_lock']
+        del state['_cache']
+        state['memory'] = 0
+        return state
+
+    def __setstate__(self, state):
+        """Recreates the lock and an empty cache when unpickling."""
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()
+
+    def __getattr__(self, name):
+        # Only called for attributes missing from this object
+        if name == 'model':
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def predict(self, X):
+        """Predicts the rows of ``X`` with the model's ``predict``."""
+        return self._predict('predict', X)
+
+    def predict_proba(self, X):
+        """Predicts the rows of ``X`` with the model's ``predict_proba``."""
+        assert hasattr(self.model, 'predict_proba'), (
+            'The model does not have predict_proba.')
+        return self._predict('predict_proba', X)
+
+    def _predict(self, method, X):
+        """Predicts the rows of ``X`` with a (cached) ``method``."""
+        X = np.ascontiguousarray(X)
+        assert len(X.shape) == 2, 'The data must be a 2-D array.'
+        if not X.shape[0]:
+            with self._lock:
+                self.model_calls += 1
+            return getattr(self.model, method)(X)
+
+        unique_rows, inverse = np.unique(X, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        unique_rows = np.ascontiguousarray(unique_rows)
+        prefix = '{}:{}:{}:'.format(
+            method, X.dtype.str, X.shape[1]).encode()
+        keys = [prefix + row.tobytes() for row in unique_rows]
+
+        values = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._cache.get(key)
+                if entry is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    values[i] = entry[1]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            self.duplicates += X.shape[0] - len(keys)
+
+        if missing:
+            predictions = getattr(self.model, method)(unique_rows[missing])
+            with self._lock:
+                self.model_calls += 1
+                for i, prediction in zip(missing, predictions):
+                    # Copy rows (e.g., of probabilities) to release the
+                    # memory of the whole predictions array
+                    if isinstance(prediction, np.ndarray):
+                        prediction = prediction.copy()
+                    values[i] = prediction
+                    self._store(keys[i], prediction)
+
+        unique_predictions = np.asarray(values)
+        return unique_predictions[inverse]
+
+    def _store(self, key, prediction):
+        """Stores a prediction and evicts the least recently used ones."""
+        if key in self._cache:
+            return
+        size = (sys.getsizeof(key) + getattr(prediction, 'nbytes', 8)
+                + _ENTRY_OVERHEAD)
+        if size > self.max_memory:
+            return
+        self._cache[key] = (size, prediction)
+        self.memory += size
+        while self.memory > self.max_memory:
+            _, (evicted_size, _) = self._cache.popitem(last=False)
+            self.memory -= evicted_size
+
+    @property
+    def hit_rate(self):
+        """The proportion of rows that did not have to be predicted."""
+        total = self.hits + self.misses + self.duplicates
+        return (self.hits + self.duplicates) / total if total else 0.0
+
+    def get_statistics(self):
+        """
+        Summarises the cache usage.
+
+        Returns
+        -------
+        statistics : dictionary
+            The number of ``hits``, ``misses``, ``duplicates``,
+            ``model_calls``, the ``hit_rate``, the number of cached
+            ``entries`` and their ``memory``.
+        """
+        with self._lock:
+            return dict(hits=self.hits,
+                        misses=self.misses,
+                        duplicates=self.duplicates,
+                        model_calls=self.model_calls,
+                        hit_rate=self.hit_rate,
+                        entries=len(self._cache),
+                        memory=self.memory)
+
+    def clear(self):
+        """Removes all the cached predictions and resets the statistics."""
+        with self._lock:
+            self._cache.clear()
+            self.memory = 0
+            self.hits = 0
+            self.misses = 0
+            self.duplicates = 0
+            self.model_calls = 0
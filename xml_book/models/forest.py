@@ -0,0 +1,323 @@
+"""
+XML Book Forest Module
+======================
+
+This module implements an array-based predictor of fitted tree ensembles.
+
+The trees of a fitted scikit-learn forest (e.g., the output of
+:func:`xml_book.models.tabular.get_random_forest`) are flattened into
+contiguous node arrays, which are traversed for all the trees and all the
+data points at once -- one tree level at a time -- instead of dispatching
+every tree separately.
+
+The node arrays can be exported with :meth:`FlatForest.to_arrays` (e.g.,
+into shared memory, see :mod:`xml_book.tools.shared`) and a predictor can be
+recreated around them -- without copying -- with
+:meth:`FlatForest.from_arrays`.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import concurrent.futures
+
+import numpy as np
+
+from xml_book.tools.instrumentation import instrument
+
+__all__ = ['FlatForest']
+
+# The dtype of data compared against the tree thresholds in scikit-learn
+_DTYPE = np.float32
+
+
+def _stores_class_fractions():
+    """
+    Checks whether scikit-learn trees store (normalised) class fractions.
+
+    Since scikit-learn 1.4 the ``value`` of classification trees holds class
+    fractions, which are predicted as they are; earlier versions store
+    (weighted) class counts that are normalised at prediction time.
+    """
+    import sklearn
+    version = tuple(int(part) for part in
+                    sklearn.__version__.split('.')[:2] if part.isdigit())
+    return version >= (1, 4)
+
+
+class FlatForest(object):
+    """
+    Predicts with a flattened forest of decision trees.
+
+    The nodes of all the trees are stored in contiguous arrays (``feature``,
+    ``threshold``, ``children_left``, ``children_right`` and ``value``), where
+    leaves point to themselves so that every data point can take the same
+    number of steps -- the depth of the deepest tree -- in every tree.
+    The predictions are exactly the same as the ones of the forest: the data
+    are cast to ``numpy.float32`` and compared against the (``numpy.float64``)
+    thresholds as in scikit-learn, and the (normalised) leaf values of the
+    trees are summed in order and averaged (the class counts stored by
+    scikit-learn versions older than 1.4 are normalised beforehand).
+
+    Parameters
+    ----------
+    forest : sklearn.ensemble forest
+        A fitted single-output forest, e.g., a
+        ``sklearn.ensemble.RandomForestClassifier`` or
+        ``sklearn.ensemble.RandomForestRegressor``.
+    n_jobs : integer, optional (default=None)
+        The number of threads predicting (chunks of) large batches. By
+        default (``None``), a single thread is used.
+    batch_size : integer, optional (default=2**14)
+        The number of data points traversed at a time (by a single thread),
+        which bounds the memory of the (data points x trees) node indices.
+
+    Attributes
+    ----------
+    classes_ : 1-dimensional numpy array
+        The classes of a classifier (``None`` for a regressor).
+    n_estimators : integer
+        The number of trees.
+    max_depth : integer
+        The depth of the deepest tree.
+    roots : 1-dimensional numpy array
+        The index of the root node of each tree.
+    """
+
+    def __init__(self, forest, n_jobs=None, batch_size=2**14):
+        """Initialises FlatForest class."""
+        assert hasattr(forest, 'estimators_'), 'The forest must be fitted.'
+        assert getattr(forest, 'n_outputs_', 1) == 1, (
+            'Only single-output forests are supported.')
+        assert n_jobs is None or (isinstance(n_jobs, int) and n_jobs > 0), (
+            'Positive integer or None.')
+        assert isinstance(batch_size, int) and batch_size > 0, (
+            'Positive integer.')
+        self.n_jobs = n_jobs
+        self.batch_size = batch_size
+
+        self.classes_ = getattr(forest, 'classes_', None)
+        self.n_features_in_ = forest.n_features_in_
+        self.n_estimators = len(forest.estimators_)
+
+        normalise = (self.classes_ is not None
+                     and not _stores_class_fractions())
+        features, thresholds, lefts, rights = [], [], [], []
+        values, roots = [], []
+        max_depth = 0
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            # Leaves point to themselves and test an arbitrary feature
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+            rights.append(
+                np.where(is_leaf, nodes, tree.children_right) + offset)
+
+            value = tree.value[:, 0, :]
+            if normalise:
+                # Normalise the leaf values as DecisionTreeClassifier does
+                normaliser = value.sum(axis=1)[:, np.newaxis]
+                normaliser[normaliser == 0.0] = 1.0
+                value = value / normaliser
+            values.append(value)
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += tree.node_count
+
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        self.children_left = np.concatenate(lefts).astype(np.intp)
+        self.children_right = np.concatenate(rights).astype(np.intp)
+        # The children of node i are at 2*i (left) and 2*i + 1 (right)
+        self._children = np.stack(
+            [self.children_left, self.children_right], axis=1).reshape(-1)
+        self.value = np.ascontiguousarray(np.concatenate(values),
+                                          dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = max_depth
+
+    def to_arrays(self):
+        """
+        Exports the node arrays and the properties of the forest.
+
+        Returns
+        -------
+        arrays : dictionary of numpy arrays
+            The arrays needed to recreate the predictor with
+            :meth:`from_arrays`; the scalar properties are stored as
+            0-dimensional arrays.
+        """
+        arrays = dict(
+            feature=self.feature,
+            threshold=self.threshold,
+            children=self._children,
+            value=self.value,
+            roots=self.roots,
+            n_features_in=np.array(self.n_features_in_),
+            max_depth=np.array(self.max_depth))
+        if self.classes_ is not None:
+            arrays['classes'] = np.asarray(self.classes_)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, n_jobs=None, batch_size=2**14):
+        """
+        Recreates a predictor from the output of :meth:`to_arrays`.
+
+        The arrays are used as they are (they are not copied), hence they can
+        be read-only views of shared memory.
+
+        Parameters
+        ----------
+        arrays : dictionary of numpy arrays
+            The exported node arrays and properties of a forest.
+        n_jobs : integer, optional (default=None)
+            The number of threads (see :class:`FlatForest`).
+        batch_size : integer, optional (default=2**14)
+            The number of data points traversed at a time (see
+            :class:`FlatForest`).
+
+        Returns
+        -------
+        flat_forest : FlatForest
+            The predictor.
+        """
+        assert n_jobs is None or (isinstance(n_jobs, int) and n_jobs > 0), (
+            'Positive integer or None.')
+        assert isinstance(batch_size, int) and batch_size > 0, (
+            'Positive integer.')
+        flat_forest = cls.__new__(cls)
+        flat_forest.n_jobs = n_jobs
+        flat_forest.batch_size = batch_size
+
+        flat_forest.classes_ = arrays.get('classes')
+        flat_forest.n_features_in_ = int(arrays['n_features_in'])
+        flat_forest.max_depth = int(arrays['max_depth'])
+        flat_forest.feature = arrays['feature']
+        flat_forest.threshold = arrays['threshold']
+        flat_forest._children = arrays['children']
+        flat_forest.children_left = flat_forest._children[0::2]
+        flat_forest.children_right = flat_forest._children[1::2]
+        flat_forest.value = arrays['value']
+        flat_forest.roots = arrays['roots']
+        flat_forest.n_estimators = flat_forest.roots.shape[0]
+        return flat_forest
+
+    def apply(self, X):
+        """
+        Finds the leaf of every tree that each data point falls into.
+
+        Parameters
+        ----------
+        X : 2-dimensional numpy array
+            The data.
+
+        Returns
+        -------
+        leaves : 2-dimensional numpy array
+            The (flattened) node index of the leaf of each data point (rows)
+            in each tree (columns).
+        """
+        X = self._validate(X)
+        return self._apply(X)
+
+    def _validate(self, X):
+        """Casts the data to the dtype compared against the thresholds."""
+        X = np.ascontiguousarray(X, dtype=_DTYPE)
+        assert len(X.shape) == 2, 'The data must be a 2-D array.'
+        assert X.shape[1] == self.n_features_in_, (
+            'Incorrect number of features.')
+        return X
+
+    def _apply(self, X):
+        """Traverses the trees level by level for a batch of data."""
+        samples_number, features_number = X.shape
+        X_flat = X.reshape(-1)
+        row_offsets = (np.arange(samples_number, dtype=np.intp)
+                       * features_number)[:, np.newaxis]
+        nodes = np.broadcast_to(
+            self.roots, (samples_number, self.n_estimators)).copy()
+        # Buffers reused across the levels (all the indices are in range,
+        # hence clipping skips the bounds checks)
+        indices = np.empty_like(nodes)
+        values = np.empty(nodes.shape, dtype=X.dtype)
+        thresholds = np.empty(nodes.shape, dtype=self.threshold.dtype)
+        go_right = np.empty(nodes.shape, dtype=bool)
+        for _ in range(self.max_depth):
+            np.take(self.feature, nodes, out=indices, mode='clip')
+            indices += row_offsets
+            np.take(X_flat, indices, out=values, mode='clip')
+            np.take(self.threshold, nodes, out=thresholds, mode='clip')
+            np.greater(values, thresholds, out=go_right)
+            np.multiply(nodes, 2, out=indices)
+            indices += go_right
+            np.take(self._children, indices, out=nodes, mode='clip')
+        return nodes
+
+    def _predict_batch(self, X):
+        """Sums the leaf values of all the trees (in order) for a batch."""
+        leaves = self._apply(X)
+        prediction = np.zeros((X.shape[0], self.value.shape[1]),
+                              dtype=np.float64)
+        for tree in range(self.n_estimators):
+            prediction += self.value[leaves[:, tree]]
+        prediction /= self.n_estimators
+        return prediction
+
+    def _predict_values(self, X):
+        """Computes the averaged leaf values in batches (and threads)."""
+        X = self._validate(X)
+        starts = range(0, X.shape[0], self.batch_size)
+        batches = [X[start:start + self.batch_size] for start in starts]
+        if self.n_jobs is None or self.n_jobs == 1 or len(batches) < 2:
+            predictions = [self._predict_batch(batch) for batch in batches]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(self.n_jobs) as pool:
+                predictions = list(pool.map(self._predict_batch, batches))
+        if not predictions:
+            return np.zeros((0, self.value.shape[1]), dtype=np.float64)
+        return np.concatenate(predictions)
+
+    @instrument()
+    def predict_proba(self, X):
+        """
+        Predicts class probabilities (for classifiers).
+
+        Parameters
+        ----------
+        X : 2-dimensional numpy array
+            The data.
+
+        Returns
+        -------
+        probabilities : 2-dimensional numpy array
+            The probabilities of each class (columns) for each data point.
+        """
+        assert self.classes_ is not None, 'The forest is not a classifier.'
+        return self._predict_values(X)
+
+    @instrument()
+    def predict(self, X):
+        """
+        Predicts classes (for classifiers) or numbers (for regressors).
+
+        Parameters
+        ----------
+        X : 2-dimensional numpy array
+            The data.
+
+        Returns
+        -------
+        predictions : 1-dimensional numpy array
+            The predictions.
+        """
+        values = self._predict_values(X)
+        if self.classes_ is None:
+            return values[:, 0]
+        return self.classes_.take(np.argmax(values, axis=1), axis=0)
@@ -13,9 +13,12 @@ the book.
 import sklearn.ensemble
 import sklearn.svm
 
+from xml_book.tools.instrumentation import instrument
+
 __all__ = ['get_random_forest', 'get_svc']
 
 
+@instrument()
 def get_random_forest(data, target, random_seed=None):
     """
     Fits a Random Forest classifier.
@@ -54,6 +57,7 @@ def get_random_forest(data, target, random_seed=None):
     return clf
 
 
+@instrument()
 def get_svc(data, target, random_seed=None):
     """
     Fits a Support Vector Machine classifier.
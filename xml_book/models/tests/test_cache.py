@@ -0,0 +1,66 @@
+"""
+Tests the model cache module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import pickle
+import threading
+
+import numpy as np
+
+from sklearn.linear_model import LogisticRegression
+
+from xml_book.models.cache import CachedModel
+
+
+def _get_model():
+    """Fits a simple classifier."""
+    random_generator = np.random.RandomState(42)
+    data = random_generator.randint(0, 4, size=(200, 2))
+    labels = (data[:, 0] > 1).astype(int)
+    return LogisticRegression().fit(data, labels), data
+
+
+def test_cached_model_threads():
+    """Tests the statistics of a model shared by many threads."""
+    model, _ = _get_model()
+    cached_model = CachedModel(model)
+
+    threads_number, calls_number = 8, 50
+    barrier = threading.Barrier(threads_number)
+
+    def predict():
+        barrier.wait()
+        for i in range(calls_number):
+            # Every call has at least one new row
+            cached_model.predict(np.array([[threading.get_ident(), i]]))
+
+    threads = [threading.Thread(target=predict)
+               for _ in range(threads_number)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    statistics = cached_model.get_statistics()
+    assert statistics['model_calls'] == threads_number * calls_number
+    assert statistics['misses'] == threads_number * calls_number
+
+
+def test_cached_model_pickle():
+    """Tests pickling the model wrapper."""
+    model, data = _get_model()
+    cached_model = CachedModel(model)
+    predictions = cached_model.predict_proba(data)
+    assert cached_model.get_statistics()['entries'] > 0
+
+    cached_model_ = pickle.loads(pickle.dumps(cached_model))
+    statistics = cached_model_.get_statistics()
+    assert statistics['entries'] == 0 and statistics['memory'] == 0
+    assert statistics['model_calls'] == 1
+
+    assert np.array_equal(cached_model_.predict_proba(data), predictions)
+    assert cached_model_.get_statistics()['model_calls'] == 2
+    assert np.array_equal(cached_model_.classes_, model.classes_)
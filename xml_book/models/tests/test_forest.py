@@ -0,0 +1,98 @@
+"""
+Tests the forest module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import numpy as np
+import pytest
+
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from xml_book.models.forest import FlatForest
+
+
+def _get_data(seed=42, rows_number=500):
+    """Generates data with continuous and discrete features."""
+    random_generator = np.random.RandomState(seed)
+    data = np.concatenate(
+        [random_generator.normal(size=(rows_number, 3)),
+         random_generator.randint(0, 4, size=(rows_number, 2))], axis=1)
+    labels = data[:, 0] + data[:, 3] - data[:, 4]
+    return data, labels
+
+
+def _get_forest(kind, seed=42):
+    """Fits a (small) random forest classifier or regressor."""
+    data, labels = _get_data(seed)
+    if kind == 'classifier':
+        forest = RandomForestClassifier(n_estimators=20, max_depth=8,
+                                        random_state=seed)
+        labels = np.digitize(labels, [-1, 1])
+    else:
+        forest = RandomForestRegressor(n_estimators=20, max_depth=8,
+                                       random_state=seed)
+    return forest.fit(data, labels)
+
+
+def _assert_same_predictions(flat_forest, forest, data):
+    """Checks that the predictions are exactly the same."""
+    assert np.array_equal(flat_forest.predict(data), forest.predict(data))
+    if forest.__class__ is RandomForestClassifier:
+        assert np.array_equal(flat_forest.predict_proba(data),
+                              forest.predict_proba(data))
+    else:
+        with pytest.raises(AssertionError,
+                           match='The forest is not a classifier.'):
+            flat_forest.predict_proba(data)
+
+
+@pytest.mark.parametrize('kind', ['classifier', 'regressor'])
+@pytest.mark.parametrize('n_jobs,batch_size', [(None, 2**14), (4, 64)])
+def test_flat_forest(kind, n_jobs, batch_size):
+    """
+    Tests that the flattened forest predicts exactly as scikit-learn.
+    """
+    forest = _get_forest(kind)
+    flat_forest = FlatForest(forest, n_jobs=n_jobs, batch_size=batch_size)
+    assert flat_forest.n_estimators == 20
+
+    # Unseen data (including the training data thresholds)
+    data = np.concatenate([_get_data(seed=0, rows_number=1000)[0],
+                           _get_data()[0]])
+    _assert_same_predictions(flat_forest, forest, data)
+
+    leaves = flat_forest.apply(data)
+    assert leaves.shape == (data.shape[0], 20)
+    assert np.array_equal(leaves - flat_forest.roots, forest.apply(data))
+
+    assert flat_forest.predict(data[:0]).shape == (0, )
+
+
+@pytest.mark.parametrize('kind', ['classifier', 'regressor'])
+def test_flat_forest_arrays(kind):
+    """
+    Tests recreating the flattened forest from its arrays.
+    """
+    forest = _get_forest(kind)
+    flat_forest = FlatForest(forest)
+    arrays = flat_forest.to_arrays()
+    assert ('classes' in arrays) is (kind == 'classifier')
+
+    # The arrays are used without copying, e.g., from read-only memory
+    for array in arrays.values():
+        array.flags.writeable = False
+    flat_forest_ = FlatForest.from_arrays(arrays, n_jobs=4, batch_size=64)
+    assert flat_forest_.feature is arrays['feature']
+    assert flat_forest_.value is arrays['value']
+    for attribute in ('n_estimators', 'max_depth', 'n_features_in_'):
+        assert getattr(flat_forest_, attribute) == getattr(
+            flat_forest, attribute)
+    assert np.array_equal(flat_forest_.children_left,
+                          flat_forest.children_left)
+    assert np.array_equal(flat_forest_.children_right,
+                          flat_forest.children_right)
+
+    data = _get_data(seed=0, rows_number=1000)[0]
+    _assert_same_predictions(flat_forest_, forest, data)
@@ -8,6 +8,7 @@ This module implements HTML displaying function for NumPy arrays.
 # Author: Kacper Sokol <kacper@xmlx.dev>
 # License: MIT
 
+import functools
 import IPython
 import warnings
 
@@ -43,15 +44,44 @@ def is_structured_array(array: np.ndarray) -> bool:
     return len(array.dtype) != 0
 
 
+@functools.lru_cache(maxsize=None)
+def _are_numerical_fields(dtype: np.dtype) -> bool:
+    """
+    Determines whether all fields of a structured numpy dtype are numerical.
+
+    The result is cached per dtype, therefore wide structured arrays are only
+    analysed once.
+    """
+    is_numerical = True
+    for i in range(len(dtype)):
+        if not is_numerical_dtype(dtype[i]):
+            is_numerical = False
+            break
+    return is_numerical
+
+
+@functools.lru_cache(maxsize=None)
+def _are_flat_fields(dtype: np.dtype) -> bool:
+    """
+    Determines whether all fields of a structured numpy dtype are flat.
+
+    The result is cached per dtype, therefore wide structured arrays are only
+    analysed once.
+    """
+    is_flat = True
+    for name in dtype.names:
+        if not is_flat_dtype(dtype[name]):
+            # This is a complex (multi-dimensional) embedded dtype
+            is_flat = False
+            break
+    return is_flat
+
+
 def is_numerical_array(array: np.ndarray) -> bool:
     """Determines whether a numpy array-like object has a numerical data type."""
     assert isinstance(array, np.ndarray), 'NumPy array-like object.'
     if is_structured_array(array):
-        is_numerical = True
-        for i in range(len(array.dtype)):
-            if not is_numerical_dtype(array.dtype[i]):
-                is_numerical = False
-                break
+        is_numerical = _are_numerical_fields(array.dtype)
     else:
         is_numerical = is_numerical_dtype(array.dtype)
     return is_numerical
@@ -69,12 +99,7 @@ def is_2d_array(array: np.ndarray) -> bool:
                        'as a classic 2D numpy array with a desired type.')
             warnings.warn(message, category=UserWarning)
         elif len(array.shape) == 1 and len(array.dtype) > 0:
-            is_2d = True
-            for name in array.dtype.names:
-                if not is_flat_dtype(array.dtype[name]):
-                    # This is a complex (multi-dimensional) embedded dtype
-                    is_2d = False
-                    break
+            is_2d = _are_flat_fields(array.dtype)
         else:
             is_2d = False
     else:
@@ -83,6 +108,51 @@ def is_2d_array(array: np.ndarray) -> bool:
     return is_2d
 
 
+class NumericalFormatter(object):
+    """
+    Formats numbers with a fixed precision.
+
+    Instances of this class can be called on a single value (like any other
+    column formatter) as well as applied to a whole column (numpy array) at
+    once with the ``format_column`` method, which is vectorised.
+    """
+
+    def __init__(self, numerical_precision: int = 3):
+        """Initialises NumericalFormatter class."""
+        assert isinstance(numerical_precision, int), 'Integer.'
+        assert numerical_precision >= 0, 'Non-negative integer.'
+        self.numerical_precision = numerical_precision
+        self._template = f'{{:.{numerical_precision}f}}'
+        self._column_template = f'%.{numerical_precision}f'
+
+    def __call__(self, value):
+        return self._template.format(value)
+
+    def format_column(self, column: np.ndarray) -> np.ndarray:
+        """Formats a 1-dimensional numpy array of numbers."""
+        if column.dtype.kind == 'c':
+            # Complex numbers cannot be %-formatted
+            formatted = np.array([self(value) for value in column], dtype=str)
+        else:
+            formatted = np.char.mod(self._column_template, column)
+        return formatted
+
+
+def format_column(column: np.ndarray, formatter) -> list:
+    """
+    Formats a 1-dimensional numpy array (column) with a formatter.
+
+    Formatters exposing a ``format_column`` method (e.g.,
+    :class:`NumericalFormatter`) process the whole column at once;
+    other callables are applied value by value.
+    """
+    if hasattr(formatter, 'format_column'):
+        formatted = formatter.format_column(column)
+    else:
+        formatted = [formatter(value) for value in column]
+    return formatted
+
+
 class DisplayArray(object):
     """
     Displays a NumPy array as either a HTML object (in the Jupyter environment)
@@ -128,12 +198,15 @@ class DisplayArray(object):
                     and len(column_names) == array.shape[1]), (
                         'Column names expected.')
         self.column_names = column_names
+        # Names of the fields used to extract (zero-copy) column views
+        self._column_keys = (array.dtype.names if is_structured_array(array)
+                             else list(range(array.shape[1])))
         self.num_columns = len(self.column_names)
 
         assert isinstance(indent_size, int) and indent_size >= 0, 'Non-negative int.'
         assert column_formatters is None or isinstance(column_formatters, dict), (
             'None or a dictionary of formatters.')
-        _lambda_num = lambda x: f'{{:.{numerical_precision}f}}'.format(x)
+        _lambda_num = NumericalFormatter(numerical_precision)
         _lambda_str = lambda x: x
         if column_formatters is None:
             column_formatters = dict()
@@ -183,22 +256,36 @@ class DisplayArray(object):
             display_head=display_head,
             centre=centre)))
 
+    def _format_columns(self, max_rows):
+        """
+        Formats the first ``max_rows`` rows of the array column by column.
+
+        Columns are extracted as views -- ``array[name]`` for structured
+        arrays and ``array[:, index]`` for classic arrays -- hence the data
+        are never copied into object rows.
+        """
+        array = self.array[:max_rows]
+        is_structured = is_structured_array(array)
+
+        columns = []
+        for key, label in zip(self._column_keys, self.column_names):
+            column = array[key] if is_structured else array[:, key]
+            columns.append(
+                format_column(column, self.column_formatters[label]))
+
+        return columns
+
     def as_text(self, max_rows=None, text_separator=' | ', display_head=True):
         """Format NumPy array as text."""
         if max_rows is None or not max_rows or max_rows > self.num_rows:
             max_rows = self.num_rows
         skipped_rows = max(0, self.num_rows - max_rows)
 
-        rows = [(i for i in self.column_names)] if display_head else []
-        for row in self.array[:max_rows]:
-            row_list = []
-            for row_value, label in zip(row, self.column_names):
-                fmt = self.column_formatters[label]
-                row_list.append(fmt(row_value))
-            rows.append(tuple(row_list))
+        rows = [tuple(self.column_names)] if display_head else []
+        rows += zip(*self._format_columns(max_rows))
         lines = [text_separator.join(row).rstrip() for row in rows]
         if skipped_rows:
-            lines.append((0, f'... ({skipped_rows} rows sipped)'))
+            lines.append(f'... ({skipped_rows} rows sipped)')
 
         return '\n'.join(lines)
 
@@ -220,11 +307,10 @@ class DisplayArray(object):
 
         lines.append((1, '<tbody>'))
 
-        for row in self.array[:max_rows]:
+        for row in zip(*self._format_columns(max_rows)):
             lines.append((2, '<tr>'))
-            for row_value, label in zip(row, self.column_names):
-                fmt = self.column_formatters[label]
-                lines.append((3, f'<td>{fmt(row_value)}</td>'))
+            for row_value in row:
+                lines.append((3, f'<td>{row_value}</td>'))
             lines.append((2, '</tr>'))
 
         lines += [(1, '</tbody>'), (0, '</table>')]
@@ -0,0 +1,139 @@
+"""
+Batch Figure Rendering
+======================
+
+This module implements batch rendering of figures in parallel processes.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import concurrent.futures
+import multiprocessing
+import os
+
+__all__ = ['render_figure', 'render_figures']
+
+# Fixed salt of the SVG element identifiers, which makes the output
+# reproducible across processes
+SVG_HASH_SALT = 'xml-book'
+
+
+def _initialise_worker():
+    """Sets up the non-interactive Agg backend in a worker process."""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render_figure(function, kwargs, output_path, dpi=300):
+    """
+    Renders a figure and saves it as an SVG or PNG file.
+
+    The ``function`` has to return a ``(figure, axis)`` tuple, e.g.,
+    :func:`xml_book.meta_explainers.plot_examples.local_surrogate`.
+    The image format is inferred from the extension of the ``output_path``
+    (``.svg`` or ``.png``).
+    The figure is drawn in the book style (see
+    :func:`xml_book.config.setup_plotting`) and closed once it is saved.
+
+    Parameters
+    ----------
+    function : callable
+        A (picklable) figure function.
+    kwargs : dictionary
+        Keyword arguments passed to the ``function``.
+    output_path : string
+        Path to the output file.
+    dpi : integer, optional (default=300)
+        Resolution of the (raster elements of the) image.
+
+    Returns
+    -------
+    output_path : string
+        Path to the saved file.
+    """
+    import matplotlib
+    import matplotlib.pyplot as plt
+    from xml_book.config import setup_plotting
+    from xml_book.plots.tools import export_figure
+
+    fmt = os.path.splitext(output_path)[1].lstrip('.').lower()
+    assert fmt in ('svg', 'png'), 'The output has to be either SVG or PNG.'
+    kwargs = {} if kwargs is None else kwargs
+    assert isinstance(kwargs, dict), 'The kwargs must be a dictionary.'
+
+    setup_plotting()
+    # The SVG date and element identifiers are fixed to make the output
+    # identical regardless of the process it was rendered in
+    metadata = {'Date': None} if fmt == 'svg' else None
+    with matplotlib.rc_context({'svg.hashsalt': SVG_HASH_SALT}):
+        fig, _ = function(**kwargs)
+        assert fig is not None, 'The function must create its own figure.'
+        try:
+            img_data, _ = export_figure(
+                fig, dpi=dpi, fmt=fmt, png_threshold=None,
+                metadata=metadata)
+        finally:
+            plt.close(fig)
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(img_data)
+
+    return output_path
+
+
+def render_figures(jobs, processes=None, dpi=300):
+    """
+    Renders a batch of figures in parallel worker processes.
+
+    Each job is a 3-tuple holding: a figure function, a dictionary of its
+    keyword arguments and an output path (see :func:`render_figure`).
+    The workers are started afresh (*spawn*) and use the Agg backend, hence
+    the functions and their arguments must be picklable, e.g., defined at a
+    module level.
+    The files are identical to the ones produced by serial rendering, which
+    is used when ``processes`` is 1.
+
+    Parameters
+    ----------
+    jobs : list of 3-tuples
+        A list of ``(function, kwargs, output_path)`` jobs.
+    processes : integer, optional (default=None)
+        The number of worker processes. By default (``None``), the number of
+        CPUs is used.
+    dpi : integer, optional (default=300)
+        Resolution of the (raster elements of the) images.
+
+    Returns
+    -------
+    output_paths : list of strings
+        Paths to the saved files in the order of the ``jobs``.
+    """
+    jobs = list(jobs)
+    for job in jobs:
+        assert len(job) == 3, 'Each job is a (function, kwargs, path) tuple.'
+        assert callable(job[0]), 'The figure function must be callable.'
+    assert processes is None or (isinstance(processes, int)
+                                 and processes > 0), (
+        'The number of processes must be a positive integer or None.')
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(jobs))
+
+    functions, kwargs, output_paths = zip(*jobs) if jobs else ([], [], [])
+    dpis = len(jobs) * [dpi]
+    if processes <= 1:
+        output_paths = list(
+            map(render_figure, functions, kwargs, output_paths, dpis))
+    else:
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=processes, mp_context=context,
+                initializer=_initialise_worker) as executor:
+            output_paths = list(executor.map(
+                render_figure, functions, kwargs, output_paths, dpis))
+
+    return output_paths
@@ -0,0 +1,299 @@
+"""
+Figure Cache
+============
+
+This module implements a content-addressed cache of rendered figures.
+
+A figure is stored under a key derived from everything that determines its
+content: the figure function (its name and the source code of its module),
+the source code of the ``xml_book`` package, its keyword arguments, the
+image format and resolution, the matplotlib version, the plotting style and
+the book's ``RANDOM_SEED``. When none of these change, the figure is read
+from the cache instead of being recomputed and redrawn, hence incremental
+book builds skip the figure functions altogether::
+
+    display_cached_figure(local_surrogate, {'surrogate_type': 'tree'})
+
+The figure function can also be given by its import path, in which case a
+cache hit neither imports its module nor matplotlib -- the module is only
+imported (and matplotlib with it) to render a missing figure::
+
+    display_cached_figure(
+        'xml_book.meta_explainers.plot_examples:local_surrogate',
+        {'surrogate_type': 'tree'})
+
+Apart from ``xml_book`` and matplotlib, the code imported by the figure
+module is not tracked, therefore changes to it (e.g., upgrading numpy)
+require the cache to be cleared with :func:`clear_figure_cache`.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import hashlib
+import importlib
+import importlib.util
+import inspect
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from xml_book.config import PLOTTING_STYLE
+
+__all__ = ['get_figure_key', 'get_cached_figure', 'display_cached_figure',
+           'clear_figure_cache']
+
+# The cache location, which can be overridden with an environment variable
+CACHE_DIR = os.environ.get(
+    'XML_BOOK_FIGURE_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'xml_book', 'figures'))
+# Bump to invalidate all the cached figures, e.g., when rendering changes
+CACHE_VERSION = 1
+
+
+def _get_matplotlib_version():
+    """Reads the installed matplotlib version without importing it."""
+    try:
+        import importlib.metadata as importlib_metadata
+    except ImportError:  # Python 3.7
+        try:
+            import importlib_metadata
+        except ImportError:
+            importlib_metadata = None
+
+    if importlib_metadata is not None:
+        try:
+            version = importlib_metadata.version('matplotlib')
+        except importlib_metadata.PackageNotFoundError:
+            version = None
+    else:
+        import pkg_resources
+        try:
+            version = pkg_resources.get_distribution('matplotlib').version
+        except pkg_resources.DistributionNotFound:
+            version = None
+
+    return version
+
+
+def _get_function_name(function):
+    """Gets the module and the qualified name of a (path to a) function."""
+    if isinstance(function, str):
+        module_name, _, function_name = function.partition(':')
+        assert module_name and function_name, (
+            'The function path must have the module:function form.')
+    else:
+        assert callable(function), 'The figure function must be callable.'
+        module_name = function.__module__
+        function_name = getattr(function, '__qualname__', function.__name__)
+    return module_name, function_name
+
+
+def _get_function(function):
+    """Imports a function given by its ``module:function`` path."""
+    if isinstance(function, str):
+        module_name, function_name = _get_function_name(function)
+        function = importlib.import_module(module_name)
+        for name in function_name.split('.'):
+            function = getattr(function, name)
+    return function
+
+
+def _get_source_hash(function):
+    """
+    Hashes the source code of the module defining the ``function`` (without
+    importing the module).
+    """
+    module_name, _ = _get_function_name(function)
+    try:
+        spec = importlib.util.find_spec(module_name)
+        source = spec.loader.get_source(module_name)
+    except (AttributeError, ImportError, ValueError):
+        # E.g., the __main__ module
+        source = None
+
+    if source is None:
+        assert not isinstance(function, str), (
+            'The source of the function module cannot be found.')
+        try:
+            source = inspect.getsource(function)
+        except (OSError, TypeError):
+            # E.g., a function defined interactively
+            code = function.__code__
+            source = repr((code.co_code, code.co_consts, code.co_names))
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def _get_package_hash(package='xml_book'):
+    """
+    Hashes the source code of all the modules of a ``package`` (without
+    importing them), skipping its tests.
+    """
+    spec = importlib.util.find_spec(package)
+    assert spec is not None and spec.submodule_search_locations, (
+        'The package cannot be found.')
+
+    hasher = hashlib.sha256()
+    for location in sorted(spec.submodule_search_locations):
+        paths = []
+        for root, dirs, files in os.walk(location):
+            dirs[:] = [dir_ for dir_ in dirs
+                       if dir_ not in ('tests', '__pycache__')]
+            paths += [os.path.join(root, file_) for file_ in files
+                      if file_.endswith('.py')]
+        for path in sorted(paths):
+            hasher.update(os.path.relpath(path, location).replace(
+                os.sep, '/').encode('utf-8'))
+            with open(path, 'rb') as f:
+                source = f.read()
+            hasher.update(hashlib.sha256(source).digest())
+    return hasher.hexdigest()
+
+
+def _update_hash(hasher, value):
+    """Feeds a (nested) keyword argument value into the ``hasher``."""
+    if isinstance(value, np.ndarray):
+        hasher.update('ndarray:{}:{}:'.format(
+            value.dtype.str, value.shape).encode('utf-8'))
+        hasher.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        hasher.update('dict:{}:'.format(len(value)).encode('utf-8'))
+        for key in sorted(value, key=repr):
+            _update_hash(hasher, key)
+            _update_hash(hasher, value[key])
+    elif isinstance(value, (list, tuple)):
+        hasher.update('{}:{}:'.format(
+            type(value).__name__, len(value)).encode('utf-8'))
+        for item in value:
+            _update_hash(hasher, item)
+    else:
+        hasher.update('{}:{!r};'.format(
+            type(value).__name__, value).encode('utf-8'))
+
+
+def get_figure_key(function, kwargs=None, fmt='svg', dpi=300):
+    """
+    Computes the cache key of a figure.
+
+    Parameters
+    ----------
+    function : callable or string
+        A figure function returning a ``(figure, axis)`` tuple, or its
+        import path (``'module:function'``).
+    kwargs : dictionary, optional (default=None)
+        Keyword arguments passed to the ``function``.
+    fmt : string, optional (default='svg')
+        Either ``'svg'`` or ``'png'``.
+    dpi : integer, optional (default=300)
+        Resolution of the (raster elements of the) image.
+
+    Returns
+    -------
+    key : string
+        The (hexadecimal) SHA-256 key of the figure.
+    """
+    from xml_book import RANDOM_SEED
+
+    module_name, function_name = _get_function_name(function)
+    kwargs = {} if kwargs is None else kwargs
+    assert isinstance(kwargs, dict), 'The kwargs must be a dictionary.'
+    assert fmt in ('svg', 'png'), 'Unknown image format.'
+
+    hasher = hashlib.sha256()
+    _update_hash(hasher, [
+        CACHE_VERSION,
+        module_name,
+        function_name,
+        _get_source_hash(function),
+        _get_package_hash(),
+        fmt,
+        dpi,
+        _get_matplotlib_version(),
+        PLOTTING_STYLE,
+        RANDOM_SEED
+    ])
+    _update_hash(hasher, kwargs)
+    return hasher.hexdigest()
+
+
+def get_cached_figure(function, kwargs=None, fmt='svg', dpi=300,
+                      cache_dir=None):
+    """
+    Retrieves a figure from the cache, rendering and storing it on a miss.
+
+    Figures are rendered with
+    :func:`xml_book.plots.batch.render_figure`, hence their (SVG) output is
+    reproducible, and they are moved into the cache only once complete.
+    Cache hits neither call the figure function nor use matplotlib; if the
+    function is given by its import path, they do not import it either.
+
+    Parameters
+    ----------
+    function : callable or string
+        A figure function returning a ``(figure, axis)`` tuple, or its
+        import path (``'module:function'``).
+    kwargs : dictionary, optional (default=None)
+        Keyword arguments passed to the ``function``.
+    fmt : string, optional (default='svg')
+        Either ``'svg'`` or ``'png'``.
+    dpi : integer, optional (default=300)
+        Resolution of the (raster elements of the) image.
+    cache_dir : string, optional (default=None)
+        The cache directory. By default (``None``), ``CACHE_DIR`` is used.
+
+    Returns
+    -------
+    img_data : bytes
+        The image.
+    """
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    key = get_figure_key(function, kwargs=kwargs, fmt=fmt, dpi=dpi)
+    path = os.path.join(cache_dir, '{}.{}'.format(key, fmt))
+
+    if not os.path.isfile(path):
+        from xml_book.plots.batch import render_figure
+
+        os.makedirs(cache_dir, exist_ok=True)
+        # Render to a temporary file so that interrupted (or concurrent)
+        # builds never leave a partial figure under the key
+        handle, tmp_path = tempfile.mkstemp(
+            suffix='.{}'.format(fmt), dir=cache_dir)
+        os.close(handle)
+        try:
+            render_figure(_get_function(function), kwargs, tmp_path, dpi=dpi)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    with open(path, 'rb') as f:
+        img_data = f.read()
+    return img_data
+
+
+def display_cached_figure(function, kwargs=None, fmt='svg', dpi=300,
+                          cache_dir=None):
+    """
+    Displays a (cached) figure -- see :func:`get_cached_figure`.
+    """
+    from xml_book.plots.tools import display_svg
+
+    img_data = get_cached_figure(
+        function, kwargs=kwargs, fmt=fmt, dpi=dpi, cache_dir=cache_dir)
+    display_svg(img_data)
+
+
+def clear_figure_cache(cache_dir=None):
+    """
+    Removes all the cached figures.
+
+    Parameters
+    ----------
+    cache_dir : string, optional (default=None)
+        The cache directory. By default (``None``), ``CACHE_DIR`` is used.
+    """
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
@@ -0,0 +1,56 @@
+"""
+Tests the batch figure rendering module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import os
+import subprocess
+import sys
+
+import xml_book.config as cfg
+
+from xml_book.plots.batch import render_figure
+
+
+def _get_figure():
+    """Draws a simple figure."""
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots()
+    ax.plot([0, 1], [1, 0])
+    return fig, ax
+
+
+def test_import_does_not_configure_plotting():
+    """
+    Tests that importing the package neither imports matplotlib nor changes
+    the import system.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__)))))
+    code = ('import sys; sys.path.insert(0, {!r}); '
+            'meta_path = list(sys.meta_path); '
+            'import xml_book; import xml_book.plots.batch; '
+            'assert sys.meta_path == meta_path; '
+            'assert "matplotlib" not in sys.modules').format(root)
+    # The isolated mode ignores the environment (e.g., sitecustomize)
+    subprocess.run([sys.executable, '-I', '-c', code], check=True)
+
+
+def test_render_figure(tmp_path):
+    """
+    Tests that rendering a figure configures plotting (once).
+    """
+    output_path = str(tmp_path / 'figure' / 'plot.svg')
+    assert render_figure(_get_figure, None, output_path) == output_path
+    assert cfg._PLOTTING_SET_UP
+
+    with open(output_path, 'rb') as f:
+        svg = f.read()
+    assert svg.startswith(b'<?xml')
+
+    output_path_ = str(tmp_path / 'plot.svg')
+    render_figure(_get_figure, {}, output_path_)
+    with open(output_path_, 'rb') as f:
+        assert f.read() == svg
@@ -0,0 +1,129 @@
+"""
+Tests the figure cache module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import hashlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+import xml_book.plots.cache as cache
+
+FIGURE_MODULE = '''
+import matplotlib.pyplot as plt
+
+CALLS = []
+
+def draw(colour='red'):
+    CALLS.append(colour)
+    fig, ax = plt.subplots()
+    ax.plot([0, 1], [1, 0], color=colour)
+    return fig, ax
+'''
+
+
+@pytest.fixture
+def figure_module(tmp_path, monkeypatch):
+    """Creates an importable module with a figure function."""
+    module_dir = tmp_path / 'modules'
+    module_dir.mkdir()
+    (module_dir / 'figure_module.py').write_text(FIGURE_MODULE)
+    monkeypatch.syspath_prepend(str(module_dir))
+    yield module_dir
+    sys.modules.pop('figure_module', None)
+
+
+def test_get_cached_figure(tmp_path, figure_module):
+    """
+    Tests rendering missing figures and reading the cached ones.
+    """
+    cache_dir = str(tmp_path / 'cache')
+    function = 'figure_module:draw'
+
+    img_data = cache.get_cached_figure(function, cache_dir=cache_dir)
+    assert img_data.startswith(b'<?xml')
+    import figure_module as module
+    assert module.CALLS == ['red']
+    key = cache.get_figure_key(function)
+    assert os.listdir(cache_dir) == ['{}.svg'.format(key)]
+
+    # A hit, also for the function object
+    assert cache.get_cached_figure(function, cache_dir=cache_dir) == img_data
+    assert cache.get_figure_key(module.draw) == key
+    assert cache.get_cached_figure(
+        module.draw, cache_dir=cache_dir) == img_data
+    assert module.CALLS == ['red']
+
+    # Misses
+    img_data_ = cache.get_cached_figure(
+        function, {'colour': 'blue'}, cache_dir=cache_dir)
+    assert img_data_ != img_data
+    assert module.CALLS == ['red', 'blue']
+    cache.get_cached_figure(function, fmt='png', cache_dir=cache_dir)
+    assert module.CALLS == ['red', 'blue', 'red']
+    assert len(os.listdir(cache_dir)) == 3
+
+    # Changing the module source changes the key
+    with open(str(figure_module / 'figure_module.py'), 'a') as f:
+        f.write('\n# A change\n')
+    assert cache.get_figure_key(function) != key
+
+    cache.clear_figure_cache(cache_dir)
+    assert not os.path.exists(cache_dir)
+
+
+def test_get_package_hash(tmp_path, monkeypatch):
+    """
+    Tests that the package hash tracks the source of all its modules (but
+    not of its tests).
+    """
+    package_dir = tmp_path / 'figure_package'
+    (package_dir / 'tests').mkdir(parents=True)
+    (package_dir / '__init__.py').write_text('')
+    (package_dir / 'tools.py').write_text('VALUE = 1\n')
+    (package_dir / 'tests' / 'test_tools.py').write_text('')
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    package_hash = cache._get_package_hash('figure_package')
+    assert package_hash == cache._get_package_hash('figure_package')
+    assert 'figure_package' not in sys.modules
+
+    (package_dir / 'tests' / 'test_tools.py').write_text('# A test\n')
+    assert cache._get_package_hash('figure_package') == package_hash
+
+    (package_dir / 'tools.py').write_text('VALUE = 2\n')
+    assert cache._get_package_hash('figure_package') != package_hash
+
+    assert cache._get_package_hash() == cache._get_package_hash('xml_book')
+
+
+def test_cache_hit_does_not_import_matplotlib(tmp_path, figure_module):
+    """
+    Tests that displaying a cached figure given by its import path imports
+    neither the figure module nor matplotlib.
+    """
+    cache_dir = str(tmp_path / 'cache')
+    img_data = cache.get_cached_figure('figure_module:draw',
+                                       cache_dir=cache_dir)
+
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__)))))
+    code = ('import hashlib, sys; sys.path[:0] = [{!r}, {!r}]; '
+            'import xml_book.plots.cache as cache; '
+            'img_data = cache.get_cached_figure('
+            '"figure_module:draw", cache_dir={!r}); '
+            'assert hashlib.sha256(img_data).hexdigest() == {!r}; '
+            'cache.display_cached_figure('
+            '"figure_module:draw", cache_dir={!r}); '
+            'assert "figure_module" not in sys.modules; '
+            'assert "matplotlib" not in sys.modules').format(
+                root, str(figure_module), cache_dir,
+                hashlib.sha256(img_data).hexdigest(), cache_dir)
+    # The isolated mode ignores the environment (e.g., sitecustomize)
+    subprocess.run([sys.executable, '-I', '-c', code],
+                   stdout=subprocess.DEVNULL, check=True)
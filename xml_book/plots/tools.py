@@ -8,17 +8,155 @@ This module implements plotting tools for the book.
 # Author: Kacper Sokol <kacper@xmlx.dev>
 # License: MIT
 
-from io import StringIO
-from IPython.display import SVG, display
+from io import BytesIO
+from IPython.display import SVG, Image, display
 
-__all__ = ['display_svg']
+__all__ = ['display_svg', 'export_figure']
 
-def display_svg(figure, dpi=300):
-    """Displays a `figure` as an SVG."""
-    img_data = StringIO()
-    figure.savefig(img_data, format='svg', dpi=dpi, bbox_inches='tight')
-    img_data.seek(0)  # rewind the data
-    # svg_data = img_data.buffer  # this is svg data
-    svg_data = ''.join(img_data.readlines())
+# Artists with more elements (e.g., scatter points) than this number are
+# rasterised within the SVG output; ``None`` disables rasterisation. The value
+# is read whenever a figure is exported.
+RASTERISE_THRESHOLD = None
+# Figures with more elements in total than this number are exported as PNG
+# instead of SVG; ``None`` disables the PNG fallback. The value is read
+# whenever a figure is exported.
+PNG_THRESHOLD = None
+# Marks threshold parameters that take the value of their module constant
+_MODULE_DEFAULT = object()
+# The first bytes of every PNG file
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
 
-    display(SVG(data=svg_data))
+
+def count_artist_elements(artist):
+    """
+    Counts the number of elements drawn by a matplotlib ``artist``.
+
+    Collections (e.g., scatter plots) are measured by the number of their
+    offsets or paths, lines by the number of their vertices, and any other
+    artist counts as a single element.
+    """
+    if hasattr(artist, 'get_offsets'):
+        count = max(len(artist.get_offsets()), len(artist.get_paths()))
+    elif hasattr(artist, 'get_xydata'):
+        count = len(artist.get_xydata())
+    else:
+        count = 1
+    return count
+
+
+def _get_dense_artists(figure, threshold):
+    """Lists artists of the ``figure`` that have more than ``threshold``."""
+    elements_count = 0
+    dense_artists = []
+    for ax in figure.axes:
+        for artist in ax.collections + ax.lines + ax.patches + ax.images:
+            artist_count = count_artist_elements(artist)
+            elements_count += artist_count
+            if threshold is not None and artist_count > threshold:
+                dense_artists.append(artist)
+    return elements_count, dense_artists
+
+
+def _get_threshold(threshold, default):
+    """
+    Resolves a threshold parameter: ``_MODULE_DEFAULT`` selects the current
+    value of the module ``default`` and ``None`` disables the threshold.
+    """
+    if threshold is _MODULE_DEFAULT:
+        threshold = default
+    assert threshold is None or threshold >= 0, (
+        'The threshold must be a non-negative number or None.')
+    return threshold
+
+
+def export_figure(figure, dpi=300, fmt='svg',
+                  rasterise_threshold=_MODULE_DEFAULT,
+                  png_threshold=_MODULE_DEFAULT, metadata=None):
+    """
+    Exports a ``figure`` to an in-memory image.
+
+    The figure is written into a binary buffer whose content is returned as
+    bytes, i.e., the image is not re-encoded or split into lines.
+    Artists with more elements than ``rasterise_threshold`` are rasterised
+    (at the ``dpi`` resolution) within the SVG output, and figures with more
+    elements in total than ``png_threshold`` are exported as PNG instead.
+
+    Parameters
+    ----------
+    figure : matplotlib.figure.Figure
+        The figure to be exported.
+    dpi : integer, optional (default=300)
+        Resolution of the raster elements.
+    fmt : string, optional (default='svg')
+        Either ``'svg'`` or ``'png'``.
+    rasterise_threshold : integer or None, optional
+        The number of elements above which an artist is rasterised.
+        By default, the current value of the ``RASTERISE_THRESHOLD`` module
+        constant is used. If ``None``, artists are never rasterised.
+    png_threshold : integer or None, optional
+        The total number of elements above which the figure is exported as
+        PNG regardless of the ``fmt``. By default, the current value of the
+        ``PNG_THRESHOLD`` module constant is used. If ``None``, the format is
+        never changed.
+    metadata : dictionary, optional (default=None)
+        Metadata passed to matplotlib's ``savefig`` (e.g., ``{'Date': None}``
+        makes SVG output reproducible).
+
+    Returns
+    -------
+    image_data : bytes
+        The exported image.
+    fmt : string
+        The format of the exported image -- either ``'svg'`` or ``'png'``.
+    """
+    assert fmt in ('svg', 'png'), 'Unknown image format.'
+    rasterise_threshold = _get_threshold(rasterise_threshold,
+                                         RASTERISE_THRESHOLD)
+    png_threshold = _get_threshold(png_threshold, PNG_THRESHOLD)
+
+    elements_count, dense_artists = _get_dense_artists(
+        figure, rasterise_threshold if fmt == 'svg' else None)
+    if png_threshold is not None and elements_count > png_threshold:
+        fmt = 'png'
+        dense_artists = []
+
+    # Rasterise dense artists for the time of saving the figure
+    rasterised = [artist.get_rasterized() for artist in dense_artists]
+    for artist in dense_artists:
+        artist.set_rasterized(True)
+
+    img_data = BytesIO()
+    try:
+        figure.savefig(img_data, format=fmt, dpi=dpi, bbox_inches='tight',
+                       metadata=metadata)
+    finally:
+        for artist, is_rasterised in zip(dense_artists, rasterised):
+            artist.set_rasterized(is_rasterised)
+
+    return img_data.getvalue(), fmt
+
+
+def display_svg(figure, dpi=300, rasterise_threshold=_MODULE_DEFAULT,
+                png_threshold=_MODULE_DEFAULT):
+    """
+    Displays a `figure` as an SVG.
+
+    Dense artists are rasterised and very busy figures are displayed as PNG
+    -- see :func:`export_figure` for the description of the
+    ``rasterise_threshold`` and ``png_threshold`` parameters.
+    The `figure` can also be an already exported SVG or PNG image (bytes),
+    e.g., retrieved from the figure cache, which is displayed as is.
+    """
+    if isinstance(figure, bytes):
+        img_data = figure
+        fmt = 'png' if figure.startswith(PNG_SIGNATURE) else 'svg'
+    else:
+        img_data, fmt = export_figure(
+            figure, dpi=dpi, fmt='svg',
+            rasterise_threshold=rasterise_threshold,
+            png_threshold=png_threshold)
+
+    if fmt == 'svg':
+        display(SVG(data=img_data))
+    else:
+        display(Image(data=img_data, format='png'))
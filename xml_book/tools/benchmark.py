@@ -0,0 +1,547 @@
+"""
+XML Book Benchmark Module
+=========================
+
+This module implements a benchmark suite of the surrogate functions.
+
+The benchmarks are executed over a grid of data set sizes (rows), numbers of
+features and cardinalities (number of unique values of discretised features).
+Each case records its execution time and peak memory usage, which can be
+saved as a JSON baseline and compared against in future runs.
+By default, cases with more than ``DEFAULT_MAX_CELLS`` (10 million) cells --
+rows times features -- are not run, e.g., 10 million rows are only used by
+the benchmarks that do not depend on the number of features. Larger cases
+need a higher ``--max-cells`` and enough memory for their data.
+
+The suite can be run from the command line, e.g.::
+
+    python -m xml_book.tools.benchmark --save baseline.json
+    python -m xml_book.tools.benchmark --baseline baseline.json
+
+where the latter exits with a non-zero status if any function is slower
+(or uses more memory) than its baseline beyond the tolerance.
+
+Additionally, the variance of estimates computed over data undiscretised with
+different sampling methods (see the ``sampling`` parameter of
+:func:`xml_book.meta_explainers.surrogates.undiscretise_data`) can be
+compared with::
+
+    python -m xml_book.tools.benchmark --variance
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import argparse
+import gc
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from xml_book import RANDOM_SEED
+
+__all__ = ['BENCHMARKS', 'run_benchmarks', 'save_results', 'load_results',
+           'compare_results', 'run_variance_benchmark']
+
+DEFAULT_ROWS = (10**3, 10**4, 10**5, 10**6, 10**7)
+DEFAULT_FEATURES = (2, 10, 100, 500)
+DEFAULT_CARDINALITIES = (2, 4, 10, 100)
+# Cases with more cells (rows times features) than this are not run -- this
+# excludes, e.g., 10 million rows with 10 or more features
+DEFAULT_MAX_CELLS = 10**7
+# Cases predicted to run longer than this many seconds are skipped
+DEFAULT_TIME_LIMIT = 30.0
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_MEMORY_TOLERANCE = 0.1
+DEFAULT_SAMPLINGS = ('random', 'stratified', 'sobol')
+DEFAULT_VARIANCE_SAMPLES = (64, 256, 1024, 4096)
+
+
+def _get_discretised_data(rows, features, cardinality, random_generator):
+    """Generates random discretised data."""
+    dtype = np.int8 if cardinality <= np.iinfo(np.int8).max else np.int64
+    return random_generator.integers(
+        0, cardinality, size=(rows, features), dtype=dtype)
+
+
+def _get_quartile_data(rows, features, random_generator):
+    """Generates random numerical data and fits a quartile discretiser."""
+    import fatf.utils.data.discretisation as fatf_discretisation
+
+    dataset = random_generator.normal(size=(rows, features))
+    discretiser = fatf_discretisation.QuartileDiscretiser(dataset)
+    return dataset, discretiser
+
+
+def _setup_weighted_purity(rows, features, cardinality, random_generator):
+    from xml_book.meta_explainers.surrogates import weighted_purity
+
+    data = _get_discretised_data(rows, features, cardinality, random_generator)
+    labels = random_generator.integers(0, 2, size=rows)
+    return lambda: weighted_purity(data, labels, 'gini')
+
+
+def _setup_undiscretise_data(rows, features, cardinality, random_generator):
+    from xml_book.meta_explainers.surrogates import undiscretise_data
+
+    dataset, discretiser = _get_quartile_data(rows, features, random_generator)
+    discretised = discretiser.discretise(dataset)
+    return lambda: undiscretise_data(discretised, discretiser, dataset)
+
+
+def _setup_get_bin_sampling_values(rows, features, cardinality,
+                                   random_generator):
+    from xml_book.meta_explainers.surrogates import get_bin_sampling_values
+
+    dataset, discretiser = _get_quartile_data(rows, features, random_generator)
+    return lambda: get_bin_sampling_values(dataset, discretiser)
+
+
+def _setup_one_hot_encode(rows, features, cardinality, random_generator):
+    from xml_book.meta_explainers.surrogates import one_hot_encode
+
+    vector = random_generator.integers(0, cardinality, size=rows)
+    return lambda: one_hot_encode(vector)
+
+
+def _setup_get_hyperrectangle_indices(rows, features, cardinality,
+                                      random_generator):
+    from xml_book.meta_explainers.surrogates import get_hyperrectangle_indices
+
+    data = _get_discretised_data(rows, features, cardinality, random_generator)
+    hyperrectangle = data[0].copy()
+    return lambda: get_hyperrectangle_indices(data, hyperrectangle)
+
+
+# Each benchmark is defined by a setup function -- taking the number of rows,
+# features and cardinality as well as a numpy random generator -- that returns
+# a callable executing the benchmarked function, and a pair of booleans
+# indicating whether the benchmark depends on the number of features and
+# the cardinality respectively
+BENCHMARKS = {
+    'weighted_purity': (_setup_weighted_purity, True, True),
+    'undiscretise_data': (_setup_undiscretise_data, True, False),
+    'get_bin_sampling_values': (_setup_get_bin_sampling_values, True, False),
+    'one_hot_encode': (_setup_one_hot_encode, False, True),
+    'get_hyperrectangle_indices': (
+        _setup_get_hyperrectangle_indices, True, True)
+}
+
+
+def _measure(function, repeat):
+    """
+    Measures the best execution time and the peak memory of a ``function``.
+
+    The peak memory is measured with ``tracemalloc`` (which tracks numpy
+    allocations) in a separate run to keep the timing unaffected.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return min(times), peak_memory
+
+
+def _get_cases(benchmark, rows, features, cardinalities, max_cells):
+    """Lists (features, cardinality, rows) cases of a benchmark."""
+    _, uses_features, uses_cardinality = BENCHMARKS[benchmark]
+    features = features if uses_features else (1, )
+    cardinalities = cardinalities if uses_cardinality else (4, )
+
+    cases = []
+    for features_number, cardinality in itertools.product(
+            features, cardinalities):
+        rows_ = [r for r in sorted(rows) if r * features_number <= max_cells]
+        if rows_:
+            cases.append((features_number, cardinality, rows_))
+    return cases
+
+
+def run_benchmarks(benchmarks=None,
+                   rows=DEFAULT_ROWS,
+                   features=DEFAULT_FEATURES,
+                   cardinalities=DEFAULT_CARDINALITIES,
+                   repeat=3,
+                   max_cells=DEFAULT_MAX_CELLS,
+                   time_limit=DEFAULT_TIME_LIMIT,
+                   verbose=False):
+    """
+    Runs the benchmarks over a grid of data sizes.
+
+    For each number of features and cardinality, the cases are executed with
+    an increasing number of rows. Once the execution time of a case predicts
+    -- assuming up to quadratic growth -- that the next case would take
+    longer than ``time_limit`` seconds, the remaining (larger) cases are
+    skipped and recorded as such in the results.
+    Cases with more than ``max_cells`` cells are not part of the grid, hence
+    they are neither run nor recorded.
+
+    Parameters
+    ----------
+    benchmarks : list of strings, optional (default=None)
+        Names of the benchmarks to run (keys of ``BENCHMARKS``). By default
+        (``None``), all of the benchmarks are run.
+    rows : list of integers, optional (default=DEFAULT_ROWS)
+        Numbers of rows.
+    features : list of integers, optional (default=DEFAULT_FEATURES)
+        Numbers of features.
+    cardinalities : list of integers, optional (default=DEFAULT_CARDINALITIES)
+        Numbers of unique values of discretised features.
+    repeat : integer, optional (default=3)
+        The number of timed runs of each case; the fastest one is reported.
+    max_cells : integer, optional (default=DEFAULT_MAX_CELLS)
+        Cases with more cells (rows times features) are excluded from the
+        grid.
+    time_limit : float, optional (default=DEFAULT_TIME_LIMIT)
+        The predicted execution time (in seconds) above which cases are
+        skipped. If ``None``, no cases are skipped.
+    verbose : boolean, optional (default=False)
+        Whether to print the results as they are computed.
+
+    Returns
+    -------
+    results : list of dictionaries
+        A list of results, each one holding the ``benchmark`` name, the
+        number of ``rows``, ``features`` and the ``cardinality`` as well as
+        the measured ``time`` (in seconds) and ``peak_memory`` (in bytes).
+        Cases skipped due to the ``time_limit`` are marked with
+        ``skipped=True`` and have their ``time`` and ``peak_memory`` set to
+        ``None``.
+    """
+    if benchmarks is None:
+        benchmarks = list(BENCHMARKS.keys())
+    for benchmark in benchmarks:
+        assert benchmark in BENCHMARKS, f'Unknown benchmark: {benchmark}.'
+    assert isinstance(repeat, int) and repeat > 0, 'Positive integer.'
+
+    results = []
+    for benchmark in benchmarks:
+        setup = BENCHMARKS[benchmark][0]
+        for features_number, cardinality, rows_ in _get_cases(
+                benchmark, rows, features, cardinalities, max_cells):
+            for i, rows_number in enumerate(rows_):
+                random_generator = np.random.default_rng(RANDOM_SEED)
+                function = setup(
+                    rows_number, features_number, cardinality,
+                    random_generator)
+                time_, peak_memory = _measure(function, repeat)
+                del function
+
+                result = dict(benchmark=benchmark,
+                              rows=rows_number,
+                              features=features_number,
+                              cardinality=cardinality,
+                              time=time_,
+                              peak_memory=peak_memory)
+                results.append(result)
+                if verbose:
+                    print(_format_result(result))
+
+                if time_limit is not None and i + 1 < len(rows_):
+                    growth = (rows_[i + 1] / rows_number)**2
+                    if time_ * growth > time_limit:
+                        if verbose:
+                            print(f'{benchmark}: skipping more than '
+                                  f'{rows_number} rows.')
+                        for skipped_rows in rows_[i + 1:]:
+                            results.append(
+                                dict(benchmark=benchmark,
+                                     rows=skipped_rows,
+                                     features=features_number,
+                                     cardinality=cardinality,
+                                     time=None,
+                                     peak_memory=None,
+                                     skipped=True))
+                        break
+
+    return results
+
+
+def _format_result(result):
+    """Formats a single result as text."""
+    if result.get('skipped', False):
+        template = ('{benchmark}: rows={rows} features={features} '
+                    'cardinality={cardinality} skipped')
+    else:
+        template = ('{benchmark}: rows={rows} features={features} '
+                    'cardinality={cardinality} time={time:.6f}s '
+                    'peak_memory={peak_memory}B')
+    return template.format(**result)
+
+
+def _get_key(result):
+    """Gets the identifier of a benchmark case."""
+    return (result['benchmark'], result['rows'], result['features'],
+            result['cardinality'])
+
+
+def save_results(results, path):
+    """
+    Saves benchmark results (together with the environment) as JSON.
+
+    Parameters
+    ----------
+    results : list of dictionaries
+        Results of :func:`run_benchmarks`.
+    path : string
+        Path to the JSON file.
+    """
+    environment = dict(python=platform.python_version(),
+                       numpy=np.__version__,
+                       machine=platform.machine(),
+                       processor=platform.processor())
+    with open(path, 'w') as f:
+        json.dump(dict(environment=environment, results=results), f, indent=2)
+
+
+def load_results(path):
+    """
+    Loads benchmark results saved with :func:`save_results`.
+
+    Parameters
+    ----------
+    path : string
+        Path to the JSON file.
+
+    Returns
+    -------
+    results : list of dictionaries
+        The benchmark results.
+    """
+    with open(path, 'r') as f:
+        results = json.load(f)['results']
+    return results
+
+
+def compare_results(results, baseline,
+                    tolerance=DEFAULT_TOLERANCE,
+                    memory_tolerance=DEFAULT_MEMORY_TOLERANCE):
+    """
+    Compares benchmark results against a baseline.
+
+    A case regresses when its time (peak memory) exceeds the baseline by more
+    than the ``tolerance`` (``memory_tolerance``) fraction.
+    Cases missing from the baseline (or skipped in it) are ignored, and so
+    are baseline cases missing from the ``results``, e.g., ones outside of
+    the grid of a narrower run. Cases skipped in the ``results`` -- because
+    a slowdown of smaller cases pushed their predicted execution time over
+    the time limit -- that were measured in the baseline are reported as
+    regressions.
+
+    Parameters
+    ----------
+    results : list of dictionaries
+        Results of :func:`run_benchmarks`.
+    baseline : list of dictionaries
+        Baseline results (e.g., loaded with :func:`load_results`).
+    tolerance : float, optional (default=DEFAULT_TOLERANCE)
+        The acceptable relative slowdown.
+    memory_tolerance : float, optional (default=DEFAULT_MEMORY_TOLERANCE)
+        The acceptable relative increase of peak memory usage. If ``None``,
+        memory is not compared.
+
+    Returns
+    -------
+    regressions : list of strings
+        Descriptions of the regressed cases.
+    """
+    assert tolerance >= 0, 'Non-negative tolerance.'
+    assert memory_tolerance is None or memory_tolerance >= 0, (
+        'Non-negative memory tolerance or None.')
+
+    baseline = {_get_key(result): result for result in baseline}
+
+    regressions = []
+    for result in results:
+        reference = baseline.get(_get_key(result))
+        if reference is None or reference.get('skipped', False):
+            continue
+
+        if result.get('skipped', False):
+            regressions.append(
+                '{} was skipped by the time limit: {:.6f}s baseline.'.format(
+                    _format_result(result), reference['time']))
+            continue
+
+        if result['time'] > reference['time'] * (1 + tolerance):
+            regressions.append(
+                '{} is slower: {:.6f}s vs {:.6f}s baseline.'.format(
+                    _format_result(result), result['time'],
+                    reference['time']))
+        if (memory_tolerance is not None and result['peak_memory']
+                > reference['peak_memory'] * (1 + memory_tolerance)):
+            regressions.append(
+                '{} uses more memory: {}B vs {}B baseline.'.format(
+                    _format_result(result), result['peak_memory'],
+                    reference['peak_memory']))
+
+    return regressions
+
+
+def _variance_black_box(data):
+    """A smooth stand-in for the probabilistic output of a black box."""
+    logits = np.sin(2 * data[:, 0]) + data.sum(axis=1) / np.sqrt(data.shape[1])
+    return 1 / (1 + np.exp(-logits))
+
+
+def run_variance_benchmark(samplings=DEFAULT_SAMPLINGS,
+                           samples_numbers=DEFAULT_VARIANCE_SAMPLES,
+                           features=2,
+                           repetitions=200,
+                           verbose=False):
+    """
+    Measures the variance of estimates over undiscretised data.
+
+    For each number of samples, a discretised sample is drawn (with
+    replacement) from a quartile-discretised data set and undiscretised
+    ``repetitions`` times with each sampling method. The mean prediction of
+    a (smooth) black box over the undiscretised data -- a proxy of
+    surrogate fidelity and purity estimates -- is computed for every
+    repetition, and its variance across the repetitions is reported.
+
+    The variance of independent (``'random'``) sampling decreases
+    proportionally to the number of samples, therefore the ratio of the
+    variance of a method to that of random sampling (``samples_fraction``)
+    approximates the fraction of samples -- and black-box queries -- the
+    method needs to match the precision of random sampling.
+
+    Parameters
+    ----------
+    samplings : list of strings, optional (default=DEFAULT_SAMPLINGS)
+        The sampling methods to compare (the first one is the reference).
+    samples_numbers : list of integers, optional
+        (default=DEFAULT_VARIANCE_SAMPLES)
+        The numbers of samples.
+    features : integer, optional (default=2)
+        The number of features.
+    repetitions : integer, optional (default=200)
+        The number of estimates used to compute each variance.
+    verbose : boolean, optional (default=False)
+        Whether to print the results as they are computed.
+
+    Returns
+    -------
+    results : list of dictionaries
+        A list of results, each one holding the ``sampling`` method, the
+        number of ``samples``, the ``variance`` of the estimate and the
+        ``samples_fraction``.
+    """
+    from xml_book.meta_explainers.surrogates import (get_bin_sampling_values,
+                                                     undiscretise_data)
+
+    assert isinstance(repetitions, int) and repetitions > 1, (
+        'Integer larger than 1.')
+    random_generator = np.random.default_rng(RANDOM_SEED)
+    dataset, discretiser = _get_quartile_data(10**4, features,
+                                              random_generator)
+    dataset_discretised = discretiser.discretise(dataset)
+    bin_sampling_values = get_bin_sampling_values(dataset, discretiser)
+
+    results = []
+    for samples_number in samples_numbers:
+        discretised_data = dataset_discretised[random_generator.integers(
+            0, dataset.shape[0], size=samples_number)]
+        reference_variance = None
+        for sampling in samplings:
+            estimates = [
+                _variance_black_box(
+                    undiscretise_data(
+                        discretised_data, discretiser, dataset,
+                        bin_sampling_values=bin_sampling_values,
+                        sampling=sampling,
+                        random_generator=random_generator)).mean()
+                for _ in range(repetitions)]
+            variance = float(np.var(estimates, ddof=1))
+            if reference_variance is None:
+                reference_variance = variance
+
+            result = dict(sampling=sampling,
+                          samples=samples_number,
+                          variance=variance,
+                          samples_fraction=variance / reference_variance)
+            results.append(result)
+            if verbose:
+                print('{sampling}: samples={samples} variance={variance:.3e} '
+                      'samples_fraction={samples_fraction:.3f}'.format(
+                          **result))
+
+    return results
+
+
+def main(argv=None):
+    """Runs the benchmark suite from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the XML Book surrogate functions.')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS),
+                        help='benchmarks to run (all by default)')
+    parser.add_argument('--rows', nargs='+', type=int, default=DEFAULT_ROWS)
+    parser.add_argument('--features', nargs='+', type=int,
+                        default=DEFAULT_FEATURES)
+    parser.add_argument('--cardinalities', nargs='+', type=int,
+                        default=DEFAULT_CARDINALITIES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-cells', type=int, default=DEFAULT_MAX_CELLS,
+                        help=('cases with more cells (rows times features) '
+                              'are not run (default: %(default)s)'))
+    parser.add_argument('--time-limit', type=float,
+                        default=DEFAULT_TIME_LIMIT,
+                        help=('skip cases predicted to run longer than this '
+                              'many seconds (default: %(default)s)'))
+    parser.add_argument('--save', help='path to save the results (JSON)')
+    parser.add_argument('--baseline', help='path to the baseline (JSON)')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float,
+                        default=DEFAULT_MEMORY_TOLERANCE)
+    parser.add_argument('--variance', action='store_true',
+                        help=('compare the variance of undiscretisation '
+                              'sampling methods instead'))
+    args = parser.parse_args(argv)
+
+    if args.variance:
+        run_variance_benchmark(verbose=True)
+        return 0
+
+    results = run_benchmarks(
+        benchmarks=args.benchmarks,
+        rows=args.rows,
+        features=args.features,
+        cardinalities=args.cardinalities,
+        repeat=args.repeat,
+        max_cells=args.max_cells,
+        time_limit=args.time_limit,
+        verbose=True)
+
+    if args.save:
+        save_results(results, args.save)
+
+    status = 0
+    if args.baseline:
+        regressions = compare_results(
+            results, load_results(args.baseline),
+            tolerance=args.tolerance,
+            memory_tolerance=args.memory_tolerance)
+        for regression in regressions:
+            print(regression)
+        status = 1 if regressions else 0
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,367 @@
+"""
+XML Book Instrumentation Module
+===============================
+
+This module implements lightweight instrumentation of the package functions.
+
+Instrumented code is organised into (nested) spans, which measure their
+execution time and hold counters such as the number of processed rows or
+allocated bytes. Finished spans are emitted to a sink -- an object with an
+``emit(span)`` method -- e.g., :class:`LoggingSink`, :class:`AggregatingSink`
+or :class:`CallbackSink` (compatible with OpenTelemetry-style exporters).
+
+Instrumentation is disabled by default, in which case instrumented functions
+are called directly and spans do nothing::
+
+    import xml_book.tools.instrumentation as xml_instrumentation
+
+    aggregator = xml_instrumentation.AggregatingSink()
+    with xml_instrumentation.instrumented(aggregator):
+        undiscretise_data(discretised_data, discretiser, dataset)
+    aggregator.summary()
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import functools
+import logging
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+__all__ = ['Span', 'span', 'instrument', 'enable', 'disable', 'instrumented',
+           'LoggingSink', 'AggregatingSink', 'CallbackSink']
+
+_SINK = None
+_TRACE_MEMORY = False
+_LOCAL = threading.local()
+
+
+class Span(object):
+    """
+    Measures execution time and counters of a block of code.
+
+    Spans are context managers. When finished, a span is emitted to the sink
+    that was active when the span was created.
+
+    Attributes
+    ----------
+    name : string
+        The name of the span.
+    attributes : dictionary
+        User-defined attributes of the span.
+    counters : dictionary
+        Counters (e.g., ``rows`` or ``bytes``) of the span.
+    parent : string
+        The name of the enclosing span or ``None``.
+    start_time : integer
+        The start time (in nanoseconds since the epoch).
+    end_time : integer
+        The end time (in nanoseconds since the epoch).
+    duration : float
+        The execution time (in seconds).
+    """
+
+    __slots__ = ('name', 'attributes', 'counters', 'parent', 'start_time',
+                 'end_time', 'duration', '_sink', '_start', '_memory')
+
+    def __init__(self, name, sink, **attributes):
+        """Initialises Span class."""
+        self.name = name
+        self.attributes = attributes
+        self.counters = {}
+        self.parent = None
+        self.start_time = None
+        self.end_time = None
+        self.duration = None
+        self._sink = sink
+        self._start = None
+        self._memory = None
+
+    def add(self, counter, value):
+        """Increments a ``counter`` of the span by ``value``."""
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def __enter__(self):
+        stack = _get_stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+
+        if _TRACE_MEMORY and tracemalloc.is_tracing():
+            self._memory = tracemalloc.get_traced_memory()[0]
+        self.start_time = time.time_ns()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.perf_counter() - self._start
+        self.end_time = time.time_ns()
+        if self._memory is not None:
+            memory = tracemalloc.get_traced_memory()[0]
+            self.add('allocated_bytes', max(0, memory - self._memory))
+
+        stack = _get_stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        self._sink.emit(self)
+        return False
+
+
+class _NullSpan(object):
+    """A span that does nothing -- used when instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def add(self, counter, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _get_stack():
+    """Gets the stack of open spans of the current thread."""
+    stack = getattr(_LOCAL, 'stack', None)
+    if stack is None:
+        stack = []
+        _LOCAL.stack = stack
+    return stack
+
+
+def span(name, **attributes):
+    """
+    Creates a span named ``name`` with optional ``attributes``.
+
+    If instrumentation is disabled, a no-op span is returned.
+    """
+    sink = _SINK
+    if sink is None:
+        return _NULL_SPAN
+    return Span(name, sink, **attributes)
+
+
+def _count_rows(args):
+    """Gets the number of rows of the first array-like argument."""
+    for arg in args:
+        shape = getattr(arg, 'shape', None)
+        if shape:
+            return shape[0]
+    return 0
+
+
+def _count_bytes(result):
+    """Gets the number of bytes of numpy arrays returned by a function."""
+    if isinstance(result, np.ndarray):
+        count = result.nbytes
+    elif isinstance(result, (tuple, list)):
+        count = sum(r.nbytes for r in result if isinstance(r, np.ndarray))
+    else:
+        count = 0
+    return count
+
+
+def instrument(name=None):
+    """
+    Instruments a function.
+
+    Each call of the instrumented function is recorded as a span with the
+    ``rows`` counter (the number of rows of the first array argument) and
+    the ``bytes`` counter (the size of the returned numpy arrays).
+    When instrumentation is disabled, the function is called directly.
+
+    This decorator can also instrument methods of existing objects, e.g.,
+    the scoring of a fitted model::
+
+        model.predict = instrument('model.predict')(model.predict)
+
+    Parameters
+    ----------
+    name : string, optional (default=None)
+        The name of the span. By default (``None``), the module and name of
+        the function are used.
+    """
+    def decorator(function):
+        span_name = name
+        if span_name is None:
+            span_name = '{}.{}'.format(
+                function.__module__, function.__qualname__)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            sink = _SINK
+            if sink is None:
+                return function(*args, **kwargs)
+
+            with Span(span_name, sink) as span_:
+                span_.add('rows', _count_rows(args))
+                result = function(*args, **kwargs)
+                span_.add('bytes', _count_bytes(result))
+            return result
+
+        return wrapper
+    return decorator
+
+
+def enable(sink, trace_memory=False):
+    """
+    Enables instrumentation.
+
+    Parameters
+    ----------
+    sink : object
+        An object with an ``emit(span)`` method receiving finished spans.
+    trace_memory : boolean, optional (default=False)
+        Whether to measure the memory allocated within each span (the
+        ``allocated_bytes`` counter) with ``tracemalloc``, which has to be
+        started separately and slows the execution down considerably.
+    """
+    global _SINK, _TRACE_MEMORY
+    assert hasattr(sink, 'emit') and callable(sink.emit), (
+        'The sink must have an emit method.')
+    assert isinstance(trace_memory, bool), 'Boolean.'
+    _SINK = sink
+    _TRACE_MEMORY = trace_memory
+
+
+def disable():
+    """Disables instrumentation."""
+    global _SINK, _TRACE_MEMORY
+    _SINK = None
+    _TRACE_MEMORY = False
+
+
+class instrumented(object):
+    """
+    Enables instrumentation within a context (see :func:`enable`).
+
+    The previous instrumentation settings are restored on exit.
+    """
+
+    def __init__(self, sink, trace_memory=False):
+        """Initialises instrumented class."""
+        self.sink = sink
+        self.trace_memory = trace_memory
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = (_SINK, _TRACE_MEMORY)
+        enable(self.sink, trace_memory=self.trace_memory)
+        return self.sink
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _SINK, _TRACE_MEMORY
+        _SINK, _TRACE_MEMORY = self._previous
+        return False
+
+
+class LoggingSink(object):
+    """
+    Logs finished spans.
+
+    Parameters
+    ----------
+    logger : logging.Logger, optional (default=None)
+        The logger. By default (``None``), the logger of this module is used.
+    level : integer, optional (default=logging.DEBUG)
+        The logging level.
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        """Initialises LoggingSink class."""
+        self.logger = logging.getLogger(__name__) if logger is None else logger
+        self.level = level
+
+    def emit(self, span):
+        """Logs a ``span``."""
+        self.logger.log(
+            self.level, '%s took %.6fs (parent: %s; counters: %s; '
+            'attributes: %s)', span.name, span.duration, span.parent,
+            span.counters, span.attributes)
+
+
+class AggregatingSink(object):
+    """
+    Aggregates finished spans in memory (per span name).
+
+    For each span name, the number of calls, the total execution time and the
+    totals of all the counters are accumulated.
+    """
+
+    def __init__(self):
+        """Initialises AggregatingSink class."""
+        self._lock = threading.Lock()
+        self.aggregates = {}
+
+    def emit(self, span):
+        """Aggregates a ``span``."""
+        with self._lock:
+            aggregate = self.aggregates.get(span.name)
+            if aggregate is None:
+                aggregate = dict(calls=0, time=0.0)
+                self.aggregates[span.name] = aggregate
+            aggregate['calls'] += 1
+            aggregate['time'] += span.duration
+            for counter, value in span.counters.items():
+                aggregate[counter] = aggregate.get(counter, 0) + value
+
+    def summary(self):
+        """
+        Summarises the aggregates.
+
+        Returns
+        -------
+        summary : dictionary of dictionaries
+            The aggregates for each span name, sorted by the total time.
+        """
+        with self._lock:
+            ordered = sorted(self.aggregates.items(),
+                             key=lambda item: item[1]['time'], reverse=True)
+            return {name: dict(aggregate) for name, aggregate in ordered}
+
+    def reset(self):
+        """Removes all the aggregates."""
+        with self._lock:
+            self.aggregates = {}
+
+
+class CallbackSink(object):
+    """
+    Passes finished spans to a callback as dictionaries.
+
+    The dictionaries follow the OpenTelemetry span data model: they hold the
+    ``name``, ``parent``, ``start_time_unix_nano``, ``end_time_unix_nano``
+    and ``attributes`` (the span attributes merged with its counters) keys,
+    hence they can be forwarded to an OpenTelemetry exporter.
+
+    Parameters
+    ----------
+    callback : callable
+        A function receiving span dictionaries.
+    """
+
+    def __init__(self, callback):
+        """Initialises CallbackSink class."""
+        assert callable(callback), 'The callback must be callable.'
+        self.callback = callback
+
+    def emit(self, span):
+        """Passes a ``span`` to the callback."""
+        attributes = dict(span.attributes)
+        attributes.update(span.counters)
+        self.callback(dict(name=span.name,
+                           parent=span.parent,
+                           start_time_unix_nano=span.start_time,
+                           end_time_unix_nano=span.end_time,
+                           attributes=attributes))
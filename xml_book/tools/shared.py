@@ -0,0 +1,276 @@
+"""
+XML Book Shared Memory Module
+=============================
+
+This module implements broadcasting of models and reference data to
+multi-process explainers.
+
+Instead of every worker process holding its own copy of the reference data
+set and the bin sampling values (see
+:func:`xml_book.meta_explainers.surrogates.get_bin_sampling_values`), the
+arrays are published once in a ``multiprocessing.shared_memory`` block, to
+which the workers attach zero-copy, read-only views.
+
+Scikit-learn trees copy their node arrays into private buffers when they are
+unpickled, hence a forest pickled for, or loaded (with :func:`load_model`)
+by, every worker is held in memory by each of them.
+Instead, the forest is flattened into a
+:class:`xml_book.models.forest.FlatForest` whose node arrays are published
+in shared memory, and every worker predicts with them directly::
+
+    import multiprocessing
+    import xml_book.tools.shared as xml_shared
+    from xml_book.models.forest import FlatForest
+
+    forest_arrays = FlatForest(model).to_arrays()
+    with xml_shared.SharedArrays(dict(dataset=dataset)) as shared:
+        with xml_shared.SharedArrays(forest_arrays) as forest:
+            with multiprocessing.Pool(
+                    64, initializer=xml_shared.initialise_worker,
+                    initargs=(shared.spec, None, None, forest.spec)) as pool:
+                pool.map(explain, batches)
+
+    def explain(batch):
+        context = xml_shared.get_worker_context()
+        return context['model'].predict_proba(context['dataset'][batch])
+
+Shared memory requires Python 3.8 or newer.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+import numpy as np
+
+__all__ = ['SharedArrays', 'attach_arrays', 'dump_model', 'load_model',
+           'initialise_worker', 'get_worker_context']
+
+# Byte alignment of the arrays placed in a shared memory block
+_ALIGNMENT = 64
+
+# Shared memory blocks attached by this process (kept open for as long as
+# views of their arrays are in use)
+_ATTACHED = {}
+# The context of a worker process set up by initialise_worker
+_WORKER_CONTEXT = {}
+
+
+def _get_shared_memory():
+    """Imports the ``multiprocessing.shared_memory`` module."""
+    try:
+        import multiprocessing.shared_memory as shared_memory
+    except ImportError:  # pragma: nocover
+        raise ImportError('Shared memory requires Python 3.8 or newer.')
+    return shared_memory
+
+
+class SharedArrays(object):
+    """
+    Publishes a collection of numpy arrays in a shared memory block.
+
+    All the arrays are copied (once) into a single block. The returned
+    ``spec`` is a small, picklable description of the block that is passed
+    to worker processes, which recreate the arrays with
+    :func:`attach_arrays` without copying them.
+
+    The creating process owns the block and must release it with
+    :meth:`close` (or by using this object as a context manager) once the
+    workers are done.
+
+    Parameters
+    ----------
+    arrays : dictionary of numpy arrays
+        The arrays to be shared, e.g., the reference data set and the array
+        representation of its bin sampling values (see the
+        ``bin_sampling_values_to_array`` function of the
+        :mod:`xml_book.meta_explainers.surrogates` module). Arrays of objects
+        cannot be shared.
+
+    Attributes
+    ----------
+    spec : tuple
+        The name of the shared memory block and the ``(offset, shape,
+        dtype)`` layout of each array.
+    arrays : dictionary of numpy arrays
+        Views of the shared arrays in the creating process.
+    """
+
+    def __init__(self, arrays):
+        """Initialises SharedArrays class."""
+        assert isinstance(arrays, dict), 'A dictionary of arrays.'
+        shared_memory = _get_shared_memory()
+
+        arrays = {key: np.asarray(value) for key, value in arrays.items()}
+        layout = {}
+        offset = 0
+        for key, array in arrays.items():
+            assert not array.dtype.hasobject, 'Object arrays cannot be shared.'
+            layout[key] = (offset, array.shape, array.dtype.str)
+            offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+        # Zero-size shared memory blocks are not allowed
+        self._memory = shared_memory.SharedMemory(
+            create=True, size=max(offset, 1))
+        self.spec = (self._memory.name, layout)
+        self.arrays = _get_views(self._memory, layout)
+        for key, array in arrays.items():
+            self.arrays[key].flags.writeable = True
+            self.arrays[key][...] = array
+            self.arrays[key].flags.writeable = False
+
+    def close(self):
+        """Releases the shared memory block."""
+        if self._memory is not None:
+            # Views must not outlive the buffer
+            self.arrays = {}
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def _get_views(memory, layout):
+    """Creates read-only views of the arrays stored in a memory block."""
+    views = {}
+    for key, (offset, shape, dtype) in layout.items():
+        view = np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset)
+        view.flags.writeable = False
+        views[key] = view
+    return views
+
+
+def attach_arrays(spec):
+    """
+    Attaches to the arrays published with :class:`SharedArrays`.
+
+    The memory block stays attached for the lifetime of the process.
+
+    Parameters
+    ----------
+    spec : tuple
+        The ``spec`` attribute of a :class:`SharedArrays` object.
+
+    Returns
+    -------
+    arrays : dictionary of numpy arrays
+        Read-only views of the shared arrays.
+    """
+    name, layout = spec
+    memory = _ATTACHED.get(name)
+    if memory is None:
+        shared_memory = _get_shared_memory()
+        memory = shared_memory.SharedMemory(name=name)
+        _ATTACHED[name] = memory
+    return _get_views(memory, layout)
+
+
+def dump_model(model, path):
+    """
+    Saves a model so that it can be memory-mapped with :func:`load_model`.
+
+    Parameters
+    ----------
+    model : object
+        A fitted model, e.g., the output of
+        :func:`xml_book.models.tabular.get_random_forest`.
+    path : string
+        The path of the model file.
+
+    Returns
+    -------
+    path : string
+        The path of the model file.
+    """
+    import joblib
+    joblib.dump(model, path)
+    return path
+
+
+def load_model(path):
+    """
+    Loads a model saved with :func:`dump_model`.
+
+    The numpy arrays stored as (plain) attributes of the model, e.g., the
+    coefficients of a linear model, are memory-mapped read-only, therefore
+    all the processes loading the same file share their memory. Objects that
+    copy their arrays when unpickled -- notably scikit-learn decision trees
+    and forests -- are not shared; see :class:`SharedArrays` and the
+    ``forest_spec`` parameter of :func:`initialise_worker` instead.
+
+    Parameters
+    ----------
+    path : string
+        The path of the model file.
+
+    Returns
+    -------
+    model : object
+        The loaded model.
+    """
+    import joblib
+    return joblib.load(path, mmap_mode='r')
+
+
+def initialise_worker(spec=None, model=None, model_path=None,
+                      forest_spec=None, **kwargs):
+    """
+    Sets up the context of a worker process.
+
+    This function is meant to be used as the ``initializer`` of a
+    ``multiprocessing.Pool`` or a ``concurrent.futures.ProcessPoolExecutor``.
+    The context is retrieved in the worker with :func:`get_worker_context`.
+
+    Parameters
+    ----------
+    spec : tuple, optional (default=None)
+        The ``spec`` of a :class:`SharedArrays` object whose arrays are
+        attached and added to the context.
+    model : object, optional (default=None)
+        A model added to the context. With the ``fork`` start method the
+        model is inherited from the parent process without copying; with
+        other start methods it is pickled for every worker, in which case
+        ``model_path`` should be used instead.
+    model_path : string, optional (default=None)
+        The path of a model saved with :func:`dump_model`, which is
+        memory-mapped and added to the context.
+    forest_spec : tuple, optional (default=None)
+        The ``spec`` of a :class:`SharedArrays` object holding the arrays of
+        a :class:`xml_book.models.forest.FlatForest` (see its ``to_arrays``
+        method), which is recreated around the shared arrays and added to
+        the context as the ``model``.
+    **kwargs
+        Other (small) objects added to the context, e.g., a discretiser.
+    """
+    assert (model is not None) + (model_path is not None) + (
+        forest_spec is not None) <= 1, (
+            'Either the model, its path or a forest spec can be given.')
+    _WORKER_CONTEXT.clear()
+    if spec is not None:
+        _WORKER_CONTEXT.update(attach_arrays(spec))
+    if model_path is not None:
+        model = load_model(model_path)
+    if forest_spec is not None:
+        from xml_book.models.forest import FlatForest
+        model = FlatForest.from_arrays(attach_arrays(forest_spec))
+    if model is not None:
+        _WORKER_CONTEXT['model'] = model
+    _WORKER_CONTEXT.update(kwargs)
+
+
+def get_worker_context():
+    """
+    Retrieves the context of a worker process.
+
+    Returns
+    -------
+    context : dictionary
+        The shared arrays, the ``model`` and other objects given to
+        :func:`initialise_worker`.
+    """
+    return _WORKER_CONTEXT
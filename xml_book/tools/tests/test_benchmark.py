@@ -0,0 +1,55 @@
+"""
+Tests the benchmark module.
+"""
+
+# Author: Kacper Sokol <kacper@xmlx.dev>
+# License: MIT
+
+from xml_book.tools.benchmark import compare_results, run_benchmarks
+
+
+def _get_result(rows, time, skipped=False):
+    """Builds a result of the weighted purity benchmark."""
+    result = dict(benchmark='weighted_purity', rows=rows, features=2,
+                  cardinality=4, time=time, peak_memory=100)
+    if skipped:
+        result.update(time=None, peak_memory=None, skipped=True)
+    return result
+
+
+def test_run_benchmarks():
+    """Tests that cases skipped by the time limit are recorded."""
+    results = run_benchmarks(
+        benchmarks=['weighted_purity'], rows=(10, 20, 40), features=(2, ),
+        cardinalities=(4, ), repeat=1, time_limit=0)
+    assert [result['rows'] for result in results] == [10, 20, 40]
+    assert results[0]['time'] > 0 and results[0]['peak_memory'] > 0
+    assert 'skipped' not in results[0]
+    for result in results[1:]:
+        assert result['skipped']
+        assert result['time'] is None and result['peak_memory'] is None
+
+    # Cases above the maximum number of cells are not part of the grid
+    results = run_benchmarks(
+        benchmarks=['weighted_purity'], rows=(10, 20, 40), features=(2, ),
+        cardinalities=(4, ), repeat=1, max_cells=40, time_limit=None)
+    assert [result['rows'] for result in results] == [10, 20]
+
+
+def test_compare_results():
+    """Tests comparing benchmark results against a baseline."""
+    baseline = [_get_result(10, 1.0), _get_result(100, 1.0),
+                _get_result(1000, 1.0, skipped=True)]
+
+    # A run over a subset of the baseline grid
+    assert compare_results([_get_result(10, 1.0)], baseline) == []
+    # A case skipped in both the results and the baseline
+    assert compare_results(
+        [_get_result(1000, None, skipped=True)], baseline) == []
+
+    regressions = compare_results(
+        [_get_result(10, 2.0), _get_result(100, None, skipped=True)],
+        baseline)
+    assert len(regressions) == 2
+    assert 'rows=10 ' in regressions[0] and 'slower' in regressions[0]
+    assert 'rows=100 ' in regressions[1] and 'skipped' in regressions[1]